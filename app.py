@@ -5,6 +5,10 @@ All application code lives in the `trackapp` package.
 """
 
 from trackapp import app, socketio  # noqa: F401
+from trackapp.state import run_startup_recovery
+
+# Only the server restores (and journals) the live state; CLIs just import the package.
+run_startup_recovery()
 
 
 if __name__ == "__main__":
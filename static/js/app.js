@@ -66,6 +66,9 @@ var pendingQueuePayload = null;
     // Polling timer for /queue (must be single instance across Turbo navigations).
     var queuePublicPollIntervalId = null;
 
+    // Socket.IO topics the current page listens to (declared via data-socket-topics).
+    var subscribedTopics = [];
+
     var audioEl = null;
     var applyingRemoteAudio = false;
 
@@ -254,6 +257,10 @@ function updateTrackNameDisplays(name) {
         var globalSum = 0;
         var globalCount = 0;
 
+        // Неактивные (idle) судьи не тянут среднее вниз, если это включено на сервере.
+        var hasActive = ratersArray.some(function (r) { return !r.idle; });
+        var skipIdle = !!window.__RATER_EXCLUDE_IDLE__ && hasActive;
+
         ratersArray.forEach(function (rater) {
             var scores = rater.scores || {};
             var vals = Object.values(scores).map(function (v) { return Number(v) || 0; });
@@ -262,6 +269,7 @@ function updateTrackNameDisplays(name) {
 
             var panel = document.querySelector('.rating-panel[data-rater-id="' + rater.id + '"]');
             if (panel) {
+                panel.classList.toggle("rater-idle", !!rater.idle);
                 var totalEl = panel.querySelector("[data-panel-total]");
                 if (totalEl) {
                     totalEl.textContent = avg.toFixed(1);
@@ -269,6 +277,7 @@ function updateTrackNameDisplays(name) {
                 }
             }
 
+            if (skipIdle && rater.idle) return;
             globalSum += avg;
             globalCount += 1;
         });
@@ -1504,6 +1513,56 @@ function formatTime(sec) {
 
     try { window.kickRaterFromBtn = kickRaterFromBtn; } catch (e) {}
 
+    // Binary (msgpack) frames are opt-in: the server enables them via
+    // window.__SOCKET_MSGPACK__ and we only switch if the parser script loaded.
+    // Without it we stay on the JSON protocol, which the server always accepts.
+    function socketOptions() {
+        // Wider randomized reconnect delays spread reconnect storms after a deploy.
+        var opts = {
+            reconnectionDelay: 1000,
+            reconnectionDelayMax: 10000,
+            randomizationFactor: 0.5
+        };
+        try {
+            if (window.__SOCKET_WEBSOCKET_ONLY__) opts.transports = ["websocket"];
+        } catch (e) {}
+        try {
+            var parser = window.__SOCKET_MSGPACK__ ? (window.msgpackParser || window.socketIoMsgpackParser || null) : null;
+            if (parser) {
+                opts.parser = parser;
+                opts.query = { bin: "1" };
+            }
+        } catch (e) {}
+        return opts;
+    }
+
+    function pageSocketTopics() {
+        var out = [];
+        try {
+            var nodes = document.querySelectorAll("[data-socket-topics]");
+            for (var i = 0; i < nodes.length; i++) {
+                String(nodes[i].getAttribute("data-socket-topics") || "").split(/[\s,]+/).forEach(function (t) {
+                    if (t && out.indexOf(t) === -1) out.push(t);
+                });
+            }
+        } catch (e) {}
+        return out;
+    }
+
+    // Keep server-side topic subscriptions in sync with the current page.
+    // `force` re-sends everything (after reconnect the server has a new sid).
+    function syncTopicSubscriptions(force) {
+        if (!socket) return;
+        var wanted = pageSocketTopics();
+        var drop = force ? [] : subscribedTopics.filter(function (t) { return wanted.indexOf(t) === -1; });
+        var add = force ? wanted : wanted.filter(function (t) { return subscribedTopics.indexOf(t) === -1; });
+        try {
+            if (drop.length) socket.emit("unsubscribe", { topics: drop });
+            if (add.length) socket.emit("subscribe", { topics: add });
+        } catch (e) {}
+        subscribedTopics = wanted;
+    }
+
 function initSocket() {
         if (typeof io === "undefined") {
             console.error("Socket.IO script not loaded");
@@ -1517,7 +1576,7 @@ function initSocket() {
         } catch (e) {}
 
         if (!socket) {
-            socket = io();
+            socket = io(socketOptions());
             try { window.__APP_SOCKET__ = socket; } catch (e) {}
         }
 
@@ -1528,6 +1587,7 @@ function initSocket() {
                 // Ensure the correct room membership for the current page.
                 if (isPanelPage) socket.emit("enter_panel");
                 else socket.emit("leave_panel");
+                syncTopicSubscriptions(false);
                 // Also refresh state if we're already connected.
                 if (socket.connected) socket.emit("request_initial_state");
                 return;
@@ -1544,9 +1604,25 @@ function initSocket() {
     } else {
         socket.emit("leave_panel");
     }
+    syncTopicSubscriptions(true);
 });
+// Presence heartbeat: the server only tracks sockets of joined raters.
+if (!socket.__heartbeatTimer) {
+    socket.__heartbeatTimer = setInterval(function () {
+        if (socket.connected && window.__IN_RATING__) socket.emit("heartbeat");
+    }, window.__PRESENCE_HEARTBEAT_MS__ || 15000);
+}
 socket.on("connect_error", function (err) {
             console.error("[socket] connect_error", err);
+            // Server-side admission control refused the connection: it does not
+            // auto-reconnect in that case, so retry after the suggested delay + jitter.
+            var retryMs = err && err.data && Number(err.data.retry_after_ms);
+            if (retryMs > 0) {
+                var s = socket;
+                setTimeout(function () {
+                    if (s && s === socket && !s.connected) s.connect();
+                }, retryMs + Math.floor(Math.random() * 1000));
+            }
         });
 
         function refreshRatingButtons() {
@@ -1612,6 +1688,15 @@ socket.on("connect_error", function (err) {
         });
 
 
+        socket.on("raters_presence_delta", function (payload) {
+            var changes = (payload && payload.changes) || [];
+            changes.forEach(function (c) {
+                var r = c && c.rater_id ? state.raters[c.rater_id] : null;
+                if (r) r.idle = !!c.idle;
+            });
+            computeAndRenderTotalsFromState();
+        });
+
         socket.on("initial_state", function (payload) {
             state.track_name = payload.track_name || "";
             state.criteria = payload.criteria || [];
@@ -1724,8 +1809,25 @@ socket.on("connect_error", function (err) {
             computeAndRenderTotalsFromState();
         });
 
+        // Оценка сохраняется в фоне: блокируем кнопку до результата,
+        // чтобы двойной клик не отправил её повторно.
+        function setEvaluatePending(pending) {
+            var btn = document.getElementById("evaluate-btn");
+            if (btn) btn.disabled = !!pending;
+        }
+
+        socket.on("evaluation_accepted", function () {
+            setEvaluatePending(true);
+        });
+
+        socket.on("evaluation_failed", function () {
+            setEvaluatePending(false);
+            alert("Не удалось сохранить оценку, попробуйте ещё раз.");
+        });
+
         socket.on("evaluation_result", function (payload) {
             if (!payload) return;
+            setEvaluatePending(false);
             computeAndRenderTotalsFromState();
             openResultModal(payload);
         });
@@ -2142,6 +2244,7 @@ function openTrackDetailsModal(trackId) {
                     socket = null;
                     try { window.__APP_SOCKET__ = null; } catch (e) {}
                     socketInited = false;
+                    subscribedTopics = [];
                 }
                 window.__TR_LAST_AUTH_SIG__ = sig;
             }
@@ -2167,6 +2270,7 @@ function openTrackDetailsModal(trackId) {
             if (socket) {
                 if (isPanelPage) socket.emit("enter_panel");
                 else socket.emit("leave_panel");
+                syncTopicSubscriptions(false);
             }
         } catch (e) {}
         // Create (or recreate) the Socket.IO connection.
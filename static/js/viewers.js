@@ -162,51 +162,77 @@ function hideAllToasts() {
         });
     }
 
+    // Сводки треков текущей страницы, загруженные заранее одним запросом
+    // (/api/viewers/tracks?ids=...): модалка открывается без ожидания сети.
+    var summaryCache = {};
+    var PREFETCH_MAX_IDS = 50;
+
+    function prefetchSummaries(ids) {
+        ids = ids.filter(function (id) { return id && !summaryCache[id]; }).slice(0, PREFETCH_MAX_IDS);
+        if (!ids.length) return;
+        fetch("/api/viewers/tracks?ids=" + encodeURIComponent(ids.join(",")))
+            .then(function (r) { return r.json(); })
+            .then(function (data) {
+                if (!data || !data.tracks) return;
+                Object.keys(data.tracks).forEach(function (id) {
+                    summaryCache[id] = data.tracks[id];
+                });
+            })
+            .catch(function () { /* не критично: модалка загрузит трек сама */ });
+    }
+
     function loadTrack(trackId) {
         hideAllToasts();
+        var cached = summaryCache[String(trackId)];
+        if (cached) {
+            renderTrack(cached);
+            return;
+        }
         fetch("/api/viewers/track/" + trackId)
             .then(function (r) { return r.json(); })
-            .then(function (data) {
-                if (!data || data.error) return;
+            .then(renderTrack);
+    }
 
-                currentTrackId = data.track.id;
-                if ($("#viewer-modal-title")) {
-                    $("#viewer-modal-title").textContent = data.track.name || "Оценка трека";
-                }
-                if ($("#viewer-modal-subtitle")) {
-                    var dt = data.track.created_at ? new Date(data.track.created_at) : null;
-                    $("#viewer-modal-subtitle").textContent = dt
-                        ? "Добавлен: " + dt.toLocaleString("ru-RU")
-                        : "Дата добавления неизвестна";
-                }
+    function renderTrack(data) {
+        if (!data || data.error) return;
 
-                if ($("#viewer-modal-overall")) {
-                    $("#viewer-modal-overall").textContent = (data.overall_avg || 0).toFixed(2);
-                    applyHeatToChip($("#viewer-modal-overall"), data.overall_avg || 0);
-                }
+        currentTrackId = data.track.id;
+        if ($("#viewer-modal-title")) {
+            $("#viewer-modal-title").textContent = data.track.name || "Оценка трека";
+        }
+        if ($("#viewer-modal-subtitle")) {
+            var dt = data.track.created_at ? new Date(data.track.created_at) : null;
+            $("#viewer-modal-subtitle").textContent = dt
+                ? "Добавлен: " + dt.toLocaleString("ru-RU")
+                : "Дата добавления неизвестна";
+        }
 
-                $all(".viewer-slider").forEach(function (s) {
-                    var key = s.dataset.criterion;
-                    var val = 0;
-                    if (data.viewer && data.viewer.scores && data.viewer.scores[key] != null) {
-                        val = data.viewer.scores[key];
-                    }
-                    s.value = val;
-                    var label = document.querySelector('[data-criterion-value="' + key + '"]');
-                    if (label) {
-                        label.textContent = val;
-                        applyHeatToChip(label, val);
-                    }
-                    applyHeatToSlider(s, val);
-                });
+        if ($("#viewer-modal-overall")) {
+            $("#viewer-modal-overall").textContent = (data.overall_avg || 0).toFixed(2);
+            applyHeatToChip($("#viewer-modal-overall"), data.overall_avg || 0);
+        }
 
-                var hasVoted = data.viewer && data.viewer.has_voted;
-                alreadyRated = !!hasVoted;
-                setSlidersEnabled(!hasVoted);
-                updateViewerButtonState();
-                updateViewerOverall();
-                openModal();
-            });
+        $all(".viewer-slider").forEach(function (s) {
+            var key = s.dataset.criterion;
+            var val = 0;
+            if (data.viewer && data.viewer.scores && data.viewer.scores[key] != null) {
+                val = data.viewer.scores[key];
+            }
+            s.value = val;
+            var label = document.querySelector('[data-criterion-value="' + key + '"]');
+            if (label) {
+                label.textContent = val;
+                applyHeatToChip(label, val);
+            }
+            applyHeatToSlider(s, val);
+        });
+
+        var hasVoted = data.viewer && data.viewer.has_voted;
+        alreadyRated = !!hasVoted;
+        setSlidersEnabled(!hasVoted);
+        updateViewerButtonState();
+        updateViewerOverall();
+        openModal();
     }
 
     
@@ -242,6 +268,8 @@ function sendRating() {
             .then(function (r) { return r.json(); })
             .then(function (data) {
                 if (!data) return;
+                // оценка изменила средние: при следующем открытии берём свежие данные
+                delete summaryCache[String(payload.track_id)];
                 if (data.error === "already_rated") {
                     alreadyRated = true;
                     setSlidersEnabled(false);
@@ -276,6 +304,10 @@ function sendRating() {
             });
         });
 
+        prefetchSummaries($all(".viewer-track-row").map(function (row) {
+            return row.getAttribute("data-track-id");
+        }));
+
         // Если пришли на страницу с параметром ?track_id=..., сразу откроем модалку для этого трека (если он на текущей странице)
         try {
             var params = new URLSearchParams(window.location.search);
@@ -0,0 +1,228 @@
+"""Admission control and backpressure for the Socket.IO layer.
+
+After a deploy/restart every open tab reconnects at once. Without limits each
+reconnect runs `handle_connect` (+ a user lookup) and panels immediately pull
+full snapshots, so the first seconds after a restart are the slowest of the
+whole stream. This module provides:
+
+- `admission.try_admit()`: fixed-window cap of new connections per second.
+  Rejected clients get `retry_after_ms` with jitter and retry later
+  (see `connect_error` handling in static/js/app.js and the OBS widget).
+  Judges/admins (by session role, no DB hit) are always admitted.
+- `BackpressureManager`: per-client outbound buffer limit. When a client's
+  Engine.IO queue is backed up, "state" frames (full snapshots that supersede
+  each other) are not queued; only the latest one is kept and flushed once
+  the client drains. While a state frame is pending for a client, its
+  incremental events wait behind it in emit order, so an old snapshot never
+  lands on top of newer updates; a newer snapshot drops the pending events it
+  already includes (STATE_COVERS). A client whose pending queue still grows
+  past SOCKETIO_DEFERRED_MAX is disconnected: it reconnects and resyncs from
+  full snapshots instead of holding unbounded memory on the server.
+- `SOCKETIO_WEBSOCKET_ONLY=1` disables the long-polling transport on the
+  server; templates pass the same setting to the JS client.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from .socket_codec import HybridManager
+
+SOCKETIO_MAX_CONNECTS_PER_SEC = int(os.getenv("SOCKETIO_MAX_CONNECTS_PER_SEC", "50"))  # 0 = unlimited
+SOCKETIO_BACKOFF_MAX_MS = int(os.getenv("SOCKETIO_BACKOFF_MAX_MS", "5000"))
+SOCKETIO_CLIENT_BUFFER = int(os.getenv("SOCKETIO_CLIENT_BUFFER", "64"))  # packets per client
+SOCKETIO_DEFERRED_MAX = int(os.getenv("SOCKETIO_DEFERRED_MAX", "256"))  # pending events per slow client
+SOCKETIO_WEBSOCKET_ONLY = os.getenv("SOCKETIO_WEBSOCKET_ONLY", "0") == "1"
+
+# Events whose payload is a full snapshot: a newer frame makes older ones useless.
+STATE_EVENTS = frozenset({
+    "queue_state",
+    "playback_state",
+    "initial_state",
+    "raters_presence_updated",
+})
+
+# Incremental events already contained in a state frame (initial_state carries the
+# track name and every rater slot with its name, scores and idle flag).
+STATE_COVERS = {
+    "initial_state": frozenset({
+        "track_name_changed",
+        "rater_name_changed",
+        "rater_removed",
+        "slider_updated",
+        "raters_presence_delta",
+    }),
+    "raters_presence_updated": frozenset({"raters_presence_delta"}),
+}
+
+PRIVILEGED_ROLES = ("judge", "admin", "superadmin")
+
+
+class AdmissionController:
+    """Fixed one-second window limiting new Socket.IO connections."""
+
+    def __init__(self, max_per_sec: int = SOCKETIO_MAX_CONNECTS_PER_SEC, backoff_max_ms: int = SOCKETIO_BACKOFF_MAX_MS):
+        self.max_per_sec = max(0, int(max_per_sec))
+        self.backoff_max_ms = max(250, int(backoff_max_ms))
+        self._lock = threading.Lock()
+        self._window = 0
+        self._count = 0
+        self._stats = {"admitted": 0, "rejected": 0, "privileged": 0}
+
+    def try_admit(self, privileged: bool = False) -> Tuple[bool, int]:
+        """Return (admitted, retry_after_ms)."""
+        with self._lock:
+            if privileged:
+                self._stats["privileged"] += 1
+                self._stats["admitted"] += 1
+                return True, 0
+            if not self.max_per_sec:
+                self._stats["admitted"] += 1
+                return True, 0
+            now = time.monotonic()
+            window = int(now)
+            if window != self._window:
+                self._window = window
+                self._count = 0
+            if self._count < self.max_per_sec:
+                self._count += 1
+                self._stats["admitted"] += 1
+                return True, 0
+            self._stats["rejected"] += 1
+            overload = self._count // self.max_per_sec
+            self._count += 1
+        # Spread retries over a window that grows with the overload, plus jitter,
+        # so the next wave does not arrive as a single spike again.
+        until_next_window = int((window + 1 - now) * 1000)
+        spread = min(self.backoff_max_ms, 1000 * (1 + overload))
+        return False, until_next_window + random.randint(0, spread)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        out["max_per_sec"] = self.max_per_sec
+        return out
+
+
+class BackpressureManager(HybridManager):
+    """Client manager that keeps only the latest state frame for slow clients."""
+
+    def __init__(
+        self,
+        *args,
+        buffer_limit: int = SOCKETIO_CLIENT_BUFFER,
+        deferred_limit: int = SOCKETIO_DEFERRED_MAX,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.buffer_limit = max(0, int(buffer_limit))
+        self.deferred_limit = max(1, int(deferred_limit))
+        # eio_sid -> [(event, eio packets), ...] in emit order; present while a state frame is deferred
+        self._deferred: Dict[str, List[Tuple[str, Any]]] = {}
+        self._deferred_lock = threading.Lock()
+        self._flusher_running = False
+        self._stats = {"deferred": 0, "superseded": 0, "held": 0, "flushed": 0, "overflows": 0}
+
+    def _backlog(self, eio_sid) -> int:
+        try:
+            sock = self.server.eio.sockets.get(eio_sid)
+            return int(sock.queue.qsize()) if sock is not None else 0
+        except Exception:
+            return 0
+
+    def _deliver(self, eio_sid, event, eio_pkts) -> None:
+        if not self.buffer_limit:
+            super()._deliver(eio_sid, event, eio_pkts)
+            return
+        is_state = event in STATE_EVENTS
+        overflow = False
+        with self._deferred_lock:
+            queue = self._deferred.get(eio_sid)
+            if queue is not None:
+                if is_state:
+                    # The newer snapshot replaces the pending one and the updates
+                    # it already includes, and goes after the rest.
+                    covered = STATE_COVERS.get(event, frozenset())
+                    before = len(queue)
+                    queue[:] = [item for item in queue if item[0] != event and item[0] not in covered]
+                    self._stats["superseded"] += before - len(queue)
+                    self._stats["deferred"] += 1
+                else:
+                    self._stats["held"] += 1
+                queue.append((event, eio_pkts))
+                overflow = len(queue) > self.deferred_limit
+                if overflow:
+                    self._deferred.pop(eio_sid, None)
+                    self._stats["overflows"] += 1
+        if queue is not None:
+            if overflow:
+                # Not from inside the emit: disconnect handlers emit themselves.
+                self.server.start_background_task(self._drop_client, eio_sid)
+            return
+        if is_state and self._backlog(eio_sid) >= self.buffer_limit:
+            with self._deferred_lock:
+                queue = self._deferred.get(eio_sid)
+                if queue is None:
+                    self._deferred[eio_sid] = [(event, eio_pkts)]
+                else:
+                    covered = STATE_COVERS.get(event, frozenset())
+                    queue[:] = [item for item in queue if item[0] != event and item[0] not in covered]
+                    queue.append((event, eio_pkts))
+                self._stats["deferred"] += 1
+                start = not self._flusher_running
+                self._flusher_running = True
+            if start:
+                self.server.start_background_task(self._flush_loop)
+            return
+        super()._deliver(eio_sid, event, eio_pkts)
+
+    def _drop_client(self, eio_sid) -> None:
+        try:
+            self.server.eio.disconnect(eio_sid)
+        except Exception:
+            pass
+
+    def _flush_loop(self) -> None:
+        low_watermark = max(1, self.buffer_limit // 2)
+        while True:
+            self.server.sleep(0.25)
+            with self._deferred_lock:
+                sids = list(self._deferred)
+                if not sids:
+                    self._flusher_running = False
+                    return
+            for eio_sid in sids:
+                if eio_sid not in self.server.eio.sockets:
+                    with self._deferred_lock:
+                        self._deferred.pop(eio_sid, None)
+                    continue
+                if self._backlog(eio_sid) > low_watermark:
+                    continue
+                # Send under the lock: an emit racing with the flush must not
+                # overtake the packets queued before it.
+                with self._deferred_lock:
+                    queue = self._deferred.pop(eio_sid, None) or []
+                    for event, eio_pkts in queue:
+                        try:
+                            HybridManager._deliver(self, eio_sid, event, eio_pkts)
+                        except Exception:
+                            pass
+                    self._stats["flushed"] += len(queue)
+
+    def backpressure_stats(self) -> Dict[str, Any]:
+        with self._deferred_lock:
+            out = dict(self._stats)
+            out["pending"] = len(self._deferred)
+        out["buffer_limit"] = self.buffer_limit
+        return out
+
+
+def socketio_transport_options() -> dict:
+    if SOCKETIO_WEBSOCKET_ONLY:
+        return {"transports": ["websocket"]}
+    return {}
+
+
+admission = AdmissionController()
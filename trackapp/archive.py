@@ -0,0 +1,348 @@
+"""Static snapshots of past seasons (track pages, season top lists, ended awards).
+
+A season is a calendar quarter of `Track.created_at` (`2025-q3`). Tracks of
+past seasons rarely change, yet every visit to an old `/track/<id>` ran the
+live aggregates. `export_archive()` (run from cron:
+`python -m trackapp.scripts.export_archive`) writes under ARCHIVE_DIR
+(default `UPLOAD_DIR/archive/`):
+
+- `tracks/<id>.html` — the anonymous track page as rendered live, and
+  `tracks/<id>.json` — its summary payload;
+- `<season>/index.html` + `<season>/season.json` — top list of the season
+  and its ended awards with winners;
+- `manifest.json` — per track/season fingerprint of the data that went into
+  the snapshot.
+
+Exports are incremental: a track is re-rendered only when its fingerprint
+(scores, reviews, name, badges) changed or its file is missing; a season
+only when one of its tracks or awards did.
+
+Serving: `/archive` and `/archive/<season>` always come from the snapshots.
+With ARCHIVE_SERVE=1, anonymous `/track/<id>` requests for archived tracks
+are answered from `tracks/<id>.html` as well (no DB work). Absolute links in
+the snapshots are built from ARCHIVE_BASE_URL (the public site URL); without
+it the export refuses to run and ARCHIVE_SERVE is ignored.
+`invalidate_track_page()` drops the snapshot of a track that changed (new
+review, rename, award nomination/winner, ...), so it is served live until
+the next export.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from .extensions import UPLOAD_DIR, app, db
+from .models import Award, Track, TrackReview
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(UPLOAD_DIR, "archive"))
+ARCHIVE_SERVE = os.getenv("ARCHIVE_SERVE", "0") == "1"
+# Public site URL: snapshots are rendered outside a request, and their
+# absolute links (share URL, og:url, ...) must point at the real site.
+ARCHIVE_BASE_URL = os.getenv("ARCHIVE_BASE_URL", "").strip()
+if ARCHIVE_SERVE and not ARCHIVE_BASE_URL:
+    print("[Archive] Warning: ARCHIVE_SERVE=1 needs ARCHIVE_BASE_URL; track pages are rendered live")
+    ARCHIVE_SERVE = False
+ARCHIVE_CHUNK = 200
+
+MANIFEST_FILE = "manifest.json"
+
+_lock = threading.Lock()
+_manifest: Dict[str, Dict[str, Any]] = {"tracks": {}, "seasons": {}}
+# mtime of the manifest we hold; the web workers pick up a cron export by it
+_manifest_mtime = 0.0
+_checked_at = 0.0
+MANIFEST_CHECK_SEC = 5.0
+
+
+# -----------------
+# Seasons
+# -----------------
+
+def season_of(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    return f"{dt.year}-q{(dt.month - 1) // 3 + 1}"
+
+
+def season_start(now: Optional[datetime] = None) -> datetime:
+    """Start of the current season: everything created before it is archivable."""
+    now = now or datetime.utcnow()
+    return datetime(now.year, 3 * ((now.month - 1) // 3) + 1, 1)
+
+
+def season_bounds(season: str) -> Tuple[datetime, datetime]:
+    year, q = season.split("-q")
+    start = datetime(int(year), 3 * (int(q) - 1) + 1, 1)
+    end = datetime(start.year + 1, 1, 1) if start.month == 10 else datetime(start.year, start.month + 3, 1)
+    return start, end
+
+
+# -----------------
+# Files / manifest
+# -----------------
+
+def _path(*parts: str) -> str:
+    return os.path.join(ARCHIVE_DIR, *parts)
+
+
+def _write_atomic(path: str, data: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _fingerprint(payload: Any) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def load_manifest() -> None:
+    global _manifest, _manifest_mtime
+    mtime = 0.0
+    try:
+        mtime = os.path.getmtime(_path(MANIFEST_FILE))
+        with open(_path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data.setdefault("tracks", {})
+        data.setdefault("seasons", {})
+    except FileNotFoundError:
+        data = {"tracks": {}, "seasons": {}}
+    except Exception as e:
+        print("[Archive] Warning: bad manifest, snapshots ignored until the next export:", e)
+        data = {"tracks": {}, "seasons": {}}
+    with _lock:
+        _manifest = data
+        _manifest_mtime = mtime
+
+
+def _maybe_reload() -> None:
+    """Re-read the manifest when an export (another process) rewrote it; stat at most every few seconds."""
+    global _checked_at
+    now = time.monotonic()
+    if now - _checked_at < MANIFEST_CHECK_SEC:
+        return
+    _checked_at = now
+    try:
+        mtime = os.path.getmtime(_path(MANIFEST_FILE))
+    except OSError:
+        return
+    if mtime != _manifest_mtime:
+        load_manifest()
+
+
+def _save_manifest() -> None:
+    global _manifest_mtime
+    with _lock:
+        data = json.dumps(_manifest, ensure_ascii=False, indent=1, sort_keys=True)
+    _write_atomic(_path(MANIFEST_FILE), data)
+    with _lock:
+        _manifest_mtime = os.path.getmtime(_path(MANIFEST_FILE))
+
+
+def seasons() -> List[Dict[str, Any]]:
+    """Archived seasons, newest first (from the manifest, no DB)."""
+    _maybe_reload()
+    with _lock:
+        items = [dict(v, season=k) for k, v in _manifest["seasons"].items()]
+    return sorted(items, key=lambda s: s["season"], reverse=True)
+
+
+def season_file(season: str, name: str) -> Optional[str]:
+    _maybe_reload()
+    with _lock:
+        known = season in _manifest["seasons"]
+    path = _path(season, name)
+    return path if known and os.path.isfile(path) else None
+
+
+def track_snapshot_path(track_id: int) -> Optional[str]:
+    """Snapshot of an archived track page, or None (render live)."""
+    _maybe_reload()
+    with _lock:
+        known = str(int(track_id)) in _manifest["tracks"]
+    if not known:
+        return None
+    path = _path("tracks", f"{int(track_id)}.html")
+    return path if os.path.isfile(path) else None
+
+
+def drop_track_snapshot(track_id) -> None:
+    """The track changed: stop serving its snapshot (the next export re-renders it)."""
+    try:
+        key = str(int(track_id))
+        with _lock:
+            known = _manifest["tracks"].pop(key, None) is not None
+        if known:
+            os.remove(_path("tracks", f"{key}.html"))
+    except Exception:
+        pass
+
+
+# -----------------
+# Export
+# -----------------
+
+def _track_fingerprints(details: Dict[int, Any]) -> Dict[int, str]:
+    ids = list(details.keys())
+    review_marks = dict(
+        (tid, (cnt, str(last)))
+        for tid, cnt, last in db.session.query(
+            TrackReview.track_id, func.count(TrackReview.id), func.max(TrackReview.updated_at)
+        )
+        .filter(TrackReview.track_id.in_(ids))
+        .group_by(TrackReview.track_id)
+        .all()
+    )
+    out = {}
+    for tid, d in details.items():
+        out[tid] = _fingerprint([
+            d.name, d.overall_avg, d.criteria, d.raters, d.review_overall, d.review_count,
+            d.award_noms, d.award_wins, d.audio_url, review_marks.get(tid),
+        ])
+    return out
+
+
+def _render_track_html(track_id: int) -> Optional[str]:
+    from .routes.public import _render_track_page
+
+    with app.test_request_context(f"/track/{track_id}", base_url=ARCHIVE_BASE_URL):
+        html = _render_track_page(track_id)
+    return html if isinstance(html, str) else None
+
+
+def _ended_awards(season: str) -> List[Dict[str, Any]]:
+    start, end = season_bounds(season)
+    out = []
+    awards = (
+        db.session.query(Award)
+        .filter(Award.status == "ended", Award.created_at >= start, Award.created_at < end)
+        .order_by(Award.created_at.asc())
+        .all()
+    )
+    for a in awards:
+        winner = None
+        if a.winner_snapshot_json:
+            try:
+                winner = json.loads(a.winner_snapshot_json)
+            except Exception:
+                winner = None
+        out.append({
+            "id": a.id,
+            "title": a.title,
+            "emoji": a.icon_emoji or "🏆",
+            "description": a.description,
+            "winner": {"track_id": winner.get("track_id"), "track_name": winner.get("track_name")} if winner else None,
+        })
+    return out
+
+
+def _write_season(season: str, rows: List[Dict[str, Any]], awards: List[Dict[str, Any]]) -> None:
+    from flask import render_template
+
+    ranked = sorted(
+        (r for r in rows if r["avg_streamers"] is not None),
+        key=lambda r: (-r["avg_streamers"], r["id"]),
+    )
+    for pos, r in enumerate(ranked, start=1):
+        r["position"] = pos
+    payload = {"season": season, "exported_at": datetime.utcnow().isoformat(), "top": ranked, "awards": awards}
+    _write_atomic(_path(season, "season.json"), json.dumps(payload, ensure_ascii=False, indent=1))
+    with app.test_request_context(f"/archive/{season}", base_url=ARCHIVE_BASE_URL):
+        html = render_template("archive_season.html", season=season, tracks=ranked, awards=awards)
+    _write_atomic(_path(season, "index.html"), html)
+
+
+def export_archive(force: bool = False, only_season: Optional[str] = None) -> Dict[str, int]:
+    """Render snapshots of past seasons; unchanged tracks/seasons are skipped. Needs an app context."""
+    from .track_details import load_track_details_batch
+
+    if not ARCHIVE_BASE_URL:
+        raise SystemExit("ARCHIVE_BASE_URL (public site URL, e.g. https://rating.example.org/) is required for the archive export")
+    load_manifest()
+    cutoff = season_start()
+    q = db.session.query(Track.id, Track.created_at).filter(
+        Track.is_deleted.is_(False), Track.created_at.isnot(None), Track.created_at < cutoff
+    )
+    by_season: Dict[str, List[int]] = {}
+    for tid, created_at in q.order_by(Track.id.asc()).all():
+        s = season_of(created_at)
+        if only_season and s != only_season:
+            continue
+        by_season.setdefault(s, []).append(tid)
+
+    result = {"seasons": 0, "seasons_written": 0, "tracks": 0, "tracks_written": 0}
+    for season, track_ids in sorted(by_season.items()):
+        result["seasons"] += 1
+        rows: List[Dict[str, Any]] = []
+        track_fps: List[str] = []
+        for i in range(0, len(track_ids), ARCHIVE_CHUNK):
+            details = load_track_details_batch(track_ids[i:i + ARCHIVE_CHUNK])
+            fps = _track_fingerprints(details)
+            for tid in sorted(details):
+                d = details[tid]
+                fp = fps[tid]
+                track_fps.append(fp)
+                result["tracks"] += 1
+                rows.append({
+                    "id": tid,
+                    "name": d.name,
+                    "created_at": d.created_at.isoformat() if d.created_at else None,
+                    "avg_streamers": d.overall_avg,
+                    "avg_viewers": d.review_overall,
+                    "review_count": d.review_count,
+                    "award_noms": [b._asdict() for b in d.award_noms],
+                    "award_wins": [b._asdict() for b in d.award_wins],
+                })
+                key = str(tid)
+                with _lock:
+                    prev = _manifest["tracks"].get(key)
+                html_path = _path("tracks", f"{tid}.html")
+                if not force and prev and prev.get("fp") == fp and os.path.isfile(html_path):
+                    continue
+                html = _render_track_html(tid)
+                if html is None:
+                    continue
+                _write_atomic(html_path, html)
+                _write_atomic(_path("tracks", f"{tid}.json"), json.dumps(d.to_summary(), ensure_ascii=False))
+                with _lock:
+                    _manifest["tracks"][key] = {"season": season, "fp": fp, "exported_at": datetime.utcnow().isoformat()}
+                result["tracks_written"] += 1
+            # the session keeps every loaded row otherwise
+            db.session.expunge_all()
+
+        awards = _ended_awards(season)
+        season_fp = _fingerprint([track_fps, awards])
+        with _lock:
+            prev = _manifest["seasons"].get(season)
+        if force or not prev or prev.get("fp") != season_fp or not os.path.isfile(_path(season, "index.html")):
+            _write_season(season, rows, awards)
+            with _lock:
+                _manifest["seasons"][season] = {
+                    "fp": season_fp,
+                    "tracks": len(rows),
+                    "awards": len(awards),
+                    "exported_at": datetime.utcnow().isoformat(),
+                }
+            result["seasons_written"] += 1
+        _save_manifest()
+    return result
+
+
+def send_snapshot(path: str):
+    """Response for a snapshot file (HTML/JSON), revalidated by mtime."""
+    from flask import send_file
+
+    resp = send_file(path, conditional=True, max_age=300)
+    resp.headers["X-Archive-Snapshot"] = "1"
+    return resp
+
+
+load_manifest()
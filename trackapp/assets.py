@@ -0,0 +1,163 @@
+"""Fingerprinted, precompressed static assets.
+
+`css/style.css` and `js/app.js` are large and used to be served under fixed
+names, so every deploy meant clients revalidating everything and nothing
+was compressed ahead of time. The build step
+(`python -m trackapp.scripts.build_assets`, run on deploy) writes into
+ASSETS_DIST_DIR (default `static/dist/`):
+
+- a copy of every file under static/{img,js,css} with a content hash in its
+  name (`css/style.3f2a9c1b7e.css`). Relative `url(...)` references in CSS
+  are rewritten to the hashed image names;
+- `.gz` and, if the `brotli` package is installed, `.br` siblings for text
+  assets;
+- `manifest.json`: logical path -> hashed path.
+
+Templates call `asset_url("css/style.css")`. With a manifest it points to
+`/assets/<hashed name>`, which is safe to cache forever (`immutable`);
+without one (dev checkout) it falls back to the plain static URL.
+
+`/assets/...` is served by Flask (route `hashed_asset`), picking `.br`/`.gz`
+by Accept-Encoding, so this works without nginx. Behind nginx the location
+can be served directly from the dist directory instead (see README).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Optional
+
+from flask import url_for
+
+from .extensions import app
+
+STATIC_DIR = app.static_folder
+ASSETS_DIST_DIR = os.getenv("ASSETS_DIST_DIR", os.path.join(STATIC_DIR, "dist"))
+ASSETS_PRECOMPRESSED = os.getenv("ASSETS_PRECOMPRESSED", "1") == "1"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MANIFEST_FILE = "manifest.json"
+# Images first: CSS is rewritten to point at their hashed names.
+ASSET_SOURCES = ("img", "js", "css")
+COMPRESSIBLE_EXTS = (".css", ".js", ".svg", ".txt", ".json", ".map")
+_CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+# -----------------
+# Build
+# -----------------
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _rewrite_css_urls(css: bytes, rel_path: str, manifest: Dict[str, str]) -> bytes:
+    base = os.path.dirname(rel_path)
+
+    def repl(m):
+        quote, target = m.group(1), m.group(2)
+        if re.match(r"^([a-z]+:|//|/|#|data:)", target, re.I):
+            return m.group(0)
+        path, sep, suffix = target.partition("?")
+        logical = os.path.normpath(os.path.join(base, path)).replace(os.sep, "/")
+        hashed = manifest.get(logical)
+        if not hashed:
+            return m.group(0)
+        new = os.path.relpath(hashed, base or ".").replace(os.sep, "/")
+        return f"url({quote}{new}{sep}{suffix}{quote})"
+
+    return _CSS_URL_RE.sub(repl, css.decode("utf-8")).encode("utf-8")
+
+
+def _compressors():
+    out = [(".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+    try:
+        import brotli  # optional
+
+        out.append((".br", lambda data: brotli.compress(data, quality=11)))
+    except ImportError:
+        print("[Assets] brotli is not installed: writing .gz only")
+    return out
+
+
+def build_assets(static_dir: str = STATIC_DIR, dist_dir: str = ASSETS_DIST_DIR) -> Dict[str, str]:
+    """Fingerprint + precompress static assets and write the manifest. Returns the manifest."""
+    manifest: Dict[str, str] = {}
+    compressors = _compressors()
+    for sub in ASSET_SOURCES:
+        src_root = os.path.join(static_dir, sub)
+        for root, _dirs, files in os.walk(src_root):
+            for name in sorted(files):
+                src = os.path.join(root, name)
+                rel = os.path.relpath(src, static_dir).replace(os.sep, "/")
+                with open(src, "rb") as f:
+                    data = f.read()
+                if rel.endswith(".css"):
+                    data = _rewrite_css_urls(data, rel, manifest)
+                digest = hashlib.sha256(data).hexdigest()[:10]
+                stem, ext = os.path.splitext(rel)
+                hashed = f"{stem}.{digest}{ext}"
+                out = os.path.join(dist_dir, hashed)
+                # Same name = same content: earlier builds are left alone (and old
+                # hashed files stay for pages rendered before the deploy).
+                if not os.path.exists(out):
+                    _write_atomic(out, data)
+                    if ext.lower() in COMPRESSIBLE_EXTS:
+                        for suffix, compress in compressors:
+                            packed = compress(data)
+                            if len(packed) < len(data):
+                                _write_atomic(out + suffix, packed)
+                manifest[rel] = hashed
+    _write_atomic(
+        os.path.join(dist_dir, MANIFEST_FILE),
+        json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+    )
+    load_manifest(dist_dir)
+    return manifest
+
+
+# -----------------
+# Runtime
+# -----------------
+
+_manifest: Dict[str, str] = {}
+
+
+def load_manifest(dist_dir: str = ASSETS_DIST_DIR) -> None:
+    global _manifest
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {}
+    except Exception as e:
+        print("[Assets] Warning: bad manifest, serving plain static files:", e)
+        _manifest = {}
+
+
+def asset_url(path: str) -> str:
+    """URL of a static asset: hashed + immutable when built, plain /static/ otherwise."""
+    hashed = _manifest.get(path)
+    if hashed:
+        return url_for("hashed_asset", filename=hashed)
+    return url_for("static", filename=path)
+
+
+def pick_encoding(filename: str, accept_encodings) -> Optional[str]:
+    """Precompressed sibling suffix to serve for this request ('.br'/'.gz') or None."""
+    if not ASSETS_PRECOMPRESSED:
+        return None
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accept_encodings[encoding] and os.path.isfile(os.path.join(ASSETS_DIST_DIR, filename + suffix)):
+            return suffix
+    return None
+
+
+load_manifest()
+app.jinja_env.globals["asset_url"] = asset_url
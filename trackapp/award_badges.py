@@ -0,0 +1,146 @@
+"""In-memory track_id -> award badges index.
+
+Every leaderboard page and every track view joined `AwardNomination` with
+`Award` (once for nominee badges, once more for winners) although award
+state changes a few times a month. The index is built once at startup (one
+query over all nominations) and then:
+
+- award handlers call `badge_index.refresh_tracks(ids)` after their commit
+  for the tracks they touched (nominate, remove nomination, set/unset
+  winner, end, update, delete) — one query over those tracks only;
+- readers (`top_tracks`, `load_track_details_batch`) do dict lookups;
+- BADGE_INDEX_TTL_SEC (default 300, 0 = no expiry) bounds staleness for
+  changes made by another process: an expired index is rebuilt on the next
+  read.
+
+A badge counts as a nomination while the award is active or ended, and as a
+win when the award's `winner_nomination_id` points at the nomination (same
+rules as before). Badges of a track are ordered newest award first.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .extensions import app, db
+from .models import Award, AwardNomination
+
+BADGE_INDEX_TTL_SEC = max(0.0, float(os.getenv("BADGE_INDEX_TTL_SEC", "300")))
+
+Badge = namedtuple("Badge", "title emoji kind")
+# (nomination badges, winner badges)
+TrackBadges = Tuple[Tuple[Badge, ...], Tuple[Badge, ...]]
+_EMPTY: TrackBadges = ((), ())
+
+
+def _load(track_ids: Optional[List[int]] = None) -> Dict[int, TrackBadges]:
+    q = (
+        db.session.query(
+            AwardNomination.id,
+            AwardNomination.track_id,
+            Award.title,
+            Award.icon_emoji,
+            Award.status,
+            Award.winner_nomination_id,
+        )
+        .join(Award, Award.id == AwardNomination.award_id)
+    )
+    if track_ids is not None:
+        q = q.filter(AwardNomination.track_id.in_(track_ids))
+    noms: Dict[int, List[Badge]] = {}
+    wins: Dict[int, List[Badge]] = {}
+    for nom_id, track_id, title, emoji, status, winner_nom_id in q.order_by(Award.created_at.desc()).all():
+        if status in ("active", "ended"):
+            noms.setdefault(track_id, []).append(Badge(title, emoji or "🎖", "nom"))
+        if winner_nom_id == nom_id:
+            wins.setdefault(track_id, []).append(Badge(title, emoji or "🏆", "win"))
+    return {
+        tid: (tuple(noms.get(tid, ())), tuple(wins.get(tid, ())))
+        for tid in set(noms) | set(wins)
+    }
+
+
+class BadgeIndex:
+    def __init__(self, ttl_sec: float = BADGE_INDEX_TTL_SEC):
+        self.ttl_sec = float(ttl_sec)
+        self._lock = threading.Lock()
+        self._badges: Dict[int, TrackBadges] = {}
+        self._built = False
+        self._expires_at = 0.0
+        # bumped by refresh_tracks(): a rebuild that raced with it is redone
+        self._version = 0
+        self._stats = {"rebuilds": 0, "refreshes": 0, "lookups": 0}
+
+    def _stale(self) -> bool:
+        if not self._built:
+            return True
+        return self.ttl_sec > 0 and time.monotonic() >= self._expires_at
+
+    def rebuild(self) -> int:
+        """Reload the whole index (one query). Needs an app context."""
+        with self._lock:
+            version = self._version
+        badges = _load()
+        with self._lock:
+            self._badges = badges
+            self._built = True
+            # A refresh committed while we were reading may be missing here.
+            self._expires_at = time.monotonic() + self.ttl_sec if version == self._version else 0.0
+            self._stats["rebuilds"] += 1
+        return len(badges)
+
+    def refresh_tracks(self, track_ids: Iterable[int]) -> None:
+        """Re-read the badges of these tracks (call after the writer's commit)."""
+        ids = sorted({int(t) for t in track_ids if t is not None})
+        if not ids:
+            return
+        try:
+            fresh = _load(ids)
+        except Exception as e:
+            print("Warning: badge index refresh failed:", e)
+            with self._lock:
+                self._built = False
+            return
+        with self._lock:
+            for tid in ids:
+                if tid in fresh:
+                    self._badges[tid] = fresh[tid]
+                else:
+                    self._badges.pop(tid, None)
+            self._version += 1
+            self._stats["refreshes"] += 1
+
+    def for_tracks(self, track_ids: Iterable[int]) -> Dict[int, TrackBadges]:
+        """track_id -> (noms, wins) for the given ids (empty tuples when none)."""
+        if self._stale():
+            try:
+                self.rebuild()
+            except Exception as e:
+                print("Warning: badge index rebuild failed:", e)
+        with self._lock:
+            self._stats["lookups"] += 1
+            return {int(t): self._badges.get(int(t), _EMPTY) for t in track_ids}
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["tracks"] = len(self._badges)
+        out["ttl_sec"] = self.ttl_sec
+        return out
+
+
+badge_index = BadgeIndex()
+
+
+def init_badge_index() -> None:
+    """Startup hook: build the index so the first leaderboard render doesn't pay for it."""
+    try:
+        with app.app_context():
+            badge_index.rebuild()
+    except Exception as e:
+        print("Warning: could not build badge index:", e)
+
+
+init_badge_index()
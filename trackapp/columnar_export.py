@@ -0,0 +1,231 @@
+"""Incremental Parquet / Arrow IPC dumps of scores and reviews for analysts.
+
+    python -m trackapp.scripts.export_columnar [--format parquet|arrow] [--verify]
+
+Layout under COLUMNAR_EXPORT_DIR (default `columnar/` next to the DB),
+partitioned by the month of `created_at` (hive style, so
+`pyarrow.dataset` / pandas / duckdb read a table directory as one dataset):
+
+    evaluations/month=2025-01/part-000000000000.parquet
+    evaluations/month=2025-02/part-000000000000.parquet
+    evaluations/month=2025-02/part-000000182311.parquet   <- next run
+    _state.json                                           <- max exported id per table
+
+Each run exports only rows with an id above the one recorded in
+`_state.json` (the tables are append-mostly; edited reviews are not
+re-exported — use `--full` for a fresh dump). Rows are read through the
+same server-side cursor as the CSV export (trackapp/data_export.py) in
+chunks of COLUMNAR_CHUNK_ROWS, converted to typed Arrow arrays and appended
+to the month's file as a row group, so memory is bounded by one chunk.
+Part files are named after the starting id of the run: a run that died
+before updating the state is simply redone over the same files.
+
+`pyarrow` is optional (not in requirements.txt): install it on the host that
+runs the export.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, Integer
+
+from .data_export import TABLES, columns, iter_rows
+from .extensions import DB_PATH
+
+COLUMNAR_EXPORT_DIR = os.getenv(
+    "COLUMNAR_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "columnar"),
+)
+COLUMNAR_CHUNK_ROWS = max(1000, int(os.getenv("COLUMNAR_CHUNK_ROWS", "50000")))
+
+COLUMNAR_TABLES = ("evaluations", "viewer_ratings", "track_reviews")
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+STATE_FILE = "_state.json"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise SystemExit("pyarrow is required for the columnar export: pip install pyarrow")
+    return pyarrow
+
+
+def schema(table: str):
+    """Arrow schema from the SQLAlchemy column types (+ int score_<key> columns for reviews)."""
+    pa = _pyarrow()
+    model = TABLES[table][0]
+    fields = []
+    for name in columns(table):
+        if name.startswith("score_") and not hasattr(model, name):
+            fields.append(pa.field(name, pa.int32()))
+            continue
+        col_type = getattr(model, name).type
+        if isinstance(col_type, (Integer, BigInteger)):
+            typ = pa.int64()
+        elif isinstance(col_type, Float):
+            typ = pa.float64()
+        elif isinstance(col_type, Boolean):
+            typ = pa.bool_()
+        elif isinstance(col_type, DateTime):
+            typ = pa.timestamp("us")
+        else:
+            typ = pa.string()
+        fields.append(pa.field(name, typ))
+    return pa.schema(fields)
+
+
+def _month(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m") if value else "unknown"
+
+
+def _record_batch(pa, sch, rows: List[Dict[str, Any]]):
+    arrays = []
+    for field in sch:
+        if field.name.startswith("score_") and field.name not in rows[0]:
+            key = field.name[len("score_"):]
+            values = [(r.get("scores") or {}).get(key) for r in rows]
+        else:
+            values = [r.get(field.name) for r in rows]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=sch)
+
+
+class _MonthWriters:
+    """One open writer per month partition touched by the current run."""
+
+    def __init__(self, pa, sch, table_dir: str, fmt: str, part_name: str):
+        self.pa, self.sch, self.table_dir, self.fmt, self.part_name = pa, sch, table_dir, fmt, part_name
+        self._writers: Dict[str, Any] = {}
+        self._sinks: Dict[str, Any] = {}
+        self.files: Dict[str, str] = {}
+
+    def write(self, month: str, batch) -> None:
+        writer = self._writers.get(month)
+        if writer is None:
+            part_dir = os.path.join(self.table_dir, f"month={month}")
+            os.makedirs(part_dir, exist_ok=True)
+            path = os.path.join(part_dir, self.part_name)
+            if self.fmt == "parquet":
+                writer = self.pa.parquet.ParquetWriter(path, self.sch, compression="zstd")
+            else:
+                sink = self.pa.OSFile(path, "wb")
+                self._sinks[month] = sink
+                writer = self.pa.ipc.new_file(sink, self.sch)
+            self._writers[month] = writer
+            self.files[month] = path
+        if self.fmt == "parquet":
+            writer.write_table(self.pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        for sink in self._sinks.values():
+            sink.close()
+
+
+def load_state(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"tables": {}}
+
+
+def _save_state(out_dir: str, state: Dict[str, Any]) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def export_table(table: str, out_dir: str = COLUMNAR_EXPORT_DIR, fmt: str = "parquet", full: bool = False) -> Dict[str, Any]:
+    """Append the rows added since the last run to the month partitions. Needs an app context."""
+    pa = _pyarrow()
+    if fmt not in EXTENSIONS:
+        raise ValueError("bad_format")
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    table_dir = os.path.join(out_dir, table)
+    prev = state["tables"].get(table)
+    if full or (prev and prev.get("format") != fmt):
+        # другой формат в той же папке не смешиваем — начинаем заново
+        shutil.rmtree(table_dir, ignore_errors=True)
+        prev = None
+    after_id = int(prev["max_id"]) if prev else 0
+
+    sch = schema(table)
+    writers = _MonthWriters(pa, sch, table_dir, fmt, f"part-{after_id:012d}{EXTENSIONS[fmt]}")
+    rows_written, max_id = 0, after_id
+    try:
+        for rows in iter_rows(table, after_id=after_id, yield_per=COLUMNAR_CHUNK_ROWS):
+            by_month: Dict[str, List[Dict[str, Any]]] = {}
+            for r in rows:
+                by_month.setdefault(_month(r.get("created_at")), []).append(r)
+            for month, month_rows in by_month.items():
+                writers.write(month, _record_batch(pa, sch, month_rows))
+            rows_written += len(rows)
+            max_id = rows[-1]["id"]
+    finally:
+        writers.close()
+
+    state["tables"][table] = {
+        "format": fmt,
+        "max_id": max_id,
+        "rows": (int(prev["rows"]) if prev else 0) + rows_written,
+        "exported_at": datetime.utcnow().isoformat(),
+    }
+    _save_state(out_dir, state)
+    return {"table": table, "rows": rows_written, "max_id": max_id, "files": sorted(writers.files.values())}
+
+
+def verify_table(table: str, out_dir: str = COLUMNAR_EXPORT_DIR) -> Dict[str, Any]:
+    """Read the partitions back (id column only) and check them against `_state.json`."""
+    pa = _pyarrow()
+    info = load_state(out_dir)["tables"].get(table)
+    if not info:
+        return {"table": table, "ok": True, "rows": 0}
+    table_dir = os.path.join(out_dir, table)
+    ext = EXTENSIONS[info["format"]]
+    expected = schema(table)
+    rows, max_id, problems = 0, 0, []
+    for root, _dirs, files in sorted(os.walk(table_dir)):
+        for name in sorted(f for f in files if f.endswith(ext)):
+            path = os.path.join(root, name)
+            last = None
+            if info["format"] == "parquet":
+                pf = pa.parquet.ParquetFile(path)
+                file_schema = pf.schema_arrow
+                batches = (b.column(0) for b in pf.iter_batches(columns=["id"]))
+            else:
+                reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+                file_schema = reader.schema
+                id_index = file_schema.get_field_index("id")
+                batches = (reader.get_batch(i).column(id_index) for i in range(reader.num_record_batches))
+            if not file_schema.equals(expected):
+                problems.append(f"{path}: schema mismatch")
+            for ids in batches:
+                values = ids.to_pylist()
+                if last is not None:
+                    values.insert(0, last)
+                    rows -= 1
+                if any(b <= a for a, b in zip(values, values[1:])):
+                    problems.append(f"{path}: ids not increasing")
+                    break
+                rows += len(values)
+                if values:
+                    last = values[-1]
+                    max_id = max(max_id, last)
+    if rows != int(info["rows"]):
+        problems.append(f"rows {rows} != state {info['rows']}")
+    if rows and max_id != int(info["max_id"]):
+        problems.append(f"max id {max_id} != state {info['max_id']}")
+    return {"table": table, "ok": not problems, "rows": rows, "problems": problems}
@@ -24,18 +24,22 @@ from .extensions import (
     _s3_key_for_submission,
 )
 from .state import (
+    _active_track_payload,
     _broadcast_playback_state,
     _broadcast_queue_state,
     _compute_playback_position_ms,
     _get_playback_snapshot,
+    _get_queue_snapshot,
     _get_track_url,
     _init_default_raters,
+    _invalidate_active_track,
     _is_image_filename,
     _is_safe_uuid,
     _now_ms,
     _require_admin,
     _require_panel_access,
     _require_superadmin,
+    _schedule_queue_broadcast,
     _serialize_queue_state,
     _serialize_state,
     _submission_display_name,
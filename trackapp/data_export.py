@@ -0,0 +1,185 @@
+"""Streaming CSV / NDJSON export of the rating tables (admin).
+
+Admins used to copy the SQLite file to get at the data. Now:
+
+    GET /api/admin/export/<table>?format=csv|ndjson
+        &since=2025-01-01&until=2025-03-31&track_id=12&after_id=0&limit=
+
+    python -m trackapp.scripts.export_data <table> [--format ndjson] [...]
+
+Tables: `evaluations`, `viewer_ratings`, `track_reviews` (with the
+per-criterion scores: a `scores` object in NDJSON, `score_<key>` columns in
+CSV) and `track_submissions`.
+
+Rows go out in id order straight from a server-side cursor
+(`yield_per(EXPORT_YIELD_PER)`), one chunk of encoded lines at a time, so
+memory does not depend on the table size. The order doubles as a keyset
+cursor: an interrupted download is resumed with `after_id=<last id
+received>` (the `id` column of the last complete line) — no OFFSET, no
+duplicates. `since`/`until` filter by `created_at` (a bare date in `until`
+includes the whole day); `track_id` maps to `linked_track_id` for
+submissions.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from .extensions import CRITERIA, db
+from .models import Evaluation, TrackReview, TrackReviewScore, TrackSubmission, ViewerRating
+
+EXPORT_YIELD_PER = max(100, int(os.getenv("EXPORT_YIELD_PER", "2000")))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# table -> (model, exported columns, track column)
+TABLES = {
+    "evaluations": (
+        Evaluation,
+        ["id", "track_id", "rater_name", "criterion_key", "score", "created_at"],
+        "track_id",
+    ),
+    "viewer_ratings": (
+        ViewerRating,
+        ["id", "track_id", "viewer_id", "criterion_key", "score", "created_at"],
+        "track_id",
+    ),
+    "track_reviews": (
+        TrackReview,
+        ["id", "track_id", "user_id", "overall", "text", "created_at", "updated_at"],
+        "track_id",
+    ),
+    "track_submissions": (
+        TrackSubmission,
+        [
+            "id", "artist", "title", "status", "priority", "original_filename", "original_ext",
+            "duration_sec", "linked_track_id", "created_at", "tg_user_id", "tg_username",
+            "payment_status", "payment_provider", "payment_amount",
+        ],
+        "linked_track_id",
+    ),
+}
+
+_SCORE_COLUMNS = [f"score_{key}" for key, _label in CRITERIA]
+
+
+def parse_when(raw: Optional[str], end: bool = False) -> Optional[datetime]:
+    """ISO date/datetime -> datetime; a bare date as `end` means the next midnight (exclusive bound)."""
+    if not raw:
+        return None
+    raw = raw.strip()
+    try:
+        value = datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError("bad_date")
+    if end and len(raw) == 10:
+        value += timedelta(days=1)
+    return value.replace(tzinfo=None)
+
+
+def columns(table: str) -> List[str]:
+    cols = list(TABLES[table][1])
+    if table == "track_reviews":
+        cols += _SCORE_COLUMNS
+    return cols
+
+
+def iter_rows(
+    table: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    track_id: Optional[int] = None,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    yield_per: int = EXPORT_YIELD_PER,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Chunks of row dicts in id order (each chunk ≤ yield_per rows). Needs an app context."""
+    if table not in TABLES:
+        raise ValueError("unknown_table")
+    model, cols, track_col = TABLES[table]
+    stmt = select(*[getattr(model, c) for c in cols]).where(model.id > int(after_id or 0))
+    if since is not None:
+        stmt = stmt.where(model.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(model.created_at < until)
+    if track_id is not None:
+        stmt = stmt.where(getattr(model, track_col) == int(track_id))
+    stmt = stmt.order_by(model.id.asc())
+    if limit:
+        stmt = stmt.limit(int(limit))
+
+    result = db.session.execute(stmt.execution_options(yield_per=int(yield_per)))
+    try:
+        for part in result.partitions():
+            rows = [dict(zip(cols, r)) for r in part]
+            if table == "track_reviews":
+                _attach_scores(rows)
+            yield rows
+    finally:
+        result.close()
+
+
+def _attach_scores(rows: List[Dict[str, Any]]) -> None:
+    by_id = {r["id"]: r for r in rows}
+    for r in rows:
+        r["scores"] = {}
+    if not by_id:
+        return
+    for review_id, key, score in db.session.execute(
+        select(TrackReviewScore.review_id, TrackReviewScore.criterion_key, TrackReviewScore.score)
+        .where(TrackReviewScore.review_id.in_(list(by_id)))
+    ):
+        by_id[review_id]["scores"][key] = score
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_ndjson(chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps({k: _plain(v) for k, v in r.items()}, ensure_ascii=False) + "\n"
+            for r in rows
+        )
+
+
+def encode_csv(table: str, chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[str]:
+    cols = columns(table)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(cols)
+    for rows in chunks:
+        for r in rows:
+            scores = r.get("scores") or {}
+            writer.writerow([
+                scores.get(c[len("score_"):], "") if c.startswith("score_") else _plain(r.get(c))
+                for c in cols
+            ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    tail = buf.getvalue()
+    if tail:
+        yield tail
+
+
+def stream_export(table: str, fmt: str = "csv", **filters) -> Iterator[str]:
+    """Encoded export as an iterator of text chunks (validate first: errors are raised eagerly)."""
+    if table not in TABLES:
+        raise ValueError("unknown_table")
+    if fmt not in FORMATS:
+        raise ValueError("bad_format")
+    chunks = iter_rows(table, **filters)
+    return encode_csv(table, chunks) if fmt == "csv" else encode_ndjson(chunks)
@@ -0,0 +1,166 @@
+"""Background dispatcher for side effects of Socket.IO handlers and routes.
+
+Socket handlers must return quickly: a slow Twitch bot webhook, Telegram API
+call or a slow disk used to freeze the whole panel because everything ran
+inline in the event handler. Handlers now enqueue such work here and return.
+
+- bounded queue (overflow is dropped and counted, never blocks the caller);
+- N workers started via `socketio.start_background_task`, so they are real
+  threads in `threading` mode and green threads under eventlet/gevent;
+- optional `key` coalesces identical pending jobs (e.g. many queue broadcasts
+  in a row collapse into one);
+- every job runs inside an app context, so it can use `db.session`/`url_for`
+  (pass plain values, not ORM objects, between threads);
+- queue depth and latency are exposed via `dispatcher.stats()`.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .extensions import app, socketio
+
+DISPATCHER_QUEUE_SIZE = int(os.getenv("DISPATCHER_QUEUE_SIZE", "1000"))
+DISPATCHER_WORKERS = int(os.getenv("DISPATCHER_WORKERS", "2"))
+
+
+class BackgroundDispatcher:
+    def __init__(self, maxsize: int = DISPATCHER_QUEUE_SIZE, workers: int = DISPATCHER_WORKERS):
+        self.maxsize = max(1, int(maxsize))
+        self.workers = max(1, int(workers))
+        self._queue = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._pending_keys = set()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "max_depth": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "run_ms_total": 0.0,
+            "run_ms_max": 0.0,
+        }
+        self._by_name: Dict[str, int] = {}
+
+    # -----------------
+    # Lifecycle
+    # -----------------
+
+    def _ensure_started(self) -> None:
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            # engineio picks the queue implementation matching async_mode
+            # (queue.Queue / eventlet.queue.Queue / gevent.queue.JoinableQueue).
+            self._queue = socketio.server.eio.create_queue(self.maxsize)
+            for _ in range(self.workers):
+                socketio.start_background_task(self._worker)
+            self._started = True
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                item = self._queue.get()
+            except Exception:
+                socketio.sleep(0.1)
+                continue
+            name, key, fn, args, kwargs, enqueued_at = item
+            if key is not None:
+                with self._lock:
+                    self._pending_keys.discard(key)
+            started = time.monotonic()
+            ok = True
+            try:
+                with app.app_context():
+                    fn(*args, **kwargs)
+            except Exception as e:
+                ok = False
+                print(f"Warning: background job {name!r} failed:", e)
+            finished = time.monotonic()
+            self._record(name, ok, (started - enqueued_at) * 1000.0, (finished - started) * 1000.0)
+            try:
+                self._queue.task_done()
+            except Exception:
+                pass
+
+    def _record(self, name: str, ok: bool, wait_ms: float, run_ms: float) -> None:
+        with self._lock:
+            st = self._stats
+            st["completed" if ok else "failed"] += 1
+            st["wait_ms_total"] += wait_ms
+            st["wait_ms_max"] = max(st["wait_ms_max"], wait_ms)
+            st["run_ms_total"] += run_ms
+            st["run_ms_max"] = max(st["run_ms_max"], run_ms)
+            self._by_name[name] = self._by_name.get(name, 0) + 1
+
+    # -----------------
+    # Public API
+    # -----------------
+
+    def submit(self, fn: Callable[..., Any], *args, name: Optional[str] = None, key: Optional[str] = None, **kwargs) -> bool:
+        """Enqueue `fn(*args, **kwargs)`. Never blocks and never raises.
+
+        Returns False if the job was dropped because the queue is full.
+        A job with a `key` that is already pending is coalesced (returns True).
+        """
+        name = name or getattr(fn, "__name__", "job")
+        try:
+            self._ensure_started()
+            with self._lock:
+                if key is not None:
+                    if key in self._pending_keys:
+                        self._stats["coalesced"] += 1
+                        return True
+                    self._pending_keys.add(key)
+                self._stats["submitted"] += 1
+            self._queue.put_nowait((name, key, fn, args, kwargs, time.monotonic()))
+        except Exception as e:
+            with self._lock:
+                if key is not None:
+                    self._pending_keys.discard(key)
+                self._stats["dropped"] += 1
+            print(f"Warning: background job {name!r} dropped:", e)
+            return False
+        depth = self.depth()
+        with self._lock:
+            if depth > self._stats["max_depth"]:
+                self._stats["max_depth"] = depth
+        return True
+
+    def depth(self) -> int:
+        try:
+            return int(self._queue.qsize()) if self._queue is not None else 0
+        except Exception:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            by_name = dict(self._by_name)
+        done = st["completed"] + st["failed"]
+        return {
+            "depth": self.depth(),
+            "max_depth": st["max_depth"],
+            "capacity": self.maxsize,
+            "workers": self.workers,
+            "submitted": st["submitted"],
+            "completed": st["completed"],
+            "failed": st["failed"],
+            "dropped": st["dropped"],
+            "coalesced": st["coalesced"],
+            "wait_ms_avg": round(st["wait_ms_total"] / done, 2) if done else 0.0,
+            "wait_ms_max": round(st["wait_ms_max"], 2),
+            "run_ms_avg": round(st["run_ms_total"] / done, 2) if done else 0.0,
+            "run_ms_max": round(st["run_ms_max"], 2),
+            "jobs": by_name,
+        }
+
+
+dispatcher = BackgroundDispatcher()
@@ -0,0 +1,209 @@
+"""Evaluation finalization as a background job.
+
+`handle_evaluate` used to do everything inline in the admin's socket event:
+find/create the Track, link the submission, insert 5×N Evaluation rows one by
+one, commit up to three times, compute the global rank and only then emit
+`evaluation_result`. Now the handler only snapshots the scores, registers an
+idempotency key and returns; `finalize_evaluation` runs in the dispatcher,
+writes everything in one transaction and pushes the result.
+
+Idempotency: the job is keyed on the evaluation round — a server-side id the
+live state issues on activation, "Новый трек" and track rename (see
+`live_state._cmd_claim_round`). The first "evaluate" of a round claims it in
+the single writer; a double click, or a click after `clear_active` has already
+dropped the active submission, finds the round claimed and gets the stored
+result (or a duplicate ack while the job is still running). A failed job
+releases the round so it can be retried. Two different tracks with the same
+name and scores are different rounds and are both written.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import url_for
+from sqlalchemy import func, insert
+
+from .extensions import CRITERIA, app, db
+from .fragment_cache import TAG_LEADERBOARD, invalidate_fragments
+from .live_state import live_state
+from .models import Evaluation, Track, TrackSubmission
+from .page_cache import invalidate_track_page
+from .qr_cache import QR_SMALL_SIZE
+from .state import _broadcast_queue_state
+from .topics import emit_to_topics, track_topic
+
+# How long a finished key is remembered (double clicks, retries after reconnect).
+EVALUATION_KEY_TTL_SEC = 600
+
+_keys_lock = threading.Lock()
+_keys: Dict[str, Dict[str, Any]] = {}  # key -> {"status": pending|done|failed, "at": ts, "payload": ...}
+
+
+def evaluation_key(round_id: str) -> str:
+    return f"round:{round_id}"
+
+
+def claim_key(key: str) -> Optional[Dict[str, Any]]:
+    """Mark `key` as pending. Returns the existing entry if it was already claimed."""
+    now = time.monotonic()
+    with _keys_lock:
+        for k in [k for k, v in _keys.items() if now - v["at"] > EVALUATION_KEY_TTL_SEC]:
+            _keys.pop(k, None)
+        existing = _keys.get(key)
+        if existing and existing["status"] != "failed":
+            return dict(existing)
+        _keys[key] = {"status": "pending", "at": now, "payload": None}
+    return None
+
+
+def _set_key(key: str, status: str, payload=None) -> None:
+    with _keys_lock:
+        _keys[key] = {"status": status, "at": time.monotonic(), "payload": payload}
+
+
+def peek_key(key: str) -> Optional[Dict[str, Any]]:
+    with _keys_lock:
+        existing = _keys.get(key)
+        return dict(existing) if existing else None
+
+
+def release_key(key: str) -> None:
+    with _keys_lock:
+        _keys.pop(key, None)
+
+
+def _criterion_averages(raters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+    n = len(raters)
+    for key, label in CRITERIA:
+        total = sum(float(r["scores"].get(key, 0.0)) for r in raters)
+        out.append({"key": key, "label": label, "average": round(total / n if n else 0.0, 2)})
+    return out
+
+
+def _resolve_track(track_name: str, submission_id: Optional[int]) -> Track:
+    """Reuse the Track linked to the submission (created on activation) or create one."""
+    sub = db.session.get(TrackSubmission, submission_id) if submission_id else None
+    track = None
+    if sub and sub.linked_track_id:
+        track = db.session.get(Track, int(sub.linked_track_id))
+
+    if not track:
+        track = Track(name=track_name, submission_id=submission_id)
+        db.session.add(track)
+        db.session.flush()
+    elif track.name != track_name:
+        # Keep name in sync with the current live name.
+        track.name = track_name
+
+    if sub and sub.status not in ("deleted", "failed", "converting"):
+        sub.linked_track_id = track.id
+        # если уже играли, то по факту он теперь оценён
+        if sub.status in ("queued", "playing"):
+            sub.status = "done"
+    return track
+
+
+def finalize_evaluation(snapshot: Dict[str, Any], key: str, url_root: str) -> None:
+    """Persist an evaluation snapshot in one transaction and push `evaluation_result`.
+
+    Runs in the background dispatcher (app context is already pushed);
+    `url_root` lets us build the same external URLs the request would.
+    """
+    raters = snapshot["raters"]
+    track_name = snapshot["track_name"]
+    submission_id = snapshot.get("active_submission_id")
+    try:
+        track = _resolve_track(track_name, submission_id)
+        now = datetime.utcnow()
+        rows = [
+            {
+                "track_id": track.id,
+                "rater_name": r["name"],
+                "criterion_key": ck,
+                "score": float(val),
+                "created_at": now,
+            }
+            for r in raters
+            for ck, val in r["scores"].items()
+        ]
+        if rows:
+            db.session.execute(insert(Evaluation), rows)
+        db.session.commit()
+        invalidate_track_page(track.id)
+        invalidate_fragments(TAG_LEADERBOARD)
+    except Exception as e:
+        db.session.rollback()
+        _set_key(key, "failed")
+        if snapshot.get("round_id"):
+            live_state.execute("release_round", snapshot["round_id"])
+        print("Warning: evaluation finalization failed:", e)
+        emit_to_topics("evaluation_failed", {"key": key}, [], rooms=["panel"])
+        return
+
+    rater_results = []
+    for r in raters:
+        vals = list(r["scores"].values())
+        rater_results.append({
+            "id": r["id"],
+            "name": r["name"],
+            "scores": r["scores"],
+            "average": round(sum(vals) / len(vals) if vals else 0.0, 2),
+        })
+    criterion_avgs = _criterion_averages(raters)
+    overall = sum(c["average"] for c in criterion_avgs) / len(criterion_avgs) if criterion_avgs else 0.0
+
+    # рассчитываем средний балл по треку так же, как для страницы топа
+    track_avg = (
+        db.session.query(func.avg(Evaluation.score))
+        .filter(Evaluation.track_id == track.id)
+        .scalar()
+        or 0.0
+    )
+    # УЧИТЫВАЕМ только треки, не удалённые из топа
+    avg_subq = (
+        db.session.query(
+            Evaluation.track_id.label("tid"),
+            func.avg(Evaluation.score).label("avg_score"),
+        )
+        .join(Track, Track.id == Evaluation.track_id)
+        .filter(Track.is_deleted.is_(False))
+        .group_by(Evaluation.track_id)
+        .subquery()
+    )
+    better_count = (
+        db.session.query(func.count())
+        .filter(avg_subq.c.avg_score > track_avg)
+        .scalar()
+        or 0
+    )
+
+    with app.test_request_context("/", base_url=url_root):
+        track_url = url_for("track_page", track_id=track.id, _external=True)
+        qr_url = url_for("qr_for_track", track_id=track.id, _external=True)
+        qr_svg_url = url_for("qr_for_track_svg", track_id=track.id, size=QR_SMALL_SIZE, _external=True)
+
+    payload = {
+        "key": key,
+        "track_id": track.id,
+        "track_name": track_name,
+        "track_url": track_url,
+        "qr_url": qr_url,
+        "qr_svg_url": qr_svg_url,
+        "raters": rater_results,
+        "criteria": criterion_avgs,
+        "overall": round(overall, 2),
+        "top_position": int(better_count) + 1,
+    }
+    _set_key(key, "done", payload)
+    emit_to_topics(
+        "evaluation_result",
+        payload,
+        ["evaluation_result", track_topic(track.id)],
+        rooms=["panel", "raters"],
+    )
+    if submission_id:
+        # Submission is now "done": it disappears from the queue.
+        _broadcast_queue_state()
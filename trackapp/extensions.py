@@ -168,7 +168,22 @@ if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite:"):
     engine_opts["connect_args"].setdefault("check_same_thread", False)
 
 db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Wire format: JSON by default; SOCKETIO_MSGPACK=1 enables opt-in msgpack clients.
+# The client manager adds per-client backpressure (see admission.py).
+from .admission import SOCKETIO_WEBSOCKET_ONLY, BackpressureManager, socketio_transport_options
+from .socket_codec import install_server_hooks, msgpack_enabled, socketio_server_options
+
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    client_manager=BackpressureManager(),
+    **socketio_server_options(),
+    **socketio_transport_options(),
+)
+install_server_hooks(socketio.server)
+app.jinja_env.globals["SOCKET_MSGPACK"] = msgpack_enabled()
+app.jinja_env.globals["SOCKET_WEBSOCKET_ONLY"] = SOCKETIO_WEBSOCKET_ONLY
 
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
@@ -0,0 +1,227 @@
+"""Tagged cache for page fragments (home page blocks, award panels, ...).
+
+Blocks like the news list, the mini leaderboard or the stream banner change
+only when an admin edits something or a track gets evaluated, yet they were
+rebuilt on every hit. Here each block is cached under a key with a set of
+tags; writers call `invalidate_fragments(TAG_...)` after they commit and
+every block carrying that tag is rebuilt on its next read.
+
+Tags are versioned: an entry remembers the tag versions it was built
+against and is treated as a miss if any of them moved. A block that was
+being rebuilt while an invalidation happened is therefore never served
+afterwards, and invalidation is O(1) whatever the number of entries.
+
+Backends:
+- in-process LRU (default), FRAGMENT_CACHE_MAX_ENTRIES entries;
+- on-disk, shared by several workers/processes: set FRAGMENT_CACHE_DIR.
+  Values are pickled, one file per key; tag versions are small files
+  rewritten atomically on invalidation.
+
+FRAGMENT_CACHE_TTL_SEC bounds the life of an entry even without
+invalidation (0 disables the cache).
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+FRAGMENT_CACHE_TTL_SEC = max(0.0, float(os.getenv("FRAGMENT_CACHE_TTL_SEC", "300")))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "500"))
+FRAGMENT_CACHE_DIR = (os.getenv("FRAGMENT_CACHE_DIR") or "").strip()
+
+TAG_NEWS = "news"
+TAG_LEADERBOARD = "leaderboard"
+TAG_STREAM_CONFIG = "stream_config"
+TAG_AWARDS = "awards"
+
+
+def award_tag(award_id: int) -> str:
+    """Tag of one award's panel: nominations/winner changes don't touch the other awards."""
+    return f"award:{int(award_id)}"
+
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: tuple) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tag_version(self, tag: str) -> Any:
+        with self._lock:
+            return self._tags.get(tag, 0)
+
+    def bump(self, tag: str) -> None:
+        with self._lock:
+            self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class DiskBackend:
+    """Pickle files in a shared directory (several gunicorn workers, one host)."""
+
+    name = "disk"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._tag_dir = os.path.join(directory, "_tags")
+        os.makedirs(self._tag_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[tuple]:
+        try:
+            with open(self._path(key), "rb") as f:
+                stored_key, entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            return None
+        return entry if stored_key == key else None
+
+    def set(self, key: str, entry: tuple) -> None:
+        try:
+            self._write_atomic(self._path(key), pickle.dumps((key, entry), protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            print("Warning: fragment cache write failed:", e)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except Exception:
+            pass
+
+    def tag_version(self, tag: str) -> Any:
+        try:
+            with open(os.path.join(self._tag_dir, tag), "r", encoding="utf-8") as f:
+                return f.read().strip() or "0"
+        except FileNotFoundError:
+            return "0"
+
+    def bump(self, tag: str) -> None:
+        # A random token, not a counter: two workers invalidating at once
+        # can't write the same "next" value.
+        self._write_atomic(os.path.join(self._tag_dir, tag), uuid.uuid4().hex.encode("ascii"))
+
+    def size(self) -> int:
+        try:
+            return sum(1 for fn in os.listdir(self.directory) if fn.endswith(".pkl"))
+        except Exception:
+            return 0
+
+
+class FragmentCache:
+    def __init__(self, backend, ttl_sec: float = FRAGMENT_CACHE_TTL_SEC):
+        self.backend = backend
+        self.ttl_sec = float(ttl_sec)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}  # key namespace -> hits/misses
+        self._invalidations: Dict[str, int] = {}
+
+    def _count(self, key: str, what: str) -> None:
+        ns = key.split(":", 1)[0]
+        with self._lock:
+            bucket = self._stats.setdefault(ns, {"hits": 0, "misses": 0})
+            bucket[what] = bucket.get(what, 0) + 1
+
+    def _versions(self, tags: Tuple[str, ...]) -> Tuple[Any, ...]:
+        return tuple(self.backend.tag_version(t) for t in tags)
+
+    def get_or_set(self, key: str, tags: Iterable[str], build: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Cached value of `key`, or `build()` stored under `tags`."""
+        ttl = self.ttl_sec if ttl is None else float(ttl)
+        if ttl <= 0:
+            return build()
+        tags = tuple(tags)
+        versions = self._versions(tags)
+        entry = self.backend.get(key)
+        if entry is not None:
+            expires_at, entry_tags, entry_versions, value = entry
+            if expires_at > time.time() and entry_tags == tags and entry_versions == versions:
+                self._count(key, "hits")
+                return value
+        self._count(key, "misses")
+        value = build()
+        # Stored with the versions read *before* building: an invalidation that
+        # raced with the build makes this entry stale immediately.
+        self.backend.set(key, (time.time() + ttl, tags, versions, value))
+        return value
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            self.backend.bump(tag)
+            with self._lock:
+                self._invalidations[tag] = self._invalidations.get(tag, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_ns = {ns: dict(v) for ns, v in self._stats.items()}
+            invalidations = dict(self._invalidations)
+        return {
+            "backend": self.backend.name,
+            "ttl_sec": self.ttl_sec,
+            "entries": self.backend.size(),
+            "hits": sum(v["hits"] for v in per_ns.values()),
+            "misses": sum(v["misses"] for v in per_ns.values()),
+            "by_key": per_ns,
+            "invalidations": invalidations,
+        }
+
+
+def _make_backend():
+    if FRAGMENT_CACHE_DIR:
+        try:
+            return DiskBackend(FRAGMENT_CACHE_DIR)
+        except Exception as e:
+            print("Warning: fragment cache dir unavailable, using memory:", e)
+    return MemoryBackend()
+
+
+fragment_cache = FragmentCache(_make_backend())
+
+
+def invalidate_fragments(*tags: str) -> None:
+    """Best-effort: call after the writer's commit."""
+    try:
+        fragment_cache.invalidate(*tags)
+    except Exception as e:
+        print("Warning: fragment cache invalidation failed:", e)
@@ -0,0 +1,233 @@
+"""Crash-safe journal of the live panel state.
+
+The live state (judges' sliders, joined raters, active submission, player
+position) exists only in memory. This module makes it survive restarts:
+
+- every command applied by `live_state` is appended to an in-memory buffer
+  as one compact JSON line `[version, name, args, kwargs]`;
+- a background tick (LIVE_JOURNAL_TICK_SEC) writes the buffer to
+  `journal.log` with a single flush + fsync per tick;
+- every LIVE_JOURNAL_SNAPSHOT_EVERY commands (or LIVE_JOURNAL_SNAPSHOT_SEC)
+  the full state is written to `snapshot.json` (tmp file + fsync + rename)
+  and the journal is truncated;
+- at server startup (`run_startup_recovery()`, called from app.py — never
+  on package import, so CLIs leave the server's files alone)
+  `restore_live_state()` loads the snapshot and replays journal entries with
+  a newer version (a torn last line from a crash is ignored);
+- at interpreter exit (graceful shutdown/deploy) a final snapshot is written,
+  so nothing needs replaying on the next start.
+
+Commands are deterministic (ids are generated by callers), so replaying them
+reproduces the exact state. Set LIVE_JOURNAL_ENABLED=0 to keep state in
+memory only.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .extensions import DB_PATH, socketio
+from .live_state import COMMANDS, initial_state, live_state, thaw
+
+LIVE_JOURNAL_ENABLED = os.getenv("LIVE_JOURNAL_ENABLED", "1") == "1"
+LIVE_JOURNAL_DIR = os.getenv(
+    "LIVE_JOURNAL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "live_state"),
+)
+LIVE_JOURNAL_TICK_SEC = float(os.getenv("LIVE_JOURNAL_TICK_SEC", "0.2"))
+LIVE_JOURNAL_SNAPSHOT_EVERY = int(os.getenv("LIVE_JOURNAL_SNAPSHOT_EVERY", "1000"))
+LIVE_JOURNAL_SNAPSHOT_SEC = float(os.getenv("LIVE_JOURNAL_SNAPSHOT_SEC", "60"))
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.log"
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except Exception:
+        return
+    try:
+        os.fsync(fd)
+    except Exception:
+        pass
+    finally:
+        os.close(fd)
+
+
+class LiveJournal:
+    def __init__(self, directory: str = LIVE_JOURNAL_DIR):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last: Optional[Tuple[int, Any]] = None  # (version, frozen state) of the newest entry
+        self._snapshot_version = 0
+        self._snapshot_at = time.monotonic()
+        self._file = None
+        self._ticker_started = False
+        self._closed = False
+        self._stats = {"appended": 0, "written": 0, "fsyncs": 0, "snapshots": 0, "replayed": 0}
+
+    # -----------------
+    # Recovery
+    # -----------------
+
+    def load(self) -> Tuple[Dict[str, Any], int, int]:
+        """Return (state, version, replayed entries) from disk."""
+        state, version = initial_state(), 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            state.update(data.get("state") or {})
+            version = int(data.get("version") or 0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("[Live journal] Warning: bad snapshot, starting from journal only:", e)
+
+        replayed = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry_version, name, args, kwargs = json.loads(line)
+                    except Exception:
+                        # Torn write from a crash: everything after it is unusable.
+                        break
+                    if entry_version <= version or name not in COMMANDS:
+                        continue
+                    COMMANDS[name](state, *args, **kwargs)
+                    version = entry_version
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        return state, version, replayed
+
+    def restore(self) -> Optional[Dict[str, Any]]:
+        """Load state from disk into `live_state` and start journaling. Returns the state."""
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.monotonic()
+        state, version, replayed = self.load()
+        live_state.load(state, version)
+        self._snapshot_version = version
+        self._stats["replayed"] = replayed
+        if replayed:
+            # Fold the replayed entries into a fresh snapshot so the journal starts empty.
+            self._write_snapshot(version, live_state.snapshot())
+        live_state.add_listener(self._on_command)
+        if version:
+            print(
+                f"[Live journal] Restored live state v{version} "
+                f"({replayed} journal entries) in {(time.monotonic() - started) * 1000:.1f} ms"
+            )
+        return state
+
+    # -----------------
+    # Writing
+    # -----------------
+
+    def _on_command(self, version, name, args, kwargs, state) -> None:
+        line = json.dumps([version, name, list(args), kwargs], ensure_ascii=False, separators=(",", ":"), default=thaw)
+        with self._lock:
+            self._buffer.append(line)
+            self._last = (version, state)
+            self._stats["appended"] += 1
+            start = not self._ticker_started
+            self._ticker_started = True
+        if start:
+            socketio.start_background_task(self._ticker)
+
+    def _ticker(self) -> None:
+        while not self._closed:
+            socketio.sleep(LIVE_JOURNAL_TICK_SEC)
+            try:
+                self.flush()
+            except Exception as e:
+                print("[Live journal] Warning: flush failed:", e)
+
+    def flush(self, force_snapshot: bool = False) -> None:
+        """Write buffered entries (one fsync) and take a snapshot when due."""
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                last = self._last
+            if lines:
+                if self._file is None:
+                    self._file = open(self.journal_path, "a", encoding="utf-8")
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._stats["written"] += len(lines)
+                self._stats["fsyncs"] += 1
+            if last is None:
+                return
+            version, state = last
+            if version <= self._snapshot_version:
+                return
+            due = (
+                force_snapshot
+                or version - self._snapshot_version >= LIVE_JOURNAL_SNAPSHOT_EVERY
+                or time.monotonic() - self._snapshot_at >= LIVE_JOURNAL_SNAPSHOT_SEC
+            )
+            if due:
+                # The journal holds exactly the entries up to `version` now.
+                self._write_snapshot(version, state)
+
+    def _write_snapshot(self, version: int, state) -> None:
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "state": thaw(state)}, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        _fsync_dir(self.directory)
+        # Entries up to `version` are in the snapshot; replay skips them even if truncation is lost.
+        if self._file is not None:
+            self._file.close()
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        # O_APPEND: every write lands at the current end, never at a stale offset.
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._snapshot_version = version
+        self._snapshot_at = time.monotonic()
+        self._stats["snapshots"] += 1
+
+    def close(self) -> None:
+        """Graceful shutdown: flush and write a final snapshot."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush(force_snapshot=True)
+        except Exception as e:
+            print("[Live journal] Warning: final snapshot failed:", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["buffered"] = len(self._buffer)
+        out["snapshot_version"] = self._snapshot_version
+        out["directory"] = self.directory
+        return out
+
+
+live_journal = LiveJournal() if LIVE_JOURNAL_ENABLED else None
+
+
+def restore_live_state() -> Optional[Dict[str, Any]]:
+    """Startup hook: recover the live state from disk (no-op when disabled)."""
+    if live_journal is None:
+        return None
+    try:
+        state = live_journal.restore()
+        atexit.register(live_journal.close)
+        return state
+    except Exception as e:
+        print("[Live journal] Warning: could not restore live state:", e)
+        return None
@@ -0,0 +1,431 @@
+"""Live panel state behind a single writer.
+
+Before this module `shared_state` was a plain dict mutated under `state_lock`
+from a dozen Socket.IO handlers (and `admin_playback_cmd` even queried the DB
+while holding the lock during a seek). Now:
+
+- one background task (`LiveStateEngine._writer`) owns the state and applies
+  commands from a queue, strictly one at a time;
+- every command is a small pure function from `COMMANDS` that edits a private
+  draft; the draft is then frozen and published as the new snapshot;
+- readers call `live_state.snapshot()` and get an immutable view
+  (MappingProxyType / tuple) without taking any lock; `thaw()` turns it back
+  into plain dicts/lists for JSON payloads;
+- handlers do their DB work *before* sending a command and pass plain values,
+  so no I/O ever runs while the state is being changed.
+
+State shape (the same keys the old `shared_state` had, plus `members`):
+
+    track_name: str
+    raters: rater_id -> {id, name, order, scores{criterion_key: value}, user_id}
+    active_submission_id: Optional[int]   # track_submissions.id, None for manual names
+    playback: {is_playing, position_ms, server_ts_ms}
+    active_track: Optional[dict]   # cached playback payload of the active submission
+    members: str(user_id) -> {rater_id, sid, username, idle}   # users who pressed "join rating"
+    round_id: Optional[str]   # evaluation round: new on activate / reset / track rename
+    round_claimed: bool   # "evaluate" already pressed in this round
+"""
+
+import os
+import threading
+import hashlib
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional
+
+from .extensions import CRITERIA, socketio
+
+LIVE_STATE_QUEUE_SIZE = int(os.getenv("LIVE_STATE_QUEUE_SIZE", "10000"))
+LIVE_STATE_REPLY_TIMEOUT_SEC = float(os.getenv("LIVE_STATE_REPLY_TIMEOUT_SEC", "5"))
+
+
+def freeze(obj):
+    if isinstance(obj, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+def _stopped_playback(now_ms: int) -> Dict[str, Any]:
+    return {"is_playing": False, "position_ms": 0, "server_ts_ms": int(now_ms)}
+
+
+def initial_state() -> Dict[str, Any]:
+    return {
+        "track_name": "",
+        "raters": {},
+        "active_submission_id": None,
+        "playback": _stopped_playback(0),
+        "active_track": None,
+        "members": {},
+        "round_id": None,
+        "round_claimed": False,
+    }
+
+
+def _compute_playback_position_ms(pb, now_ms: Optional[int] = None) -> int:
+    """Текущая позиция плеера по состоянию сервера."""
+    if now_ms is None:
+        now_ms = int(datetime.utcnow().timestamp() * 1000)
+    base = int(pb.get("position_ms") or 0)
+    if pb.get("is_playing"):
+        started_at = int(pb.get("server_ts_ms") or now_ms)
+        base += max(0, now_ms - started_at)
+    return max(0, base)
+
+
+# -----------------
+# Commands (run only in the writer, on a private draft)
+# -----------------
+
+def _reorder(raters: Dict[str, Dict[str, Any]]) -> None:
+    # Rater ids are random hex strings: keep the existing visual order, close gaps.
+    for idx, r in enumerate(sorted(raters.values(), key=lambda r: r.get("order", 0))):
+        r["order"] = idx
+
+
+def _cmd_join(st, user_id: str, sid: str, display_name: str, rater_id: str):
+    """Create a rater slot for `user_id` (or refresh the sid of an existing one).
+
+    `rater_id` is generated by the caller so that replaying the same command
+    gives the same state.
+    """
+    members = st["members"]
+    info = members.get(user_id)
+    if info and info.get("rater_id") in st["raters"]:
+        info["sid"] = sid
+        info["idle"] = False
+        st["raters"][info["rater_id"]]["idle"] = False
+        return {"rater_id": info["rater_id"], "username": info.get("username") or display_name, "created": False}
+
+    rid = rater_id
+    while rid in st["raters"]:
+        rid = hashlib.sha1(rid.encode("ascii")).hexdigest()[:8]
+    st["raters"][rid] = {
+        "id": rid,
+        "name": display_name,
+        "order": len(st["raters"]),
+        "scores": {key: 0 for key, _label in CRITERIA},
+        "user_id": user_id,
+        "idle": False,
+    }
+    members[user_id] = {"rater_id": rid, "sid": sid, "username": display_name, "idle": False}
+    return {"rater_id": rid, "username": display_name, "created": True}
+
+
+def _cmd_touch_member(st, user_id: str, sid: str):
+    """Reconnect: remember the new socket sid. Returns the member info or None."""
+    info = st["members"].get(user_id)
+    if not info:
+        return None
+    info["sid"] = sid
+    if info.get("idle"):
+        info["idle"] = False
+        rater = st["raters"].get(info.get("rater_id"))
+        if rater is not None:
+            rater["idle"] = False
+    return dict(info)
+
+
+def _cmd_set_idle(st, user_id: str, idle: bool):
+    """Presence sweeper: mark a joined rater idle/active. Returns rater_id if it changed."""
+    info = st["members"].get(user_id)
+    if not info or bool(info.get("idle")) == bool(idle):
+        return None
+    info["idle"] = bool(idle)
+    rater = st["raters"].get(info.get("rater_id"))
+    if rater is not None:
+        rater["idle"] = bool(idle)
+    return info.get("rater_id")
+
+
+def _cmd_remove_member(st, user_id: Optional[str] = None, rater_id: Optional[str] = None):
+    """Leave/kick. `user_id` wins over `rater_id`. Returns (user_id, info) or None."""
+    members = st["members"]
+    victim = None
+    if user_id is not None and user_id in members:
+        victim = user_id
+    elif rater_id is not None:
+        for uid, info in members.items():
+            if str(info.get("rater_id")) == str(rater_id):
+                victim = uid
+                break
+    if victim is None:
+        return None
+    info = members.pop(victim)
+    if info.get("rater_id"):
+        st["raters"].pop(str(info["rater_id"]), None)
+        _reorder(st["raters"])
+    return victim, info
+
+
+def _cmd_remove_rater(st, rater_id: str) -> bool:
+    """Admin removes a slot; its owner is no longer a joined rater either."""
+    if rater_id not in st["raters"]:
+        return False
+    st["raters"].pop(rater_id)
+    for uid in [uid for uid, info in st["members"].items() if info.get("rater_id") == rater_id]:
+        st["members"].pop(uid)
+    _reorder(st["raters"])
+    return True
+
+
+def _open_round(st, round_id: Optional[str]) -> None:
+    # round ids are issued by the caller (uuid): commands stay replayable from the journal
+    if round_id:
+        st["round_id"] = round_id
+        st["round_claimed"] = False
+
+
+def _cmd_set_track_name(st, track_name: str, round_id: Optional[str] = None) -> str:
+    if track_name != st["track_name"]:
+        _open_round(st, round_id)
+    st["track_name"] = track_name
+    return track_name
+
+
+def _cmd_rename_rater(st, rater_id: str, name: str):
+    rater = st["raters"].get(rater_id)
+    if not rater:
+        return None
+    if name:
+        rater["name"] = name
+    return rater["name"]
+
+
+def _cmd_set_score(st, rater_id: str, criterion_key: str, value: float) -> bool:
+    rater = st["raters"].get(rater_id)
+    if not rater or criterion_key not in rater["scores"]:
+        return False
+    rater["scores"][criterion_key] = value
+    return True
+
+
+def _cmd_activate(st, submission_id: int, track_name: str, autoplay: bool, now_ms: int,
+                  active_track: Optional[Dict[str, Any]] = None, round_id: Optional[str] = None) -> None:
+    _open_round(st, round_id)
+    st["track_name"] = track_name
+    st["active_submission_id"] = submission_id
+    st["active_track"] = active_track
+    st["playback"] = {"is_playing": bool(autoplay), "position_ms": 0, "server_ts_ms": int(now_ms)}
+
+
+def _cmd_set_active_track(st, submission_id: int, active_track: Optional[Dict[str, Any]]) -> bool:
+    """Replace (or drop with None) the cached payload if `submission_id` is still active."""
+    if st["active_submission_id"] != submission_id:
+        return False
+    st["active_track"] = active_track
+    return True
+
+
+def _cmd_clear_active(st, submission_id: Optional[int], now_ms: int, clear_name: bool = False) -> bool:
+    """Stop the player and forget the active submission (only if it is still `submission_id`)."""
+    if submission_id is not None and st["active_submission_id"] != submission_id:
+        return False
+    st["active_submission_id"] = None
+    st["active_track"] = None
+    st["playback"] = _stopped_playback(now_ms)
+    if clear_name:
+        st["track_name"] = ""
+    return True
+
+
+def _cmd_playback(st, action: str, now_ms: int, expected_active_id: Optional[int] = None,
+                  position_ms: int = 0, max_ms: Optional[int] = None) -> bool:
+    active_id = st["active_submission_id"]
+    if not active_id:
+        return False
+    if expected_active_id is not None and active_id != expected_active_id:
+        # Track switched between the caller's lookup and this command.
+        return False
+    pb = st["playback"]
+    cur_pos = _compute_playback_position_ms(pb, now_ms=now_ms)
+
+    if action == "play":
+        pb["is_playing"] = True
+        pb["server_ts_ms"] = now_ms
+    elif action == "pause":
+        pb["is_playing"] = False
+        pb["position_ms"] = cur_pos
+        pb["server_ts_ms"] = now_ms
+    elif action == "stop":
+        pb["is_playing"] = False
+        pb["position_ms"] = 0
+        pb["server_ts_ms"] = now_ms
+    elif action == "restart":
+        pb["position_ms"] = 0
+        pb["server_ts_ms"] = now_ms
+    elif action == "seek":
+        target_ms = max(0, int(position_ms or 0))
+        if max_ms:
+            target_ms = min(target_ms, int(max_ms))
+        pb["position_ms"] = target_ms
+        pb["server_ts_ms"] = now_ms
+    else:
+        return False
+    return True
+
+
+def _cmd_reset(st, now_ms: int, round_id: Optional[str] = None):
+    """«Новый трек»: clear name, active track and all scores. Returns the old active id."""
+    _open_round(st, round_id)
+    old_active_id = st["active_submission_id"]
+    st["track_name"] = ""
+    st["active_submission_id"] = None
+    st["active_track"] = None
+    st["playback"] = _stopped_playback(now_ms)
+    for r in st["raters"].values():
+        r["scores"] = {key: 0 for key, _ in CRITERIA}
+    return old_active_id
+
+
+def _cmd_claim_round(st, round_id: str, new_round_id: Optional[str] = None):
+    """Claim the evaluation of the current round.
+
+    Returns the claimed round id, or None when `round_id` is stale or was
+    already claimed (double click, click after clear_active). A state without
+    a round (restored from an older journal) opens `new_round_id` first.
+    """
+    if not st.get("round_id"):
+        _open_round(st, new_round_id)
+        round_id = st.get("round_id")
+    if not round_id or st.get("round_id") != round_id or st.get("round_claimed"):
+        return None
+    st["round_claimed"] = True
+    return round_id
+
+
+def _cmd_release_round(st, round_id: str) -> bool:
+    """The evaluation of `round_id` failed: let the judges press "evaluate" again."""
+    if st.get("round_id") != round_id:
+        return False
+    st["round_claimed"] = False
+    return True
+
+
+COMMANDS: Dict[str, Callable[..., Any]] = {
+    "join": _cmd_join,
+    "touch_member": _cmd_touch_member,
+    "set_idle": _cmd_set_idle,
+    "remove_member": _cmd_remove_member,
+    "remove_rater": _cmd_remove_rater,
+    "set_track_name": _cmd_set_track_name,
+    "rename_rater": _cmd_rename_rater,
+    "set_score": _cmd_set_score,
+    "activate": _cmd_activate,
+    "set_active_track": _cmd_set_active_track,
+    "clear_active": _cmd_clear_active,
+    "playback": _cmd_playback,
+    "reset": _cmd_reset,
+    "claim_round": _cmd_claim_round,
+    "release_round": _cmd_release_round,
+}
+
+
+# -----------------
+# Engine
+# -----------------
+
+class LiveStateEngine:
+    def __init__(self, queue_size: int = LIVE_STATE_QUEUE_SIZE):
+        self.queue_size = max(1, int(queue_size))
+        self._state = freeze(initial_state())
+        self._version = 0
+        self._queue = None
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._listeners: List[Callable[..., None]] = []
+
+    def snapshot(self):
+        """Current immutable state. A plain attribute read: never blocks."""
+        return self._state
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def load(self, state: Dict[str, Any], version: int) -> None:
+        """Install a recovered state (startup only, before any command runs)."""
+        self._state = freeze(state)
+        self._version = int(version)
+
+    def _ensure_started(self) -> None:
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self._queue = socketio.server.eio.create_queue(self.queue_size)
+            socketio.start_background_task(self._writer)
+            self._started = True
+
+    def add_listener(self, fn: Callable[..., None]) -> None:
+        """Call `fn(version, name, args, kwargs, state)` in the writer after each command."""
+        self._listeners.append(fn)
+
+    def _apply(self, name: str, args, kwargs):
+        draft = thaw(self._state)
+        result = COMMANDS[name](draft, *args, **kwargs)
+        self._state = freeze(draft)
+        self._version += 1
+        for fn in self._listeners:
+            try:
+                fn(self._version, name, args, kwargs, self._state)
+            except Exception as e:
+                print("Warning: live state listener failed:", e)
+        return result
+
+    def _writer(self) -> None:
+        self._local.is_writer = True
+        while True:
+            try:
+                name, args, kwargs, reply = self._queue.get()
+            except Exception:
+                socketio.sleep(0.1)
+                continue
+            try:
+                reply["result"] = self._apply(name, args, kwargs)
+            except Exception as e:
+                print(f"Warning: live state command {name!r} failed:", e)
+            reply["done"].set()
+
+    def execute(self, name: str, *args, **kwargs):
+        """Apply command `name` in the writer and wait for its result.
+
+        The caller only waits for its own command; it never holds a lock that
+        other handlers or readers need.
+        """
+        if name not in COMMANDS:
+            raise KeyError(name)
+        if getattr(self._local, "is_writer", False):
+            return self._apply(name, args, kwargs)
+        self._ensure_started()
+        reply = {"done": socketio.server.eio.create_event(), "result": None}
+        try:
+            self._queue.put((name, args, kwargs, reply), timeout=LIVE_STATE_REPLY_TIMEOUT_SEC)
+        except Exception as e:
+            print(f"Warning: live state command {name!r} not queued:", e)
+            return None
+        if not reply["done"].wait(LIVE_STATE_REPLY_TIMEOUT_SEC):
+            print(f"Warning: live state command {name!r} timed out")
+        return reply["result"]
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            depth = int(self._queue.qsize()) if self._queue is not None else 0
+        except Exception:
+            depth = 0
+        return {"version": self._version, "depth": depth, "capacity": self.queue_size}
+
+
+live_state = LiveStateEngine()
@@ -450,6 +450,7 @@ def _run_sqlite_migrations():
         db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_tracks_is_deleted ON tracks(is_deleted)"))
         db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_evaluations_track_id ON evaluations(track_id)"))
         db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_awards_status ON awards(status)"))
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_track_reviews_track_created ON track_reviews(track_id, created_at, id)"))
         db.session.commit()
     except Exception as e:
         print("Warning: could not create performance indexes:", e)
@@ -0,0 +1,215 @@
+"""Legacy news attachments without filesystem scans on request paths.
+
+Before `NewsAttachment` existed, a news item's file was saved straight into
+UPLOAD_DIR as `news_<id>_<name>` and pages found it by listing UPLOAD_DIR
+and prefix-matching. That directory also holds the submission folders and
+other files, and on network storage the listing was slow on every hit of
+home(), admin() and news_edit().
+
+On import `init_legacy_news_index()` runs. The first time on an install:
+
+- every `news_<id>_*` file of an existing news item is registered as a
+  `NewsAttachment` row. The file is hard-linked (copied if links are not
+  supported) into NEWS_UPLOAD_DIR under the same name, so the row behaves
+  like any new upload and the old `/static/uploads/news_<id>_...` URL keeps
+  working;
+- whatever could not be registered (news item gone, copy failed) goes into
+  an in-memory prefix index `news_id -> [filename]`;
+- the result is written to NEWS_UPLOAD_DIR/MARKER_FILE. Later starts read
+  the marker instead of listing UPLOAD_DIR.
+
+Re-run with `python -m trackapp.scripts.migrate_news_attachments`.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Set
+
+from flask import url_for
+
+from .extensions import NEWS_UPLOAD_DIR, UPLOAD_DIR, app, db
+from .models import News, NewsAttachment
+from .state import _is_image_filename
+
+MARKER_FILE = ".legacy_index.json"
+_LEGACY_RE = re.compile(r"^news_(\d+)_")
+
+_lock = threading.Lock()
+# news_id -> legacy filenames (in UPLOAD_DIR) that have no NewsAttachment row
+_remaining: Dict[int, List[str]] = {}
+# legacy filenames that were registered; their UPLOAD_DIR copy is removed together with the row
+_migrated: Set[str] = set()
+
+
+def _marker_path() -> str:
+    return os.path.join(NEWS_UPLOAD_DIR, MARKER_FILE)
+
+
+def _scan_legacy_files() -> Dict[int, List[str]]:
+    found: Dict[int, List[str]] = {}
+    try:
+        names = os.listdir(UPLOAD_DIR)
+    except FileNotFoundError:
+        return found
+    for fname in sorted(names):
+        m = _LEGACY_RE.match(fname)
+        if m and os.path.isfile(os.path.join(UPLOAD_DIR, fname)):
+            found.setdefault(int(m.group(1)), []).append(fname)
+    return found
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    if os.path.exists(dst):
+        return
+    try:
+        os.link(src, dst)
+    except Exception:
+        shutil.copy2(src, dst)
+
+
+def migrate_legacy_files() -> Dict[str, int]:
+    """Register legacy files as NewsAttachment rows. Needs an app context."""
+    legacy = _scan_legacy_files()
+    remaining: Dict[int, List[str]] = {}
+    migrated: Set[str] = set()
+    registered = 0
+    if legacy:
+        existing_news = {
+            nid for (nid,) in db.session.query(News.id).filter(News.id.in_(list(legacy.keys()))).all()
+        }
+        known = {
+            (nid, name)
+            for nid, name in db.session.query(NewsAttachment.news_id, NewsAttachment.stored_filename)
+            .filter(NewsAttachment.news_id.in_(list(legacy.keys())))
+            .all()
+        }
+        for nid, names in legacy.items():
+            for fname in names:
+                if nid not in existing_news:
+                    remaining.setdefault(nid, []).append(fname)
+                    continue
+                if (nid, fname) in known:
+                    migrated.add(fname)
+                    continue
+                src = os.path.join(UPLOAD_DIR, fname)
+                try:
+                    _link_or_copy(src, os.path.join(NEWS_UPLOAD_DIR, fname))
+                    mtime = datetime.utcfromtimestamp(os.path.getmtime(src))
+                except Exception as e:
+                    print("[News attachments] Warning: could not register", fname, e)
+                    remaining.setdefault(nid, []).append(fname)
+                    continue
+                db.session.add(NewsAttachment(
+                    news_id=nid,
+                    stored_filename=fname,
+                    original_filename=fname[len(f"news_{nid}_"):] or fname,
+                    uploaded_at=mtime,
+                ))
+                migrated.add(fname)
+                registered += 1
+        db.session.commit()
+
+    tmp = _marker_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "migrated_at": datetime.utcnow().isoformat(),
+                "migrated": sorted(migrated),
+                "remaining": {str(k): v for k, v in remaining.items()},
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, _marker_path())
+    with _lock:
+        _remaining.clear()
+        _remaining.update(remaining)
+        _migrated.clear()
+        _migrated.update(migrated)
+    return {"registered": registered, "migrated": len(migrated), "remaining": sum(len(v) for v in remaining.values())}
+
+
+def _load_marker() -> bool:
+    try:
+        with open(_marker_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print("[News attachments] Warning: bad legacy index, rescanning:", e)
+        return False
+    with _lock:
+        _remaining.clear()
+        _remaining.update({int(k): list(v) for k, v in (data.get("remaining") or {}).items()})
+        _migrated.clear()
+        _migrated.update(data.get("migrated") or [])
+    return True
+
+
+def init_legacy_news_index(rescan: bool = False) -> None:
+    """Startup hook: load the index, migrating legacy files the first time."""
+    try:
+        if not rescan and _load_marker():
+            return
+        with app.app_context():
+            result = migrate_legacy_files()
+        if result["migrated"] or result["remaining"]:
+            print(f"[News attachments] Legacy files: {result}")
+    except Exception as e:
+        print("[News attachments] Warning: legacy migration failed:", e)
+
+
+def legacy_attachments(news_id: int) -> List[Dict]:
+    """Unregistered legacy files of a news item, shaped like NewsAttachment dicts."""
+    with _lock:
+        names = list(_remaining.get(int(news_id), ()))
+    prefix = f"news_{news_id}_"
+    return [
+        {
+            "id": None,
+            "stored": fname,
+            "original": fname.replace(prefix, "", 1) or fname,
+            "is_image": _is_image_filename(fname),
+            "url": url_for("static", filename="uploads/" + fname),
+        }
+        for fname in names
+    ]
+
+
+def remove_attachment_file(stored_filename: str) -> None:
+    """Delete one registered attachment (and its legacy original, if it was migrated)."""
+    with _lock:
+        legacy = stored_filename in _migrated
+        _migrated.discard(stored_filename)
+    paths = [os.path.join(NEWS_UPLOAD_DIR, stored_filename)]
+    if legacy:
+        paths.append(os.path.join(UPLOAD_DIR, stored_filename))
+    _remove_quietly(paths)
+
+
+def remove_news_files(news_id: int, stored_filenames: List[str]) -> None:
+    """Delete a news item's files: registered attachments and their legacy originals."""
+    with _lock:
+        legacy = _remaining.pop(int(news_id), [])
+        originals = [name for name in stored_filenames if name in _migrated]
+        _migrated.difference_update(originals)
+    _remove_quietly(
+        [os.path.join(NEWS_UPLOAD_DIR, name) for name in stored_filenames]
+        + [os.path.join(UPLOAD_DIR, name) for name in originals + legacy]
+    )
+
+
+def _remove_quietly(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+        except Exception:
+            pass
+
+
+init_legacy_news_index()
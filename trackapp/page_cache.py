@@ -0,0 +1,132 @@
+"""Short-TTL rendered-page cache for anonymous visitors.
+
+When the QR code shows up on stream, hundreds of viewers open `/track/<id>`
+within a few seconds and every request used to run the full track page
+(about a dozen queries + template). For anonymous visitors the page is the
+same for everyone, so:
+
+- the rendered HTML is kept for TRACK_PAGE_CACHE_TTL_SEC (1–5 s, 0 = off);
+- concurrent misses for the same key are collapsed (single-flight): one
+  request renders, the others wait for its result;
+- `invalidate_track_page(track_id)` drops the entry when a review or an
+  evaluation changes the page; a render that was already running when the
+  invalidation happened is not stored.
+
+Only plain HTML strings are cached; redirects and other Response objects are
+returned to their own request only (they may carry that visitor's session).
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from flask import request, session
+
+TRACK_PAGE_CACHE_TTL_SEC = max(0.0, min(5.0, float(os.getenv("TRACK_PAGE_CACHE_TTL_SEC", "3"))))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1000"))
+# How long a follower waits for the leader's render before rendering itself.
+_SINGLE_FLIGHT_WAIT_SEC = 10.0
+
+
+class _Flight:
+    __slots__ = ("done", "value")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class MicroCache:
+    def __init__(self, ttl_sec: float, max_entries: int = PAGE_CACHE_MAX_ENTRIES):
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, tuple] = {}  # key -> (expires_at, value)
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._generation: Dict[Hashable, int] = {}
+        self._stats = {"hits": 0, "misses": 0, "collapsed": 0, "invalidations": 0}
+
+    def get_or_render(self, key: Hashable, render: Callable[[], Any]) -> Any:
+        if self.ttl_sec <= 0:
+            return render()
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._stats["hits"] += 1
+                    return entry[1]
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    generation = self._generation.get(key, 0)
+                    self._stats["misses"] += 1
+                else:
+                    self._stats["collapsed"] += 1
+            if leader:
+                break
+            flight.done.wait(_SINGLE_FLIGHT_WAIT_SEC)
+            if isinstance(flight.value, str):
+                return flight.value
+            # Leader failed or produced a non-cacheable response: render ourselves.
+            return render()
+
+        value = None
+        try:
+            value = render()
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if isinstance(value, str):
+                    flight.value = value
+                    if self._generation.get(key, 0) == generation:
+                        self._store(key, value)
+            flight.done.set()
+
+    def _store(self, key: Hashable, value: str) -> None:
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            for k in [k for k, (exp, _v) in self._entries.items() if exp <= now]:
+                self._entries.pop(k, None)
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)), None)
+        self._entries[key] = (now + self.ttl_sec, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation[key] = self._generation.get(key, 0) + 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["inflight"] = len(self._inflight)
+        out["ttl_sec"] = self.ttl_sec
+        return out
+
+
+track_page_cache = MicroCache(TRACK_PAGE_CACHE_TTL_SEC)
+
+
+def is_anonymous_cacheable() -> bool:
+    """GET by a visitor without login and without pending flash messages."""
+    return request.method == "GET" and not session.get("user") and not session.get("_flashes")
+
+
+def invalidate_track_page(track_id) -> None:
+    try:
+        track_page_cache.invalidate(int(track_id))
+    except Exception:
+        pass
+    # архивный снимок тоже устарел: до следующего экспорта страница рендерится вживую
+    try:
+        from .archive import drop_track_snapshot
+
+        drop_track_snapshot(track_id)
+    except Exception:
+        pass
@@ -0,0 +1,121 @@
+"""Presence heartbeat and idle detection for joined raters.
+
+Rater slots stay visible until an explicit leave/kick (a reconnect must not
+drop a judge's scores), so a closed laptop used to leave a zero-score slot
+that dragged down the average. Now:
+
+- clients that joined the rating send `heartbeat` every
+  PRESENCE_HEARTBEAT_SEC; the server only stores a timestamp per sid (O(1));
+- a background sweeper (every PRESENCE_SWEEP_SEC) marks members whose socket
+  has been silent for more than RATER_IDLE_AFTER_SEC as idle (disconnects are
+  covered too: no heartbeats arrive) and active again when they return;
+- changes are pushed to the panel as `raters_presence_delta`
+  (`{"changes": [{"user_id", "rater_id", "idle"}]}`), not as full lists;
+- with RATER_EXCLUDE_IDLE=1 idle raters are left out of the average in
+  `handle_evaluate` and in the panel totals.
+
+The idle flag itself lives in `live_state` (members and rater slots), so it
+is journaled and replayed like the rest of the panel state.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .extensions import app, socketio
+from .live_state import live_state
+
+PRESENCE_HEARTBEAT_SEC = int(os.getenv("PRESENCE_HEARTBEAT_SEC", "15"))
+RATER_IDLE_AFTER_SEC = int(os.getenv("RATER_IDLE_AFTER_SEC", "45"))
+PRESENCE_SWEEP_SEC = float(os.getenv("PRESENCE_SWEEP_SEC", "5"))
+RATER_EXCLUDE_IDLE = os.getenv("RATER_EXCLUDE_IDLE", "0") == "1"
+
+
+class PresenceTracker:
+    def __init__(self, idle_after_sec: float = RATER_IDLE_AFTER_SEC):
+        self.idle_after_sec = float(idle_after_sec)
+        self._lock = threading.Lock()
+        self._seen: Dict[str, float] = {}  # sid -> monotonic ts of last heartbeat/connect
+        self._uid_by_sid: Dict[str, str] = {}
+        self._sweeper_started = False
+        # Members restored from the journal have no live sid yet: grace starts at boot.
+        self._started_at = time.monotonic()
+
+    def track(self, sid: str, user_id: str) -> None:
+        """A joined rater's socket (join/reconnect)."""
+        with self._lock:
+            self._seen[sid] = time.monotonic()
+            self._uid_by_sid[sid] = user_id
+        self.start()
+
+    def start(self) -> None:
+        """Start the sweeper once: on the first join, or at startup when the journal restored members."""
+        with self._lock:
+            start = not self._sweeper_started
+            self._sweeper_started = True
+        if start:
+            socketio.start_background_task(self._sweeper)
+
+    def beat(self, sid: str) -> Optional[str]:
+        """Heartbeat. Returns the user id if `sid` belongs to a joined rater."""
+        with self._lock:
+            uid = self._uid_by_sid.get(sid)
+            if uid is not None:
+                self._seen[sid] = time.monotonic()
+            return uid
+
+    def disconnected(self, sid: str) -> None:
+        # Keep the last timestamp: the member turns idle once the grace period is over.
+        with self._lock:
+            self._uid_by_sid.pop(sid, None)
+
+    def last_seen(self, sid: Optional[str]) -> float:
+        with self._lock:
+            return self._seen.get(sid or "", self._started_at)
+
+    def _sweeper(self) -> None:
+        while True:
+            socketio.sleep(PRESENCE_SWEEP_SEC)
+            try:
+                with app.app_context():
+                    self.sweep()
+            except Exception as e:
+                print("Warning: presence sweep failed:", e)
+
+    def sweep(self) -> List[Dict]:
+        now = time.monotonic()
+        members = live_state.snapshot()["members"]
+        changes = []
+        for uid, info in members.items():
+            idle = now - self.last_seen(info.get("sid")) > self.idle_after_sec
+            if idle != bool(info.get("idle")):
+                rid = live_state.execute("set_idle", uid, idle)
+                if rid:
+                    changes.append({"user_id": uid, "rater_id": rid, "idle": idle})
+        # Forget sids that no member points to any more.
+        live_sids = {info.get("sid") for info in members.values()}
+        with self._lock:
+            for sid in [s for s in self._seen if s not in live_sids and s not in self._uid_by_sid]:
+                self._seen.pop(sid, None)
+        push_presence_changes(changes)
+        return changes
+
+
+def push_presence_changes(changes: List[Dict]) -> None:
+    if not changes:
+        return
+    try:
+        socketio.emit(
+            "raters_presence_delta",
+            {"changes": changes, "exclude_idle": RATER_EXCLUDE_IDLE},
+            room="panel",
+        )
+    except Exception:
+        pass
+
+
+presence = PresenceTracker()
+
+app.jinja_env.globals["PRESENCE_HEARTBEAT_SEC"] = PRESENCE_HEARTBEAT_SEC
+app.jinja_env.globals["RATER_EXCLUDE_IDLE"] = RATER_EXCLUDE_IDLE
@@ -0,0 +1,173 @@
+"""Rendered QR codes for track pages, cached in memory and on disk.
+
+`qrcode` is pure Python: building the matrix and encoding a PNG took tens of
+milliseconds per request, and the OBS widget, the panel modal and the track
+page all request the same image over and over. Now every variant is
+rendered once per (track id, canonical URL, format, size):
+
+- an in-process LRU (QR_CACHE_MAX_ENTRIES) serves hot images;
+- QR_CACHE_DIR (default `qr_cache/` next to the database) keeps them across
+  restarts and for other workers;
+- responses carry a strong ETag (hash of the bytes) so browsers/OBS
+  revalidate with a 304 instead of downloading again;
+- `pregenerate(...)` is submitted to the dispatcher when a submission is
+  activated, so the first viewers already hit a warm cache.
+
+Formats: `png` (needs Pillow or pypng, like before) and `svg` (no extra
+dependency, crisp at any size — used by the OBS widget). `size` is the
+target width in pixels, snapped to QR_SIZES; without it PNGs keep the old
+10 px per module.
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .extensions import DB_PATH
+
+QR_CACHE_DIR = os.getenv(
+    "QR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "qr_cache"),
+)
+QR_CACHE_MAX_ENTRIES = int(os.getenv("QR_CACHE_MAX_ENTRIES", "256"))
+QR_SIZES = (64, 96, 128, 192, 256, 384, 512, 768, 1024)
+QR_BORDER = 4
+# Size pre-generated for the OBS widget / small previews.
+QR_SMALL_SIZE = 192
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def snap_size(size) -> Optional[int]:
+    """Nearest supported size (bounded set of cache keys), None for the default."""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return None
+    if size <= 0:
+        return None
+    return min(QR_SIZES, key=lambda s: abs(s - size))
+
+
+def _render(url: str, fmt: str, size: Optional[int]) -> bytes:
+    import qrcode
+
+    qr = qrcode.QRCode(border=QR_BORDER, box_size=10)
+    qr.add_data(url)
+    qr.make(fit=True)
+    if fmt == "svg":
+        import qrcode.image.svg
+
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathFillImage)
+        buf = io.BytesIO()
+        img.save(buf)
+        data = buf.getvalue()
+        if size:
+            # Pixel size instead of the library's millimetres; viewBox keeps it scalable.
+            data = re.sub(
+                rb'<svg width="[^"]*" height="[^"]*"',
+                f'<svg width="{size}" height="{size}"'.encode("ascii"),
+                data,
+                count=1,
+            )
+        return data
+
+    if size:
+        qr.box_size = max(1, size // (qr.modules_count + 2 * QR_BORDER))
+    img = qr.make_image()
+    buf = io.BytesIO()
+    img.save(buf)
+    return buf.getvalue()
+
+
+class QRCache:
+    def __init__(self, directory: str = QR_CACHE_DIR, max_entries: int = QR_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "not_modified": 0}
+
+    @staticmethod
+    def _key(track_id: int, url: str, fmt: str, size: Optional[int]) -> str:
+        raw = f"{int(track_id)}|{url}|{fmt}|{size or 0}"
+        return f"{int(track_id)}-{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]}.{fmt}"
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    def _remember(self, key: str, data: bytes, etag: str) -> None:
+        with self._lock:
+            self._entries[key] = (data, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, track_id: int, url: str, fmt: str = "png", size: Optional[int] = None) -> Tuple[bytes, str]:
+        """Return (image bytes, etag), rendering at most once per variant."""
+        key = self._key(track_id, url, fmt, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if data:
+                etag = self._etag(data)
+                self._remember(key, data, etag)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return data, etag
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Warning: QR cache read failed:", e)
+
+        data = _render(url, fmt, size)
+        etag = self._etag(data)
+        self._remember(key, data, etag)
+        with self._lock:
+            self._stats["renders"] += 1
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception as e:
+            print("Warning: QR cache write failed:", e)
+        return data, etag
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+        out["directory"] = self.directory
+        return out
+
+
+qr_cache = QRCache()
+
+
+def pregenerate(track_id: int, url: str) -> None:
+    """Dispatcher job: warm the variants the panel and the OBS widget ask for first."""
+    for fmt, size in (("svg", QR_SMALL_SIZE), ("png", None)):
+        try:
+            qr_cache.get(track_id, url, fmt, size)
+        except Exception as e:
+            print(f"Warning: QR pre-generation ({fmt}) failed:", e)
@@ -3,17 +3,16 @@
 Migrated from the monolithic routes.py for better maintainability.
 """
 
-import io
 import os
 import uuid
 from uuid import uuid4
 
-import qrcode
 from flask import request, redirect, url_for, flash, render_template, make_response
 
 from ..core import (
     app, db, get_current_user,
     _init_default_raters,
+    _invalidate_active_track,
     _get_track_url,
     _is_image_filename,
     _require_admin,
@@ -23,7 +22,6 @@ from ..core import (
 )
 from ..extensions import (
     NEWS_UPLOAD_DIR,
-    UPLOAD_DIR,
     secure_filename,
 )
 from ..models import (
@@ -35,7 +33,11 @@ from ..models import (
     TrackSubmission,
     User,
 )
-from ..state import _serialize_state, _broadcast_queue_state
+from ..fragment_cache import TAG_AWARDS, TAG_LEADERBOARD, TAG_NEWS, TAG_STREAM_CONFIG, invalidate_fragments
+from ..news_attachments import legacy_attachments, remove_attachment_file, remove_news_files
+from ..page_cache import invalidate_track_page
+from ..qr_cache import CONTENT_TYPES, qr_cache, snap_size
+from ..state import _serialize_state, _schedule_queue_broadcast
 
 
 # -----------------
@@ -219,6 +221,7 @@ def admin():
                         flash("Новость добавлена, но вложение сохранить не удалось", "warning")
 
                 db.session.commit()
+                invalidate_fragments(TAG_NEWS)
                 flash("Новость добавлена", "success")
                 return redirect(url_for("admin", tab="news"))
 
@@ -236,6 +239,7 @@ def admin():
                 cfg.title = ""
                 cfg.url = ""
                 db.session.commit()
+                invalidate_fragments(TAG_STREAM_CONFIG)
                 flash("Стрим завершён", "success")
                 return redirect(url_for("admin", tab="stream"))
 
@@ -251,6 +255,7 @@ def admin():
             cfg.is_active = True
 
             db.session.commit()
+            invalidate_fragments(TAG_STREAM_CONFIG)
             flash("Стрим запущен", "success")
             return redirect(url_for("admin", tab="stream"))
 
@@ -263,6 +268,7 @@ def admin():
 
             cfg.widget_token = uuid4().hex
             db.session.commit()
+            invalidate_fragments(TAG_STREAM_CONFIG)
             flash("Ссылка для OBS-виджета обновлена", "success")
             return redirect(url_for("admin", tab="stream"))
 
@@ -305,25 +311,10 @@ def admin():
         except Exception:
             pass
 
-    try:
-        filenames = os.listdir(UPLOAD_DIR)
-    except FileNotFoundError:
-        filenames = []
-
+    # legacy attachments (not registered in the DB) — from the startup index
     for n in news_list:
-        if attachments.get(n.id):
-            continue
-        prefix = f"news_{n.id}_"
-        for fname in filenames:
-            if fname.startswith(prefix):
-                attachments[n.id] = [{
-                    "id": None,
-                    "stored": fname,
-                    "original": fname.replace(prefix, "", 1) or fname,
-                    "is_image": _is_image_filename(fname),
-                    "url": url_for("static", filename="uploads/" + fname),
-                }]
-                break
+        if not attachments.get(n.id):
+            attachments[n.id] = legacy_attachments(n.id)[:1]
 
     current_user = get_current_user()
 
@@ -372,28 +363,13 @@ def delete_news(news_id):
         return redirect(url_for("admin"))
 
     try:
-        for att in list(getattr(news, "attachments", []) or []):
-            try:
-                file_path = os.path.join(NEWS_UPLOAD_DIR, att.stored_filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-            except Exception:
-                pass
-    except Exception:
-        pass
-
-    try:
-        for fname in os.listdir(UPLOAD_DIR):
-            if fname.startswith(f"news_{news.id}_"):
-                try:
-                    os.remove(os.path.join(UPLOAD_DIR, fname))
-                except Exception:
-                    pass
+        remove_news_files(news.id, [att.stored_filename for att in (getattr(news, "attachments", []) or [])])
     except Exception:
         pass
 
     db.session.delete(news)
     db.session.commit()
+    invalidate_fragments(TAG_NEWS)
     flash("Новость удалена", "success")
     return redirect(url_for("admin"))
 
@@ -439,6 +415,7 @@ def news_new():
                 print("Failed to save news attachment:", e)
 
         db.session.commit()
+        invalidate_fragments(TAG_NEWS)
         flash("Новость добавлена", "success")
         return redirect(url_for("admin", tab="news"))
 
@@ -492,6 +469,7 @@ def news_edit(news_id: int):
                 print("Failed to save news attachment:", e)
 
         db.session.commit()
+        invalidate_fragments(TAG_NEWS)
         flash("Новость обновлена", "success")
         return redirect(url_for("admin", tab="news"))
 
@@ -509,18 +487,7 @@ def news_edit(news_id: int):
         pass
 
     if not attachments:
-        try:
-            for fname in os.listdir(UPLOAD_DIR):
-                if fname.startswith(f"news_{news.id}_"):
-                    attachments.append({
-                        "id": None,
-                        "stored": fname,
-                        "original": fname.replace(f"news_{news.id}_", "", 1) or fname,
-                        "is_image": _is_image_filename(fname),
-                        "url": url_for("static", filename="uploads/" + fname),
-                    })
-        except Exception:
-            pass
+        attachments = legacy_attachments(news.id)
 
     return render_template("news_edit.html", mode="edit", news=news, attachments=attachments)
 
@@ -536,15 +503,11 @@ def news_attachment_delete(attachment_id: int):
         return redirect(url_for("admin", tab="news"))
 
     news_id = att.news_id
-    try:
-        file_path = os.path.join(NEWS_UPLOAD_DIR, att.stored_filename)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-    except Exception:
-        pass
+    remove_attachment_file(att.stored_filename)
 
     db.session.delete(att)
     db.session.commit()
+    invalidate_fragments(TAG_NEWS)
     flash("Вложение удалено", "success")
     return redirect(url_for("news_edit", news_id=news_id))
 
@@ -575,7 +538,7 @@ def admin_clear_queue():
     flash(f"Очередь очищена: {cleared} трек(ов).", "success")
 
     try:
-        _broadcast_queue_state()
+        _schedule_queue_broadcast()
     except Exception:
         pass
 
@@ -600,6 +563,9 @@ def admin_rename_track(track_id: int):
 
     track.name = new_name
     db.session.commit()
+    invalidate_track_page(track.id)
+    invalidate_fragments(TAG_LEADERBOARD, TAG_AWARDS)
+    _invalidate_active_track(track.submission_id)
     return jsonify({"success": True, "id": track.id, "name": track.name})
 
 
@@ -616,6 +582,9 @@ def admin_delete_track(track_id: int):
 
     track.is_deleted = True
     db.session.commit()
+    invalidate_track_page(track.id)
+    invalidate_fragments(TAG_LEADERBOARD, TAG_AWARDS)
+    _invalidate_active_track(track.submission_id)
     return jsonify({"success": True})
 
 
@@ -625,19 +594,29 @@ def admin_delete_track(track_id: int):
 
 @app.route("/qr/track/<int:track_id>.png")
 def qr_for_track(track_id: int):
+    return _qr_response(track_id, "png")
+
+
+@app.route("/qr/track/<int:track_id>.svg")
+def qr_for_track_svg(track_id: int):
+    return _qr_response(track_id, "svg")
+
+
+def _qr_response(track_id: int, fmt: str):
     track = db.session.get(Track, track_id)
     if not track or getattr(track, "is_deleted", False):
         return make_response("Track not found", 404)
 
     track_url = _get_track_url(track_id)
-
-    img = qrcode.make(track_url)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-
-    resp = make_response(buf.getvalue())
-    resp.headers["Content-Type"] = "image/png"
+    data, etag = qr_cache.get(track_id, track_url, fmt, snap_size(request.args.get("size")))
+
+    if request.if_none_match.contains(etag):
+        qr_cache.count_not_modified()
+        resp = make_response("", 304)
+    else:
+        resp = make_response(data)
+        resp.headers["Content-Type"] = CONTENT_TYPES[fmt]
+    resp.set_etag(etag)
     resp.headers["Cache-Control"] = "public, max-age=86400"
     return resp
 
@@ -730,7 +709,7 @@ def admin_upload_track():
 
         # Broadcast queue update
         try:
-            _broadcast_queue_state()
+            _schedule_queue_broadcast()
         except Exception:
             pass
 
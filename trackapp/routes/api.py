@@ -3,19 +3,32 @@
 Migrated from the monolithic routes.py for better maintainability.
 """
 
-from flask import request, jsonify
-from sqlalchemy import func
+from flask import Response, request, jsonify, stream_with_context, url_for
 
-from ..core import app, db, get_current_user, _get_or_create_viewer_id, _serialize_queue_state, _get_playback_snapshot
+from ..core import app, db, _get_or_create_viewer_id, _serialize_queue_state, _get_playback_snapshot, _require_admin
 from ..extensions import CRITERIA, VIEWER_COOKIE_NAME
-from ..models import (
-    Award,
-    AwardNomination,
-    Evaluation,
-    Track,
-    TrackReview,
-    TrackSubmission,
-    ViewerRating,
+from ..models import Track, ViewerRating
+from ..admission import admission
+from ..award_badges import badge_index
+from ..data_export import FORMATS as EXPORT_FORMATS, TABLES as EXPORT_TABLES, parse_when, stream_export
+from ..dispatcher import dispatcher
+from ..extensions import socketio
+from ..live_journal import live_journal
+from ..live_state import live_state
+from ..fragment_cache import fragment_cache
+from ..page_cache import track_page_cache
+from ..qr_cache import qr_cache
+from ..search import TYPEAHEAD_LIMIT, search_tracks
+from ..session_log import session_log
+from ..topics import topic_subscriber_counts
+from ..track_details import load_track_details
+from ..user_cache import user_cache
+from ..viewer_stats import (
+    VIEWER_BATCH_MAX_IDS,
+    load_viewer_summaries,
+    overall_avg as viewer_overall_avg,
+    parse_track_ids,
+    viewer_stats_cache,
 )
 
 
@@ -31,6 +44,77 @@ def api_queue_state():
     return jsonify(payload)
 
 
+# -----------------
+# Realtime stats (admin)
+# -----------------
+
+@app.route("/api/admin/realtime")
+def api_admin_realtime():
+    """Socket.IO fan-out stats (subscribers per topic), admission/backpressure, dispatcher and live state metrics."""
+    if not _require_admin():
+        return jsonify({"error": "forbidden"}), 403
+    manager = socketio.server.manager
+    return jsonify({
+        "topics": topic_subscriber_counts(),
+        "dispatcher": dispatcher.stats(),
+        "admission": admission.stats(),
+        "backpressure": manager.backpressure_stats() if hasattr(manager, "backpressure_stats") else None,
+        "live_state": live_state.stats(),
+        "live_journal": live_journal.stats() if live_journal is not None else None,
+        "session_log": session_log.stats() if session_log is not None else None,
+        "track_page_cache": track_page_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "qr_cache": qr_cache.stats(),
+        "viewer_stats_cache": viewer_stats_cache.stats(),
+        "badge_index": badge_index.stats(),
+    })
+
+
+@app.route("/api/admin/sessions/<int:submission_id>")
+def api_admin_session(submission_id: int):
+    """Replay data of the latest judging session of a queue submission (from the session log)."""
+    if not _require_admin():
+        return jsonify({"error": "forbidden"}), 403
+    if session_log is None:
+        return jsonify({"error": "disabled"}), 404
+    session_log.flush()
+    sess = session_log.load_track_session(submission_id)
+    if sess is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(sess.to_dict())
+
+
+@app.route("/api/admin/export/<table>")
+def api_admin_export(table: str):
+    """Streaming CSV/NDJSON dump of a rating table; resume with ?after_id=<last id received>."""
+    if not _require_admin():
+        return jsonify({"error": "forbidden"}), 403
+    if table not in EXPORT_TABLES:
+        return jsonify({"error": "unknown_table", "tables": sorted(EXPORT_TABLES)}), 404
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "bad_format"}), 400
+    try:
+        filters = {
+            "since": parse_when(request.args.get("since")),
+            "until": parse_when(request.args.get("until"), end=True),
+            "track_id": request.args.get("track_id", type=int),
+            "after_id": max(0, request.args.get("after_id", 0, type=int)),
+            "limit": max(0, request.args.get("limit", 0, type=int)) or None,
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = stream_export(table, fmt, **filters)
+    resp = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{table}.{fmt}"'
+    resp.headers["Cache-Control"] = "no-store"
+    # nginx: не буферизовать поток целиком
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
 # -----------------
 # Track Summary API
 # -----------------
@@ -38,69 +122,29 @@ def api_queue_state():
 @app.route("/api/track/<int:track_id>/summary")
 def track_summary(track_id: int):
     """JSON-сводка по треку."""
-    track = db.session.get(Track, track_id)
-    if (not track) or getattr(track, "is_deleted", False):
+    details = load_track_details(track_id)
+    if details is None:
         return jsonify({"error": "not_found"}), 404
+    return jsonify(details.to_summary())
 
-    overall_avg_val = (
-        db.session.query(func.avg(Evaluation.score))
-        .filter(Evaluation.track_id == track_id)
-        .scalar()
-    )
 
-    criteria_rows = (
-        db.session.query(
-            Evaluation.criterion_key,
-            func.avg(Evaluation.score).label("avg_score"),
-        )
-        .filter(Evaluation.track_id == track_id)
-        .group_by(Evaluation.criterion_key)
-        .all()
-    )
-    criteria = []
-    for key, label in CRITERIA:
-        row = next((r for r in criteria_rows if r.criterion_key == key), None)
-        avg_val = float(row.avg_score) if row and row.avg_score is not None else None
-        criteria.append({"key": key, "label": label, "avg": avg_val})
-
-    rater_rows = (
-        db.session.query(
-            Evaluation.rater_name,
-            func.avg(Evaluation.score).label("avg_score"),
-        )
-        .filter(Evaluation.track_id == track_id)
-        .group_by(Evaluation.rater_name)
-        .order_by(Evaluation.rater_name)
-        .all()
-    )
-    raters = [{"name": row.rater_name, "avg": float(row.avg_score)} for row in rater_rows]
-
-    viewer_overall_val = (
-        db.session.query(func.avg(TrackReview.overall))
-        .filter(TrackReview.track_id == track_id)
-        .scalar()
-    )
-    review_count = (
-        db.session.query(func.count(TrackReview.id))
-        .filter(TrackReview.track_id == track_id)
-        .scalar()
-        or 0
-    )
-
-    payload = {
-        "track": {
-            "id": track.id,
-            "name": track.name,
-            "created_at": track.created_at.isoformat() if track.created_at else None,
-        },
-        "overall_avg": float(overall_avg_val) if overall_avg_val is not None else None,
-        "criteria": criteria,
-        "raters": raters,
-        "viewer_overall_avg": float(viewer_overall_val) if viewer_overall_val is not None else None,
-        "viewer_criteria": [],
-        "review_count": int(review_count),
-    }
-    return jsonify(payload)
+# -----------------
+# Search API
+# -----------------
+
+@app.route("/api/search")
+def api_search():
+    """Подсказки поиска: треки по началу слов (`?q=...&limit=10`)."""
+    q = (request.args.get("q") or "").strip()[:200]
+    try:
+        limit = int(request.args.get("limit", TYPEAHEAD_LIMIT))
+    except (TypeError, ValueError):
+        limit = TYPEAHEAD_LIMIT
+    limit = max(1, min(limit, 50))
+    results = search_tracks(q, limit=limit, ranked=False) if q else []
+    for r in results:
+        r["url"] = url_for("track_page", track_id=r["id"])
+    return jsonify({"q": q, "results": results})
 
 
 # -----------------
@@ -110,57 +154,22 @@ def track_summary(track_id: int):
 @app.route("/api/viewers/track/<int:track_id>")
 def viewer_track_summary(track_id: int):
     """JSON для модалки зрителя."""
-    track = db.session.get(Track, track_id)
-    if (not track) or getattr(track, "is_deleted", False):
+    summaries = load_viewer_summaries([track_id], request.cookies.get(VIEWER_COOKIE_NAME))
+    if track_id not in summaries:
         return jsonify({"error": "not_found"}), 404
+    return jsonify(summaries[track_id])
 
-    viewer_id = request.cookies.get(VIEWER_COOKIE_NAME)
-
-    has_voted = False
-    viewer_scores = {}
-    if viewer_id:
-        rows = ViewerRating.query.filter_by(viewer_id=viewer_id, track_id=track_id).all()
-        if rows:
-            has_voted = True
-            for r in rows:
-                viewer_scores[r.criterion_key] = r.score
-
-    crit_rows = (
-        db.session.query(
-            ViewerRating.criterion_key,
-            func.avg(ViewerRating.score).label("avg_score"),
-        )
-        .filter(ViewerRating.track_id == track_id)
-        .group_by(ViewerRating.criterion_key)
-        .all()
-    )
-
-    criteria_stats = []
-    for key, label in CRITERIA:
-        row = next((r for r in crit_rows if r.criterion_key == key), None)
-        avg_val = float(row.avg_score) if row else 0.0
-        criteria_stats.append({"key": key, "label": label, "avg_score": avg_val})
-
-    overall_avg = (
-        db.session.query(func.avg(ViewerRating.score))
-        .filter(ViewerRating.track_id == track_id)
-        .scalar()
-        or 0.0
-    )
 
-    return jsonify({
-        "track": {
-            "id": track.id,
-            "name": track.name,
-            "created_at": track.created_at.isoformat() if track.created_at else None,
-        },
-        "viewer": {
-            "has_voted": has_voted,
-            "scores": viewer_scores,
-        },
-        "criteria": criteria_stats,
-        "overall_avg": float(overall_avg),
-    })
+@app.route("/api/viewers/tracks")
+def viewer_tracks_summary():
+    """JSON для модалок зрителя сразу по нескольким трекам (`?ids=1,2,3`, до 50)."""
+    track_ids = parse_track_ids(request.args.get("ids"))
+    if not track_ids:
+        return jsonify({"error": "bad_ids"}), 400
+    if len(track_ids) > VIEWER_BATCH_MAX_IDS:
+        return jsonify({"error": "too_many_ids", "max": VIEWER_BATCH_MAX_IDS}), 400
+    summaries = load_viewer_summaries(track_ids, request.cookies.get(VIEWER_COOKIE_NAME))
+    return jsonify({"tracks": {str(tid): data for tid, data in summaries.items()}})
 
 
 @app.route("/api/viewers/rate", methods=["POST"])
@@ -209,12 +218,6 @@ def viewers_rate():
 
     db.session.add_all(new_rows)
     db.session.commit()
+    viewer_stats_cache.invalidate(track_id)
 
-    overall_avg = (
-        db.session.query(func.avg(ViewerRating.score))
-        .filter(ViewerRating.track_id == track_id)
-        .scalar()
-        or 0.0
-    )
-
-    return jsonify({"status": "ok", "overall_avg": float(overall_avg)})
+    return jsonify({"status": "ok", "overall_avg": viewer_overall_avg(track_id)})
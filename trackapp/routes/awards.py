@@ -10,9 +10,13 @@ from datetime import datetime
 
 from flask import request, redirect, url_for, flash, render_template, jsonify
 
+from ..award_badges import badge_index
 from ..core import app, db, get_current_user
-from ..extensions import ALLOWED_SUBMISSION_EXTS, AWARDS_UPLOAD_DIR, secure_filename
+from ..extensions import AWARDS_UPLOAD_DIR, secure_filename
+from ..fragment_cache import TAG_AWARDS, award_tag, fragment_cache, invalidate_fragments
 from ..models import Award, AwardNomination, Track, TrackSubmission
+from ..page_cache import invalidate_track_page
+from ..track_details import load_track_details_batch
 
 # Import notification helper from tg_bot module
 try:
@@ -26,20 +30,6 @@ except ImportError:
 # Helpers
 # -----------------
 
-def _track_audio_url_for_embed(track: Track):
-    """Best-effort audio URL for embedded players."""
-    try:
-        if getattr(track, "submission_id", None):
-            sub = db.session.get(TrackSubmission, int(track.submission_id))
-            if sub and sub.status not in ("deleted", "failed"):
-                ext = (sub.original_ext or "").lower().lstrip(".")
-                if ext in ALLOWED_SUBMISSION_EXTS:
-                    return url_for("submission_audio", file_uuid=sub.file_uuid, ext=ext)
-    except Exception:
-        return None
-    return None
-
-
 def _award_winner_display(award: Award):
     """Return a dict with winner display data (snapshot-first)."""
     if not award:
@@ -60,6 +50,21 @@ def _award_winner_display(award: Award):
     return None
 
 
+def _award_track_ids(award_id: int) -> list[int]:
+    """Tracks nominated in an award (whose badges change with it)."""
+    return [
+        tid for (tid,) in db.session.query(AwardNomination.track_id).filter(AwardNomination.award_id == award_id).all()
+    ]
+
+
+def _badges_changed(track_ids) -> None:
+    """After the commit: new badges in the index; track pages (cached and archived) show them on the next view."""
+    track_ids = list(track_ids)
+    badge_index.refresh_tracks(track_ids)
+    for tid in track_ids:
+        invalidate_track_page(tid)
+
+
 def _award_store_image_file(f) -> str | None:
     """Store uploaded award image under static/uploads/awards and return URL path."""
     filename = secure_filename(f.filename or "")
@@ -157,6 +162,7 @@ def awards_create():
     )
     db.session.add(a)
     db.session.commit()
+    invalidate_fragments(TAG_AWARDS)
 
     try:
         f = request.files.get("image")
@@ -166,6 +172,7 @@ def awards_create():
                 a.image_path = stored
                 db.session.add(a)
                 db.session.commit()
+                invalidate_fragments(TAG_AWARDS)
     except Exception:
         pass
     flash("Премия создана", "success")
@@ -211,6 +218,8 @@ def awards_update(award_id: int):
 
     db.session.add(award)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed(_award_track_ids(award_id))
     flash("Премия обновлена", "success")
     return redirect(url_for("awards_page", award_id=award.id))
 
@@ -230,6 +239,7 @@ def awards_delete(award_id: int):
         flash("Премия завершена — удаление запрещено", "error")
         return redirect(url_for("awards_page", award_id=award.id))
 
+    track_ids = _award_track_ids(award_id)
     award.winner_nomination_id = None
     award.winner_snapshot_json = None
     db.session.add(award)
@@ -237,6 +247,8 @@ def awards_delete(award_id: int):
 
     db.session.delete(award)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed(track_ids)
     flash("Премия удалена", "success")
     return redirect(url_for("awards_page"))
 
@@ -251,48 +263,46 @@ def awards_panel(award_id: int):
     if not award:
         return "<div class='award-panel-empty'>Премия не найдена</div>", 404
 
+    user = get_current_user()
+    is_admin = bool(user and user.is_admin())
+    # One rendered frame per award and audience (admins get the action buttons);
+    # dropped by award_tag(award_id) on nominate/remove/winner/end and by
+    # TAG_AWARDS on track renames/deletes.
+    return fragment_cache.get_or_set(
+        f"award_panel:{award_id}:{'admin' if is_admin else 'public'}",
+        (TAG_AWARDS, award_tag(award_id)),
+        lambda: _render_awards_panel(award, is_admin),
+    )
+
+
+def _render_awards_panel(award: Award, is_admin: bool) -> str:
     nominations = (
         db.session.query(AwardNomination)
-        .filter(AwardNomination.award_id == award_id)
+        .filter(AwardNomination.award_id == award.id)
         .order_by(AwardNomination.nominated_at.desc())
         .all()
     )
 
+    details = load_track_details_batch(n.track_id for n in nominations)
     nominees = []
     for nom in nominations:
-        t = nom.track
-        if not t or getattr(t, "is_deleted", False):
+        t = details.get(nom.track_id)
+        if t is None:
             continue
-        audio_url = _track_audio_url_for_embed(t)
-        player_title = None
-        player_subtitle = None
-        try:
-            if getattr(t, "submission_id", None):
-                sub = db.session.get(TrackSubmission, int(t.submission_id))
-                if sub:
-                    player_title = sub.title
-                    player_subtitle = sub.artist
-        except Exception:
-            pass
-        if not player_title:
-            player_title = getattr(t, "name", "—")
         nominees.append({
             "nom": nom,
             "track": t,
-            "audio_url": audio_url,
-            "player_title": player_title,
-            "player_subtitle": player_subtitle,
+            "audio_url": t.audio_url,
+            "player_title": t.player_title,
+            "player_subtitle": t.player_subtitle,
         })
 
-    winner = _award_winner_display(award)
-    user = get_current_user()
-
     return render_template(
         "partials/award_panel.html",
         award=award,
         nominees=nominees,
-        winner=winner,
-        is_admin=bool(user and user.is_admin()),
+        winner=_award_winner_display(award),
+        is_admin=is_admin,
     )
 
 
@@ -329,6 +339,8 @@ def award_nominate(award_id: int, track_id: int):
     nom = AwardNomination(award_id=award_id, track_id=track_id, nominated_by_user_id=user.id)
     db.session.add(nom)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed([track_id])
     flash("Трек номинирован", "success")
 
     try:
@@ -364,8 +376,11 @@ def award_remove_nomination(nom_id: int):
         award.winner_snapshot_json = None
         db.session.add(award)
 
+    nom_award_id, nom_track_id = nom.award_id, nom.track_id
     db.session.delete(nom)
     db.session.commit()
+    invalidate_fragments(award_tag(nom_award_id))
+    _badges_changed([nom_track_id])
 
     if request.headers.get("Turbo-Frame") == "award-panel":
         return redirect(url_for("awards_panel", award_id=award.id))
@@ -406,6 +421,8 @@ def award_set_winner(award_id: int, nom_id: int):
     award.winner_snapshot_json = json.dumps(snap, ensure_ascii=False)
     db.session.add(award)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed(_award_track_ids(award_id))
 
     try:
         sub = None
@@ -440,6 +457,8 @@ def award_unset_winner(award_id: int):
     award.winner_snapshot_json = None
     db.session.add(award)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed(_award_track_ids(award_id))
 
     if request.headers.get("Turbo-Frame") == "award-panel":
         return redirect(url_for("awards_panel", award_id=award_id))
@@ -470,6 +489,8 @@ def award_end(award_id: int):
     award.status = "ended"
     db.session.add(award)
     db.session.commit()
+    invalidate_fragments(award_tag(award_id))
+    _badges_changed(_award_track_ids(award_id))
 
     flash("Премия завершена", "success")
     if request.headers.get("Turbo-Frame") == "award-panel":
@@ -3,9 +3,12 @@
 Migrated from the monolithic routes.py for better maintainability.
 """
 
+import mimetypes
 import os
+import re
 
-from flask import request, redirect, url_for, flash, render_template, make_response, jsonify
+from flask import request, redirect, url_for, flash, render_template, make_response, jsonify, send_file
+from werkzeug.security import safe_join
 from sqlalchemy import func
 
 from ..core import (
@@ -27,14 +30,12 @@ from ..extensions import (
     S3_PRESIGN_EXPIRES,
     SUBMISSION_MAX_MB,
     SUBMISSIONS_RAW_DIR,
-    UPLOAD_DIR,
     VIEWER_COOKIE_MAX_AGE,
     VIEWER_COOKIE_NAME,
     send_from_directory,
 )
 from ..models import (
     Award,
-    AwardNomination,
     Evaluation,
     News,
     NewsAttachment,
@@ -43,9 +44,16 @@ from ..models import (
     TrackComment,
     TrackReview,
     TrackReviewScore,
-    TrackSubmission,
     ViewerRating,
 )
+from .. import archive
+from ..assets import ASSET_CACHE_CONTROL, ASSETS_DIST_DIR, pick_encoding
+from ..award_badges import badge_index
+from ..fragment_cache import TAG_LEADERBOARD, TAG_NEWS, TAG_STREAM_CONFIG, fragment_cache
+from ..news_attachments import legacy_attachments
+from ..search import search_reviews, search_tracks
+from ..page_cache import invalidate_track_page, is_anonymous_cacheable, track_page_cache
+from ..track_details import load_reviews_page, load_track_details
 
 
 # -----------------
@@ -101,6 +109,23 @@ def submission_audio(file_uuid: str, ext: str):
     return resp
 
 
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename: str):
+    """Fingerprinted static assets (see trackapp/assets.py): cached forever, precompressed if possible."""
+    path = safe_join(ASSETS_DIST_DIR, filename)
+    if not path or not os.path.isfile(path):
+        return make_response("Not found", 404)
+
+    suffix = pick_encoding(filename, request.accept_encodings)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    resp = send_file(path + (suffix or ""), mimetype=mimetype, conditional=True, max_age=31536000)
+    if suffix:
+        resp.headers["Content-Encoding"] = "br" if suffix == ".br" else "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return resp
+
+
 # -----------------
 # Queue
 # -----------------
@@ -133,7 +158,30 @@ def queue_submit():
 @app.route("/")
 def home():
     """Публичная главная страница ANTIGAZ Hub."""
-    page = request.args.get("page", 1, type=int)
+    page = max(1, request.args.get("page", 1, type=int) or 1)
+
+    # Блоки меняются только по действиям админа/оценке — берём из кэша фрагментов.
+    if page <= _HOME_CACHED_PAGES:
+        news_block = fragment_cache.get_or_set(f"news:home:{page}", (TAG_NEWS,), lambda: _home_news_block(page))
+    else:
+        news_block = _home_news_block(page)
+    top_tracks, recent_tracks = fragment_cache.get_or_set("leaderboard:home", (TAG_LEADERBOARD,), _home_leaderboard_block)
+    stream_info = fragment_cache.get_or_set("stream_config:home", (TAG_STREAM_CONFIG,), _home_stream_info)
+
+    return render_template(
+        "home.html",
+        news_items=news_block["items"],
+        news_pagination=news_block["pagination"],
+        top_tracks=top_tracks,
+        recent_tracks=recent_tracks,
+        stream_info=stream_info,
+    )
+
+
+_HOME_CACHED_PAGES = 20
+
+
+def _home_news_block(page: int):
     per_page = 10
 
     news_query = db.session.query(News).order_by(News.created_at.desc())
@@ -160,25 +208,10 @@ def home():
         except Exception:
             pass
 
-    # legacy attachments
-    try:
-        _home_filenames = os.listdir(UPLOAD_DIR)
-    except FileNotFoundError:
-        _home_filenames = []
-
+    # legacy attachments (not registered in the DB) — from the startup index
     for nid in page_news_ids:
-        if attachments_by_news.get(nid):
-            continue
-        _prefix = f"news_{nid}_"
-        for _fname in _home_filenames:
-            if _fname.startswith(_prefix):
-                attachments_by_news[nid] = [{
-                    "stored": _fname,
-                    "original": _fname.replace(_prefix, "", 1) or _fname,
-                    "is_image": _is_image_filename(_fname),
-                    "url": url_for("static", filename="uploads/" + _fname),
-                }]
-                break
+        if not attachments_by_news.get(nid):
+            attachments_by_news[nid] = legacy_attachments(nid)[:1]
 
     news_items = []
     for n in news_pagination.items:
@@ -192,6 +225,21 @@ def home():
             "attachments": attachments,
         })
 
+    # Plain dict instead of the Pagination object: it must survive pickling (disk backend).
+    return {
+        "items": news_items,
+        "pagination": {
+            "page": news_pagination.page,
+            "pages": news_pagination.pages,
+            "has_prev": news_pagination.has_prev,
+            "has_next": news_pagination.has_next,
+            "prev_num": news_pagination.prev_num,
+            "next_num": news_pagination.next_num,
+        },
+    }
+
+
+def _home_leaderboard_block():
     # Mini top (top 3 by streamer avg)
     viewer_subq = (
         db.session.query(
@@ -247,19 +295,15 @@ def home():
         for row in recent_rows
     ]
 
+    return top_tracks, recent_tracks
+
+
+def _home_stream_info():
     cfg = db.session.query(StreamConfig).order_by(StreamConfig.id.asc()).first()
     stream_info = None
     if cfg and cfg.is_active and cfg.url:
         stream_info = {"title": cfg.title or "Стрим на Twitch", "url": cfg.url}
-
-    return render_template(
-        "home.html",
-        news_items=news_items,
-        news_pagination=news_pagination,
-        top_tracks=top_tracks,
-        recent_tracks=recent_tracks,
-        stream_info=stream_info,
-    )
+    return stream_info
 
 
 # -----------------
@@ -269,8 +313,19 @@ def home():
 @app.route("/track/<int:track_id>", methods=["GET"])
 def track_page(track_id: int):
     """Public track page (server-rendered)."""
-    track = db.session.get(Track, track_id)
-    if (not track) or getattr(track, "is_deleted", False):
+    # QR bursts: anonymous viewers share one render per few seconds.
+    if is_anonymous_cacheable() and not request.args:
+        # Прошлые сезоны: готовый HTML из архива, без запросов к базе.
+        snapshot = archive.track_snapshot_path(track_id) if archive.ARCHIVE_SERVE else None
+        if snapshot:
+            return archive.send_snapshot(snapshot)
+        return track_page_cache.get_or_render(track_id, lambda: _render_track_page(track_id))
+    return _render_track_page(track_id)
+
+
+def _render_track_page(track_id: int):
+    details = load_track_details(track_id)
+    if details is None:
         flash("Трек не найден", "error")
         return redirect(url_for("top_tracks"))
 
@@ -281,7 +336,7 @@ def track_page(track_id: int):
     if user:
         my_review = (
             db.session.query(TrackReview)
-            .filter(TrackReview.track_id == track.id, TrackReview.user_id == user.id)
+            .filter(TrackReview.track_id == details.id, TrackReview.user_id == user.id)
             .first()
         )
 
@@ -294,102 +349,50 @@ def track_page(track_id: int):
         except Exception:
             pass
 
-    overall_avg = db.session.query(func.avg(Evaluation.score)).filter(Evaluation.track_id == track.id).scalar()
-    overall_avg = float(overall_avg) if overall_avg is not None else None
-
-    crit_rows = (
-        db.session.query(Evaluation.criterion_key, func.avg(Evaluation.score).label("avg_score"))
-        .filter(Evaluation.track_id == track.id)
-        .group_by(Evaluation.criterion_key)
-        .order_by(Evaluation.criterion_key)
-        .all()
-    )
-    criteria_stats = [{"key": row.criterion_key, "avg": float(row.avg_score)} for row in crit_rows]
-
-    rater_rows = (
-        db.session.query(Evaluation.rater_name, func.avg(Evaluation.score).label("avg_score"))
-        .filter(Evaluation.track_id == track.id)
-        .group_by(Evaluation.rater_name)
-        .order_by(Evaluation.rater_name)
-        .all()
-    )
-    raters_stats = [{"name": row.rater_name, "avg": float(row.avg_score)} for row in rater_rows]
-
-    review_overall_val = db.session.query(func.avg(TrackReview.overall)).filter(TrackReview.track_id == track.id).scalar()
-    review_overall = float(review_overall_val) if review_overall_val is not None else None
-    review_count = db.session.query(func.count(TrackReview.id)).filter(TrackReview.track_id == track.id).scalar() or 0
-    reviews = db.session.query(TrackReview).filter(TrackReview.track_id == track.id).order_by(TrackReview.created_at.desc()).all()
-
-    audio_url = None
-    try:
-        if getattr(track, "submission_id", None):
-            sub = db.session.get(TrackSubmission, int(track.submission_id))
-            if sub and sub.status not in ("deleted", "failed"):
-                ext = (sub.original_ext or "").lower().lstrip(".")
-                if ext in ALLOWED_SUBMISSION_EXTS:
-                    audio_url = url_for("submission_audio", file_uuid=sub.file_uuid, ext=ext)
-    except Exception:
-        audio_url = None
-
-    player_title = None
-    player_subtitle = None
-    try:
-        if getattr(track, "submission_id", None):
-            sub = db.session.get(TrackSubmission, track.submission_id)
-            if sub:
-                player_title = sub.title
-                player_subtitle = sub.artist
-    except Exception:
-        pass
-    if not player_title:
-        player_title = getattr(track, "name", "Прослушивание")
-
+    reviews_page = load_reviews_page(details.id)
     active_awards = db.session.query(Award).filter(Award.status == "active").order_by(Award.created_at.desc()).all()
-    award_noms = []
-    award_wins = []
-    try:
-        award_noms = [
-            {"title": r[0], "emoji": (r[1] or "🎖"), "kind": "nom"}
-            for r in (
-                db.session.query(Award.title, Award.icon_emoji)
-                .join(AwardNomination, AwardNomination.award_id == Award.id)
-                .filter(AwardNomination.track_id == track.id)
-                .filter(Award.status.in_(["active", "ended"]))
-                .order_by(Award.created_at.desc())
-                .all()
-            )
-        ]
-        award_wins = [
-            {"title": r[0], "emoji": (r[1] or "🏆"), "kind": "win"}
-            for r in (
-                db.session.query(Award.title, Award.icon_emoji)
-                .join(AwardNomination, Award.winner_nomination_id == AwardNomination.id)
-                .filter(AwardNomination.track_id == track.id)
-                .all()
-            )
-        ]
-    except Exception:
-        pass
 
     return render_template(
         "track.html",
-        track=track,
-        audio_url=audio_url,
-        player_title=player_title,
-        player_subtitle=player_subtitle,
-        overall_avg=overall_avg,
-        criteria_stats=criteria_stats,
-        raters_stats=raters_stats,
-        review_overall=review_overall,
-        review_count=review_count,
-        reviews=reviews,
+        track=details,
+        audio_url=details.audio_url,
+        player_title=details.player_title,
+        player_subtitle=details.player_subtitle,
+        overall_avg=details.overall_avg,
+        criteria_stats=details.criteria_stats,
+        raters_stats=details.raters,
+        review_overall=details.review_overall,
+        review_count=details.review_count,
+        reviews_page=reviews_page,
+        track_id=details.id,
         my_review=my_review,
         my_review_score_map=my_review_score_map,
         CRITERIA=CRITERIA,
         is_admin=is_admin,
         active_awards=active_awards,
-        award_noms=award_noms,
-        award_wins=award_wins,
+        award_noms=details.award_noms,
+        award_wins=details.award_wins,
+    )
+
+
+@app.route("/track/<int:track_id>/reviews")
+def track_reviews_page(track_id: int):
+    """Следующая страница рецензий (Turbo frame, keyset-курсор `?cursor=`)."""
+    track = db.session.get(Track, track_id)
+    if (not track) or getattr(track, "is_deleted", False):
+        return make_response("Not found", 404)
+    cursor = request.args.get("cursor") or ""
+    try:
+        page = load_reviews_page(track_id, cursor)
+        after_id = int(cursor.rpartition("~")[2])
+    except ValueError:
+        return make_response("Bad cursor", 400)
+    return render_template(
+        "partials/track_reviews_frame.html",
+        frame_id=f"reviews-after-{after_id}",
+        reviews_page=page,
+        track_id=track_id,
+        CRITERIA=CRITERIA,
     )
 
 
@@ -462,6 +465,7 @@ def submit_review(track_id: int):
         flash("Рецензия опубликована", "success")
 
     db.session.commit()
+    invalidate_track_page(track.id)
     return redirect(url_for("track_page", track_id=track.id) + "#reviews")
 
 
@@ -544,33 +548,9 @@ def top_tracks():
     track_ids = [t["id"] for t in tracks]
     active_awards = db.session.query(Award).filter(Award.status == "active").order_by(Award.created_at.desc()).all()
 
-    nomination_map = {tid: [] for tid in track_ids}
-    winner_map = {tid: [] for tid in track_ids}
-    if track_ids:
-        rows_nom = (
-            db.session.query(AwardNomination.track_id, Award.title, Award.icon_emoji, Award.status)
-            .join(Award, Award.id == AwardNomination.award_id)
-            .filter(AwardNomination.track_id.in_(track_ids))
-            .order_by(Award.created_at.desc())
-            .all()
-        )
-        for tid, title, emoji, st in rows_nom:
-            if st in ("active", "ended"):
-                nomination_map.setdefault(tid, []).append({"title": title, "emoji": (emoji or "🎖"), "kind": "nom"})
-
-        rows_win = (
-            db.session.query(AwardNomination.track_id, Award.title, Award.icon_emoji)
-            .join(Award, Award.winner_nomination_id == AwardNomination.id)
-            .filter(AwardNomination.track_id.in_(track_ids))
-            .all()
-        )
-        for tid, title, emoji in rows_win:
-            winner_map.setdefault(tid, []).append({"title": title, "emoji": (emoji or "🏆"), "kind": "win"})
-
+    badges = badge_index.for_tracks(track_ids)
     for t in tracks:
-        tid = t["id"]
-        t["award_wins"] = winner_map.get(tid, [])
-        t["award_noms"] = nomination_map.get(tid, [])
+        t["award_noms"], t["award_wins"] = badges[t["id"]]
 
     return render_template(
         "top.html",
@@ -584,6 +564,53 @@ def top_tracks():
     )
 
 
+# -----------------
+# Search
+# -----------------
+
+@app.route("/search")
+def search_page():
+    """Поиск по трекам, артистам и рецензиям (FTS5)."""
+    q = (request.args.get("q") or "").strip()[:200]
+    tracks = search_tracks(q, limit=50) if q else []
+    reviews = search_reviews(q, limit=20) if q else []
+    return render_template("search.html", q=q, tracks=tracks, reviews=reviews)
+
+
+# -----------------
+# Archive
+# -----------------
+
+_SEASON_RE = re.compile(r"^\d{4}-q[1-4]$")
+
+
+@app.route("/archive")
+def archive_index():
+    """Список архивных сезонов (из манифеста архива, без базы)."""
+    return render_template("archive.html", seasons=archive.seasons())
+
+
+@app.route("/archive/<season>")
+def archive_season(season: str):
+    """Статичный топ сезона, собранный `export_archive`."""
+    if not _SEASON_RE.match(season):
+        return make_response("Not found", 404)
+    path = archive.season_file(season, "index.html")
+    if not path:
+        return make_response("Not found", 404)
+    return archive.send_snapshot(path)
+
+
+@app.route("/archive/<season>.json")
+def archive_season_json(season: str):
+    if not _SEASON_RE.match(season):
+        return jsonify({"error": "not_found"}), 404
+    path = archive.season_file(season, "season.json")
+    if not path:
+        return jsonify({"error": "not_found"}), 404
+    return archive.send_snapshot(path)
+
+
 # -----------------
 # Viewers Page
 # -----------------
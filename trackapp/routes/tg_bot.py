@@ -24,8 +24,9 @@ from ..extensions import (
     SUBMISSIONS_RAW_DIR,
     SUBMISSIONS_TMP_DIR,
 )
+from ..dispatcher import dispatcher
 from ..models import TrackSubmission
-from ..state import _broadcast_queue_state
+from ..state import _schedule_queue_broadcast
 
 
 # -----------------
@@ -132,14 +133,22 @@ def _queue_position(submission_id: int) -> int:
 
 
 def _notify_submission_tg(sub: TrackSubmission | None, text: str) -> None:
-    """Send notification to Telegram user about their submission."""
+    """Send notification to Telegram user about their submission.
+
+    The HTTP call runs in the background dispatcher; only the chat id is
+    captured here so no ORM object crosses threads.
+    """
     if not _TG_BOT_TOKEN or not sub or not sub.tg_user_id:
         return
+    dispatcher.submit(_send_tg_message, int(sub.tg_user_id), text, name="tg_notify")
+
+
+def _send_tg_message(tg_user_id: int, text: str) -> None:
     try:
         response = requests.post(
             f"https://api.telegram.org/bot{_TG_BOT_TOKEN}/sendMessage",
             json={
-                "chat_id": int(sub.tg_user_id),
+                "chat_id": int(tg_user_id),
                 "text": text,
                 "disable_web_page_preview": True,
             },
@@ -148,9 +157,9 @@ def _notify_submission_tg(sub: TrackSubmission | None, text: str) -> None:
         if not response.ok and _TG_NOTIFY_DEBUG:
             app.logger.warning("Telegram notify returned %s: %s", response.status_code, response.text[:200])
     except requests.Timeout:
-        app.logger.warning("Telegram notify timeout for tg_user_id=%s", sub.tg_user_id)
+        app.logger.warning("Telegram notify timeout for tg_user_id=%s", tg_user_id)
     except requests.RequestException as e:
-        app.logger.warning("Telegram notify failed for tg_user_id=%s: %s", sub.tg_user_id, str(e)[:100])
+        app.logger.warning("Telegram notify failed for tg_user_id=%s: %s", tg_user_id, str(e)[:100])
     except Exception:
         if _TG_NOTIFY_DEBUG:
             app.logger.exception("Telegram notify unexpected error")
@@ -249,7 +258,7 @@ def tg_enqueue_free(submission_id: int):
     sub.payment_amount = None
     db.session.commit()
 
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
     return jsonify({"ok": True, "position": _queue_position(submission_id)})
 
 
@@ -279,7 +288,7 @@ def tg_waiting_payment(submission_id: int):
     if (sub.status or "") not in ("queued", "playing"):
         sub.status = "waiting_payment"
     db.session.commit()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
     return jsonify({"ok": True})
 
 
@@ -324,7 +333,7 @@ def tg_mark_paid(submission_id: int):
     sub.priority_set_at = datetime.utcnow()
     db.session.commit()
 
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
     return jsonify({"ok": True, "position": _queue_position(submission_id)})
 
 
@@ -353,7 +362,7 @@ def tg_cancel_submission(submission_id: int):
     sub.payment_ref = None
     sub.payment_amount = None
     db.session.commit()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
     return jsonify({"ok": True})
 
 
@@ -0,0 +1,132 @@
+"""Benchmark Socket.IO payload encodings: JSON vs msgpack (+ deflate).
+
+Builds representative payloads for the events we broadcast most
+(`queue_state` with 100 items, `initial_state`, `playback_state`,
+`evaluation_result`) and reports bytes on the wire and encode time for:
+
+- json      : default python-socketio text packet
+- msgpack   : binary packet (SOCKETIO_MSGPACK=1, client connected with ?bin=1)
+- *+deflate : the same frame after raw DEFLATE, as permessage-deflate would send it
+
+Does not touch the database; payload shapes mirror trackapp.state serializers.
+
+Run:
+    python -m trackapp.scripts.bench_socket_payloads
+    python -m trackapp.scripts.bench_socket_payloads --raters 6 --queue 100 --repeat 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from socketio import packet
+
+from trackapp.extensions import CRITERIA
+from trackapp.socket_codec import HybridPacket, msgpack
+
+
+def _deflate(data: bytes) -> int:
+    # Raw deflate (wbits=-15) is what permessage-deflate puts on the wire.
+    c = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return len(c.compress(data) + c.flush(zlib.Z_SYNC_FLUSH))
+
+
+def build_payloads(num_raters: int, queue_len: int) -> dict:
+    now = datetime(2025, 1, 1, 20, 0, 0)
+    queue_items = []
+    for i in range(queue_len):
+        queue_items.append({
+            "id": 1000 + i,
+            "artist": f"Artist {i}",
+            "title": f"Track title number {i}",
+            "display_name": f"Artist {i} — Track title number {i}",
+            "priority": (i % 5) * 100,
+            "status": "queued",
+            "duration_sec": 150 + i,
+            "created_at": (now + timedelta(minutes=i)).isoformat(),
+            "queue_position": i + 1,
+        })
+    raters = []
+    for i in range(num_raters):
+        raters.append({
+            "id": f"{i:08x}",
+            "name": f"Judge {i}",
+            "order": i,
+            "scores": {key: 7.5 for key, _label in CRITERIA},
+            "user_id": str(i + 1),
+        })
+    criteria = [{"key": k, "label": label} for k, label in CRITERIA]
+    return {
+        "queue_state": {"items": queue_items, "counts": {"queued": queue_len}},
+        "initial_state": {"track_name": "Artist — Title", "raters": raters, "criteria": criteria},
+        "playback_state": {
+            "active": {
+                "id": 1000,
+                "artist": "Artist 0",
+                "title": "Track title number 0",
+                "display_name": "Artist 0 — Track title number 0",
+                "priority": 0,
+                "status": "playing",
+                "duration_sec": 150,
+                "file_uuid": "0" * 32,
+                "audio_url": "/media/submissions/" + "0" * 32 + ".mp3",
+            },
+            "playback": {"is_playing": True, "position_ms": 12345},
+        },
+        "evaluation_result": {
+            "track_id": 42,
+            "track_name": "Artist — Title",
+            "track_url": "https://example.com/track/42",
+            "qr_url": "https://example.com/qr/track/42.png",
+            "raters": [
+                {"id": r["id"], "name": r["name"], "scores": r["scores"], "average": 7.5}
+                for r in raters
+            ],
+            "criteria": [{"key": k, "label": label, "average": 7.5} for k, label in CRITERIA],
+            "overall": 7.5,
+            "top_position": 3,
+        },
+    }
+
+
+def _time_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(num_raters: int, queue_len: int, repeat: int) -> None:
+    if msgpack is None:
+        raise SystemExit("msgpack is not installed: pip install msgpack")
+
+    payloads = build_payloads(num_raters, queue_len)
+    header = f"{'event':<18} {'json B':>8} {'msgpack B':>10} {'json+defl':>10} {'mp+defl':>8} {'json us':>8} {'mp us':>8}"
+    print(header)
+    print("-" * len(header))
+    for event, data in payloads.items():
+        pkt = HybridPacket(packet.EVENT, namespace="/", data=[event, data])
+        as_json = pkt.encode().encode("utf-8")
+        as_msgpack = pkt.encode_msgpack()
+        json_us = _time_us(pkt.encode, repeat)
+        mp_us = _time_us(pkt.encode_msgpack, repeat)
+        print(
+            f"{event:<18} {len(as_json):>8} {len(as_msgpack):>10} "
+            f"{_deflate(as_json):>10} {_deflate(as_msgpack):>8} {json_us:>8.1f} {mp_us:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raters", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.raters, args.queue, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
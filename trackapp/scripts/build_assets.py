@@ -0,0 +1,30 @@
+"""Fingerprint and precompress static assets (run on every deploy).
+
+Writes hashed copies of static/{img,js,css}, their .gz/.br siblings and
+manifest.json into ASSETS_DIST_DIR (default static/dist/); templates pick
+the hashed URLs up through `asset_url()` after the app restarts. `.br` files
+need the optional `brotli` package.
+
+Run:
+    python -m trackapp.scripts.build_assets
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+
+from trackapp.assets import ASSETS_DIST_DIR, build_assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dist", default=ASSETS_DIST_DIR)
+    args = parser.parse_args()
+    manifest = build_assets(dist_dir=args.dist)
+    total = sum(os.path.getsize(os.path.join(args.dist, p)) for p in manifest.values())
+    print(f"ok: {len(manifest)} assets ({total // 1024} KB) -> {args.dist}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Query-count regression check for track views.
+
+Seeds a throwaway SQLite database, then requests every endpoint below as an
+anonymous visitor and counts SQL statements. Each endpoint has a budget, and
+the count must not grow with the number of nominees/tracks (no N+1).
+
+`python -m` imports the trackapp package before this module runs, so the
+scratch database has to be chosen in the environment:
+
+    DB_PATH=/tmp/qc.db python -m trackapp.scripts.check_query_counts
+    DB_PATH=/tmp/qc.db python -m trackapp.scripts.check_query_counts --tracks 30 -v
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import uuid
+
+if not os.getenv("DB_PATH"):
+    raise SystemExit("set DB_PATH to a scratch database, e.g. DB_PATH=/tmp/qc.db (it gets seeded with test rows)")
+
+from sqlalchemy import event  # noqa: E402
+
+from trackapp import app  # noqa: E402
+from trackapp.award_badges import badge_index  # noqa: E402
+from trackapp.extensions import CRITERIA, db  # noqa: E402
+from trackapp.models import (  # noqa: E402
+    Award,
+    AwardNomination,
+    Evaluation,
+    Track,
+    TrackReview,
+    TrackReviewScore,
+    TrackSubmission,
+    User,
+    ViewerRating,
+)
+from trackapp.fragment_cache import fragment_cache  # noqa: E402
+from trackapp.page_cache import track_page_cache  # noqa: E402
+from trackapp.viewer_stats import VIEWER_BATCH_MAX_IDS, viewer_stats_cache  # noqa: E402
+
+# endpoint template -> max statements
+BUDGETS = {
+    "/track/{track_id}": 5,
+    "/api/track/{track_id}/summary": 2,
+    "/awards/{award_id}/panel": 5,
+    "/top": 4,
+    "/api/viewers/tracks?ids={track_ids}": 3,
+}
+
+
+def _seed(n_tracks: int) -> dict:
+    award = Award(title=f"Award {uuid.uuid4().hex[:6]}", status="active")
+    db.session.add(award)
+    db.session.flush()
+    nom = None
+    track_ids = []
+    for i in range(n_tracks):
+        sub = TrackSubmission(
+            artist=f"Artist {i}", title=f"Song {i}", file_uuid=uuid.uuid4().hex, original_ext="mp3", status="done",
+        )
+        db.session.add(sub)
+        db.session.flush()
+        track = Track(name=f"Artist {i} — Song {i}", submission_id=sub.id)
+        db.session.add(track)
+        db.session.flush()
+        for rater in ("Judge A", "Judge B"):
+            for key, _label in CRITERIA:
+                db.session.add(Evaluation(track_id=track.id, rater_name=rater, criterion_key=key, score=5 + i % 5))
+        for key, _label in CRITERIA:
+            db.session.add(ViewerRating(viewer_id=uuid.uuid4().hex, track_id=track.id, criterion_key=key, score=7))
+        track_ids.append(track.id)
+        nom = AwardNomination(award_id=award.id, track_id=track.id)
+        db.session.add(nom)
+        db.session.flush()
+    award.winner_nomination_id = nom.id if nom else None
+    # Reviews with per-criterion scores on the last track (more than one page of them).
+    for i in range(n_tracks * 3):
+        user = User(username=f"qc_{uuid.uuid4().hex[:12]}", password="-")
+        db.session.add(user)
+        db.session.flush()
+        review = TrackReview(track_id=track.id, user_id=user.id, overall=7.0, text=f"Review {i}")
+        db.session.add(review)
+        db.session.flush()
+        for key, _label in CRITERIA:
+            db.session.add(TrackReviewScore(review_id=review.id, criterion_key=key, score=7))
+    db.session.commit()
+    return {
+        "award_id": award.id,
+        "track_id": nom.track_id if nom else 0,
+        "track_ids": ",".join(str(t) for t in track_ids[:VIEWER_BATCH_MAX_IDS]),
+    }
+
+
+def _count(client, url: str, counter: list) -> int:
+    counter[0] = 0
+    resp = client.get(url)
+    assert resp.status_code == 200, (url, resp.status_code)
+    return counter[0]
+
+
+def run(n_tracks: int, verbose: bool) -> None:
+    counter = [0]
+    # Count what a cache miss costs.
+    track_page_cache.ttl_sec = 0
+    fragment_cache.ttl_sec = 0
+    viewer_stats_cache.ttl_sec = 0
+    with app.app_context():
+        small = _seed(1)
+        big = _seed(n_tracks)
+        badge_index.rebuild()
+        event.listen(db.engine, "before_cursor_execute", lambda *a, **k: counter.__setitem__(0, counter[0] + 1))
+
+    client = app.test_client()
+    failed = []
+    for template, budget in BUDGETS.items():
+        n_small = _count(client, template.format(**small), counter)
+        n_big = _count(client, template.format(**big), counter)
+        ok = n_small == n_big and n_big <= budget
+        if verbose or not ok:
+            print(f"{'ok ' if ok else 'FAIL'} {template}: {n_small} / {n_big} queries (budget {budget})")
+        if not ok:
+            failed.append(template)
+    if failed:
+        raise SystemExit(f"{len(failed)} endpoint(s) over budget or growing with data")
+    print(f"ok: {len(BUDGETS)} endpoints within query budget ({n_tracks} tracks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=10)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    run(args.tracks, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
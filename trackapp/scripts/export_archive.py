@@ -0,0 +1,32 @@
+"""Export past seasons (calendar quarters) to static HTML/JSON snapshots.
+
+Incremental: only tracks whose scores, reviews, name or award badges changed
+since the previous run are re-rendered (see trackapp/archive.py). Run from
+cron, e.g. nightly; `--force` re-renders everything (after a template change).
+
+Run:
+    python -m trackapp.scripts.export_archive [--force] [--season 2025-q3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from trackapp import app
+from trackapp import archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="re-render unchanged tracks and seasons too")
+    parser.add_argument("--season", default=None, help="only this season, e.g. 2025-q3")
+    args = parser.parse_args()
+    started = time.monotonic()
+    with app.app_context():
+        result = archive.export_archive(force=args.force, only_season=args.season)
+    print(f"ok: {result} in {time.monotonic() - started:.1f}s -> {archive.ARCHIVE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
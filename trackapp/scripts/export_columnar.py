@@ -0,0 +1,63 @@
+"""Weekly Parquet / Arrow IPC dumps of scores and reviews (incremental, by month).
+
+Only rows added since the previous run are written (max id per table is kept
+in `<out>/_state.json`); see trackapp/columnar_export.py for the layout.
+Needs the optional `pyarrow` package.
+
+Run:
+    python -m trackapp.scripts.export_columnar [--format parquet|arrow] [--tables evaluations,viewer_ratings]
+        [--out DIR] [--full] [--verify]
+
+Read back in a notebook:
+    import pyarrow.dataset as ds
+    ds.dataset("columnar/evaluations", format="parquet", partitioning="hive").to_table()
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from trackapp import app
+from trackapp.columnar_export import (
+    COLUMNAR_EXPORT_DIR,
+    COLUMNAR_TABLES,
+    EXTENSIONS,
+    export_table,
+    verify_table,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="parquet")
+    parser.add_argument("--tables", default=",".join(COLUMNAR_TABLES))
+    parser.add_argument("--out", default=COLUMNAR_EXPORT_DIR)
+    parser.add_argument("--full", action="store_true", help="drop previous dumps and export everything again")
+    parser.add_argument("--verify", action="store_true", help="read the files back and check them against the state")
+    args = parser.parse_args()
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = [t for t in tables if t not in COLUMNAR_TABLES]
+    if unknown:
+        raise SystemExit(f"unknown tables: {', '.join(unknown)} (available: {', '.join(COLUMNAR_TABLES)})")
+
+    failed = False
+    with app.app_context():
+        for table in tables:
+            started = time.monotonic()
+            result = export_table(table, out_dir=args.out, fmt=args.format, full=args.full)
+            print(f"{table}: +{result['rows']} rows (max id {result['max_id']}, "
+                  f"{len(result['files'])} files) in {time.monotonic() - started:.1f}s")
+            if args.verify:
+                check = verify_table(table, out_dir=args.out)
+                print(f"  verify: {'ok' if check['ok'] else 'FAILED'} ({check['rows']} rows)")
+                for problem in check.get("problems") or []:
+                    print("   -", problem)
+                failed = failed or not check["ok"]
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Dump a rating table as CSV or NDJSON (streamed, constant memory).
+
+Same data as `GET /api/admin/export/<table>`, without the web worker.
+Tables: evaluations, viewer_ratings, track_reviews (with scores),
+track_submissions. Rows are written in id order; resume an interrupted dump
+with `--after-id <last id written> --append`.
+
+Run:
+    python -m trackapp.scripts.export_data evaluations --format csv --since 2025-01-01 -o evaluations.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from trackapp import app
+from trackapp.data_export import FORMATS, TABLES, parse_when, stream_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--since", help="created_at >= (ISO date/datetime)")
+    parser.add_argument("--until", help="created_at < (a bare date includes that day)")
+    parser.add_argument("--track", type=int, default=None)
+    parser.add_argument("--after-id", type=int, default=0, help="keyset cursor: only rows with a greater id")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("-o", "--out", default="-", help="output file (default: stdout)")
+    parser.add_argument("--append", action="store_true", help="append to --out (resuming)")
+    args = parser.parse_args()
+
+    try:
+        filters = {
+            "since": parse_when(args.since),
+            "until": parse_when(args.until, end=True),
+            "track_id": args.track,
+            "after_id": args.after_id,
+            "limit": args.limit,
+        }
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+    out = sys.stdout if args.out == "-" else open(args.out, "a" if args.append else "w", encoding="utf-8", newline="")
+    try:
+        with app.app_context():
+            for i, chunk in enumerate(stream_export(args.table, args.format, **filters)):
+                # при дозаписи CSV заголовок уже есть в файле
+                if i == 0 and args.append and args.format == "csv":
+                    chunk = chunk.split("\n", 1)[1] if "\n" in chunk else ""
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
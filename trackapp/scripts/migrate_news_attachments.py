@@ -0,0 +1,26 @@
+"""Register legacy `news_<id>_*` files from UPLOAD_DIR as NewsAttachment rows.
+
+The app does this once on its own at startup (see trackapp.news_attachments);
+use this to re-run it, e.g. after copying old uploads back onto the server.
+
+Run:
+    python -m trackapp.scripts.migrate_news_attachments
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from trackapp.extensions import app
+from trackapp.news_attachments import migrate_legacy_files
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    with app.app_context():
+        result = migrate_legacy_files()
+    print(f"ok: registered={result['registered']} migrated={result['migrated']} remaining={result['remaining']}")
+
+
+if __name__ == "__main__":
+    main()
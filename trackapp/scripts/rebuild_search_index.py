@@ -0,0 +1,25 @@
+"""Rebuild the full-text search index (FTS5) from tracks, submissions and reviews.
+
+Triggers keep the index in sync on their own; run this after restoring a
+database backup or editing tables outside the app.
+
+Run:
+    python -m trackapp.scripts.rebuild_search_index
+"""
+
+from __future__ import annotations
+
+from trackapp import app
+from trackapp import search
+
+
+def main():
+    if not search.fts_available:
+        raise SystemExit("FTS5 is not available in this sqlite build")
+    with app.app_context():
+        result = search.rebuild_search_index()
+    print(f"ok: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Replay a past track's judging from the session log.
+
+Reads the day files written by trackapp.session_log (no database access),
+re-applies the logged commands and prints every step with the judges'
+averages, at the recorded pace divided by --speed (0 = as fast as possible).
+
+Run:
+    python -m trackapp.scripts.replay_session 123
+    python -m trackapp.scripts.replay_session 123 --speed 20
+    python -m trackapp.scripts.replay_session 123 --stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+
+from trackapp.session_log import SESSION_LOG_DIR, SessionLog
+
+
+def _averages(state) -> str:
+    parts = []
+    for r in sorted(state["raters"].values(), key=lambda r: r.get("order", 0)):
+        vals = list(r["scores"].values())
+        avg = sum(vals) / len(vals) if vals else 0.0
+        parts.append(f"{r['name']}={avg:.2f}")
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("submission_id", type=int)
+    parser.add_argument("--speed", type=float, default=10.0)
+    parser.add_argument("--stats", action="store_true", help="print stats as JSON and exit")
+    parser.add_argument("--dir", default=SESSION_LOG_DIR)
+    args = parser.parse_args()
+
+    sess = SessionLog(args.dir).load_track_session(args.submission_id)
+    if sess is None:
+        raise SystemExit(f"no session for submission {args.submission_id}")
+    if args.stats:
+        print(json.dumps(sess.stats(), ensure_ascii=False, indent=2))
+        return
+    print(f"{sess.track_name} ({len(sess.events)} events)")
+    for offset_ms, name, state in sess.frames(speed=args.speed):
+        print(f"{offset_ms / 1000.0:8.2f}s {name:<14} {_averages(state)}")
+
+
+if __name__ == "__main__":
+    main()
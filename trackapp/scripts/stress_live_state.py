@@ -0,0 +1,166 @@
+"""Replay random live-state command sequences from many threads.
+
+Property check for trackapp.live_state: N threads fire random commands
+(join/leave/kick/sliders/playback/activate/reset, presence idle flags,
+evaluation round claims...) at the single writer at once. Afterwards we
+verify that
+
+- state invariants hold (rater orders are 0..n-1, every member points to an
+  existing rater slot, slots belong to their member, scores only contain known
+  criteria, idle flags of members and their slots agree, only an open round
+  can be claimed, playback position is never negative);
+- replaying the commands sequentially, in the order the writer applied them,
+  on a fresh state gives exactly the same final state (no lost or torn updates);
+- every snapshot handed to readers stayed immutable;
+- a round is claimed at most once per release (no double evaluation).
+
+Does not touch the database.
+
+Run:
+    python -m trackapp.scripts.stress_live_state
+    python -m trackapp.scripts.stress_live_state --threads 16 --commands 2000 --seed 7
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import uuid
+
+from trackapp.extensions import CRITERIA
+from trackapp.live_state import COMMANDS, LiveStateEngine, freeze, initial_state, thaw
+
+USERS = [str(i) for i in range(1, 9)]
+
+
+def _random_command(rng: random.Random, engine: LiveStateEngine):
+    st = engine.snapshot()
+    raters = list(st["raters"].keys()) or ["deadbeef"]
+    now = 1_700_000_000_000 + rng.randint(0, 10_000_000)
+    new_round = uuid.UUID(int=rng.getrandbits(128)).hex
+    kind = rng.choice([
+        "join", "join", "remove_member", "remove_rater", "set_score", "set_score", "set_score",
+        "rename_rater", "set_track_name", "activate", "clear_active", "playback", "playback", "reset",
+        "touch_member", "set_idle", "set_active_track", "claim_round", "claim_round", "release_round",
+    ])
+    if kind == "join":
+        uid = rng.choice(USERS)
+        return kind, (uid, "sid-" + uid, "user " + uid, uuid.UUID(int=rng.getrandbits(128)).hex[:8]), {}
+    if kind == "touch_member":
+        uid = rng.choice(USERS)
+        return kind, (uid, "sid2-" + uid), {}
+    if kind == "set_idle":
+        return kind, (rng.choice(USERS), rng.random() < 0.5), {}
+    if kind == "set_active_track":
+        payload = rng.choice([None, {"id": 1, "audio_url": "/a.mp3"}])
+        return kind, (rng.choice([None, 1, 2, 3]), payload), {}
+    if kind in ("claim_round", "release_round"):
+        # the current round, or a stale/unknown one
+        round_id = st.get("round_id") if rng.random() < 0.7 else rng.choice([None, "stale"])
+        if kind == "release_round":
+            return kind, (round_id,), {}
+        return kind, (round_id, new_round), {}
+    if kind == "remove_member":
+        if rng.random() < 0.5:
+            return kind, (), {"user_id": rng.choice(USERS)}
+        return kind, (), {"rater_id": rng.choice(raters)}
+    if kind == "remove_rater":
+        return kind, (rng.choice(raters),), {}
+    if kind == "set_score":
+        key = rng.choice([k for k, _ in CRITERIA] + ["bogus"])
+        return kind, (rng.choice(raters), key, round(rng.uniform(0, 10), 1)), {}
+    if kind == "rename_rater":
+        return kind, (rng.choice(raters), rng.choice(["", "Judge", "Судья"])), {}
+    if kind == "set_track_name":
+        return kind, (rng.choice(["", "A — B", "Track"]),), {"round_id": new_round}
+    if kind == "activate":
+        return kind, (rng.randint(1, 5), "Track", rng.random() < 0.5, now), {"round_id": new_round}
+    if kind == "clear_active":
+        return kind, (rng.choice([None, 1, 2, 3]), now), {"clear_name": rng.random() < 0.5}
+    if kind == "playback":
+        action = rng.choice(["play", "pause", "stop", "restart", "seek", "bogus"])
+        return kind, (action, now), {
+            "expected_active_id": rng.choice([None, 1, 2]),
+            "position_ms": rng.randint(-1000, 300_000),
+            "max_ms": rng.choice([None, 180_000]),
+        }
+    return "reset", (now,), {"round_id": new_round}
+
+
+def check_invariants(st) -> None:
+    raters = st["raters"]
+    orders = sorted(r["order"] for r in raters.values())
+    assert orders == list(range(len(raters))), f"orders not dense: {orders}"
+    keys = {k for k, _ in CRITERIA}
+    for rid, r in raters.items():
+        assert r["id"] == rid
+        assert set(r["scores"].keys()) == keys, r["scores"]
+        member = st["members"].get(r["user_id"])
+        assert member and member["rater_id"] == rid, f"orphan slot {rid}"
+        assert bool(r.get("idle")) == bool(member.get("idle")), f"idle flag of slot {rid} out of sync"
+    for uid, info in st["members"].items():
+        assert info["rater_id"] in raters, f"member {uid} points to missing slot"
+    assert st["round_id"] or not st["round_claimed"], "claimed a round that is not open"
+    assert int(st["playback"]["position_ms"]) >= 0
+
+
+def run(threads: int, commands: int, seed: int) -> None:
+    engine = LiveStateEngine()
+    applied = []
+    engine.add_listener(lambda version, name, args, kwargs, _st: applied.append((version, name, args, kwargs)))
+    snapshots = []
+    claims, releases = [], []
+
+    def worker(n: int) -> None:
+        rng = random.Random(seed * 1000 + n)
+        for _ in range(commands):
+            name, args, kwargs = _random_command(rng, engine)
+            result = engine.execute(name, *args, **kwargs)
+            if name == "claim_round" and result:
+                claims.append(result)
+            elif name == "release_round" and result:
+                releases.append(args[0])
+            if rng.random() < 0.05:
+                snap = engine.snapshot()
+                snapshots.append((snap, thaw(snap)))
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    final = engine.snapshot()
+    check_invariants(final)
+    assert engine.version == threads * commands == len(applied), (engine.version, len(applied))
+
+    replay = initial_state()
+    for _version, name, args, kwargs in sorted(applied, key=lambda a: a[0]):
+        COMMANDS[name](replay, *args, **kwargs)
+    assert thaw(freeze(replay)) == thaw(final), "sequential replay diverged"
+
+    for frozen, copy in snapshots:
+        assert thaw(frozen) == copy, "published snapshot was mutated"
+
+    for round_id in set(claims):
+        assert claims.count(round_id) <= 1 + releases.count(round_id), f"round {round_id} claimed twice"
+
+    print(
+        f"ok: {threads} threads x {commands} commands, version={engine.version}, "
+        f"raters={len(final['raters'])}, members={len(final['members'])}, snapshots checked={len(snapshots)}, "
+        f"rounds claimed={len(claims)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run(args.threads, args.commands, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Full-text search over tracks, artists and reviews (SQLite FTS5).
+
+One FTS5 table, `search_index`, holds a row per track (name + submission
+artist/title) and a row per review (text). Row ids are derived from the
+source ids (`track.id * 2`, `review.id * 2 + 1`), so triggers on `tracks`,
+`track_submissions` and `track_reviews` keep it in sync inside the writer's
+own transaction — nothing to invalidate from Python.
+
+On import `ensure_search_index()` creates the table and triggers if they are
+missing and fills the table the first time. Rebuild from scratch (after
+restoring a backup, changing the tokenizer, ...):
+
+    python -m trackapp.scripts.rebuild_search_index
+
+Queries are built from the words of the user input only (no FTS syntax gets
+through); every word is a prefix, so `/api/search?q=` works as a
+typeahead. `prefix='2 3'` keeps short prefixes on their own index. The
+/search page ranks by bm25 with titles weighted above review text; the
+typeahead lists the newest matches first (no scoring, see search_tracks).
+
+Without FTS5 in the sqlite build the index is not created, and `search_*`
+falls back to a bounded LIKE over track names/artists/titles (no reviews).
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from .extensions import app, db
+from .models import Track, TrackSubmission
+
+SEARCH_TABLE = "search_index"
+SEARCH_MAX_QUERY_WORDS = 8
+TYPEAHEAD_LIMIT = 10
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# bm25 weights, one per column: kind, ref_id, track_id, name, artist, title, text
+_BM25 = f"bm25({SEARCH_TABLE}, 0, 0, 0, 10.0, 8.0, 8.0, 1.0)"
+# snippet() markers, replaced by <mark> after the text is escaped
+_HL_START, _HL_END = "\x02", "\x03"
+
+fts_available = False
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        kind UNINDEXED, ref_id UNINDEXED, track_id UNINDEXED,
+        name, artist, title, text,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    # --- tracks ---
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_tracks_ai AFTER INSERT ON tracks BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        VALUES (
+            new.id * 2, 'track', new.id, new.id, new.name,
+            (SELECT artist FROM track_submissions WHERE id = new.submission_id),
+            (SELECT title FROM track_submissions WHERE id = new.submission_id),
+            ''
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_tracks_au AFTER UPDATE OF name, submission_id ON tracks BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2;
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        VALUES (
+            new.id * 2, 'track', new.id, new.id, new.name,
+            (SELECT artist FROM track_submissions WHERE id = new.submission_id),
+            (SELECT title FROM track_submissions WHERE id = new.submission_id),
+            ''
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_tracks_ad AFTER DELETE ON tracks BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2;
+    END
+    """,
+    # --- submissions: artist/title shown on the linked tracks ---
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_submissions_au AFTER UPDATE OF artist, title ON track_submissions BEGIN
+        UPDATE {SEARCH_TABLE} SET artist = new.artist, title = new.title
+        WHERE rowid IN (SELECT id * 2 FROM tracks WHERE submission_id = new.id);
+    END
+    """,
+    # --- reviews ---
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_reviews_ai AFTER INSERT ON track_reviews BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        VALUES (new.id * 2 + 1, 'review', new.id, new.track_id, '', '', '', new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_reviews_au AFTER UPDATE OF text, track_id ON track_reviews BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + 1;
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        VALUES (new.id * 2 + 1, 'review', new.id, new.track_id, '', '', '', new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS search_reviews_ad AFTER DELETE ON track_reviews BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+
+# -----------------
+# Index maintenance
+# -----------------
+
+def _table_exists() -> bool:
+    row = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+    ).first()
+    return row is not None
+
+
+def rebuild_search_index() -> Dict[str, int]:
+    """Refill the index from the source tables. Needs an app context."""
+    db.session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.session.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        SELECT t.id * 2, 'track', t.id, t.id, t.name, s.artist, s.title, ''
+        FROM tracks t LEFT JOIN track_submissions s ON s.id = t.submission_id
+    """))
+    db.session.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE}(rowid, kind, ref_id, track_id, name, artist, title, text)
+        SELECT r.id * 2 + 1, 'review', r.id, r.track_id, '', '', '', r.text
+        FROM track_reviews r
+    """))
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    counts = dict(
+        db.session.execute(text(f"SELECT kind, COUNT(*) FROM {SEARCH_TABLE} GROUP BY kind")).fetchall()
+    )
+    return {"tracks": int(counts.get("track", 0)), "reviews": int(counts.get("review", 0))}
+
+
+def ensure_search_index() -> None:
+    """Startup hook: create the FTS table + triggers, fill it on first run."""
+    global fts_available
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if not (uri or "").startswith("sqlite:"):
+        return
+    try:
+        with app.app_context():
+            existed = _table_exists()
+            for ddl in _DDL:
+                db.session.execute(text(ddl))
+            db.session.commit()
+            fts_available = True
+            if not existed:
+                result = rebuild_search_index()
+                print(f"[Search] Index built: {result}")
+    except Exception as e:
+        print("[Search] Warning: FTS5 index unavailable, search falls back to LIKE:", e)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+
+
+# -----------------
+# Queries
+# -----------------
+
+def query_words(q: Optional[str]) -> List[str]:
+    return _WORD_RE.findall((q or "").lower())[:SEARCH_MAX_QUERY_WORDS]
+
+
+def build_match(words: List[str], columns: Optional[str] = None) -> str:
+    """FTS5 MATCH string: every word must match as a prefix of some token."""
+    expr = " ".join('"%s"*' % w.replace('"', '""') for w in words)
+    return f"{{{columns}}} : ({expr})" if columns else expr
+
+
+def _highlight(snippet: str) -> Markup:
+    return Markup(
+        str(escape(snippet)).replace(_HL_START, Markup("<mark>")).replace(_HL_END, Markup("</mark>"))
+    )
+
+
+def search_tracks(q: str, limit: int = TYPEAHEAD_LIMIT, ranked: bool = True) -> List[Dict[str, Any]]:
+    """Tracks whose name/artist/title match.
+
+    ranked=True orders by bm25 (the /search page). The typeahead passes
+    ranked=False: newest first by rowid, which FTS5 walks in index order and
+    stops after LIMIT instead of scoring every match of a short prefix.
+    """
+    words = query_words(q)
+    if not words:
+        return []
+    limit = max(1, min(int(limit), 100))
+    if not fts_available:
+        return _like_tracks(words, limit)
+    # "ORDER BY rowid DESC" must be spelled exactly so for FTS5 to stop early
+    score, order = (_BM25, "score") if ranked else ("-rowid", "rowid DESC")
+    rows = db.session.execute(
+        text(f"""
+            SELECT t.id, t.name, s.artist, s.title
+            FROM (
+                SELECT track_id, {score} AS score
+                FROM {SEARCH_TABLE}
+                WHERE {SEARCH_TABLE} MATCH :match
+                ORDER BY {order}
+                LIMIT :scan
+            ) m
+            JOIN tracks t ON t.id = m.track_id
+            LEFT JOIN track_submissions s ON s.id = t.submission_id
+            WHERE t.is_deleted = 0
+            ORDER BY m.score
+            LIMIT :limit
+        """),
+        # a few extra candidates so deleted tracks don't empty the list
+        {"match": build_match(words, "name artist title"), "scan": limit * 2 + 10, "limit": limit},
+    ).fetchall()
+    return [
+        {"id": r.id, "name": r.name, "artist": r.artist, "title": r.title}
+        for r in rows
+    ]
+
+
+def search_reviews(q: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Reviews whose text matches, with a highlighted snippet."""
+    words = query_words(q)
+    if not words or not fts_available:
+        return []
+    limit = max(1, min(int(limit), 100))
+    rows = db.session.execute(
+        text(f"""
+            SELECT m.ref_id AS review_id, m.snip, t.id AS track_id, t.name AS track_name,
+                   COALESCE(u.display_name, u.username) AS author, r.overall, r.created_at
+            FROM (
+                SELECT ref_id, track_id,
+                       snippet({SEARCH_TABLE}, 6, :hs, :he, '…', 16) AS snip,
+                       {_BM25} AS score
+                FROM {SEARCH_TABLE}
+                WHERE {SEARCH_TABLE} MATCH :match
+                ORDER BY score
+                LIMIT :scan
+            ) m
+            JOIN track_reviews r ON r.id = m.ref_id
+            JOIN tracks t ON t.id = m.track_id
+            LEFT JOIN users u ON u.id = r.user_id
+            WHERE t.is_deleted = 0
+            ORDER BY m.score
+            LIMIT :limit
+        """),
+        {
+            "match": build_match(words, "text"),
+            "hs": _HL_START,
+            "he": _HL_END,
+            "scan": limit * 2 + 10,
+            "limit": limit,
+        },
+    ).fetchall()
+    return [
+        {
+            "review_id": r.review_id,
+            "track_id": r.track_id,
+            "track_name": r.track_name,
+            "author": r.author,
+            "overall": float(r.overall) if r.overall is not None else None,
+            "snippet": _highlight(r.snip or ""),
+        }
+        for r in rows
+    ]
+
+
+def _like_tracks(words: List[str], limit: int) -> List[Dict[str, Any]]:
+    query = (
+        db.session.query(Track.id, Track.name, TrackSubmission.artist, TrackSubmission.title)
+        .outerjoin(TrackSubmission, TrackSubmission.id == Track.submission_id)
+        .filter(Track.is_deleted.is_(False))
+    )
+    for w in words:
+        pattern = f"%{w}%"
+        query = query.filter(
+            Track.name.ilike(pattern) | TrackSubmission.artist.ilike(pattern) | TrackSubmission.title.ilike(pattern)
+        )
+    return [
+        {"id": r.id, "name": r.name, "artist": r.artist, "title": r.title}
+        for r in query.order_by(Track.created_at.desc()).limit(limit).all()
+    ]
+
+
+ensure_search_index()
@@ -0,0 +1,311 @@
+"""Event-sourced log of stream sessions (for replay and analytics).
+
+Only final scores reach the DB in `finalize_evaluation`; how the judges got
+there (slider movements, play/pause/seek, when a track was activated and
+evaluated) used to be lost. This module keeps it:
+
+- every live-state command (see `live_state.COMMANDS`) plus non-state events
+  like `evaluate` are appended to an in-memory ring buffer — that is the
+  only work on the live path;
+- a background writer drains the buffer every SESSION_LOG_FLUSH_SEC into one
+  NDJSON file per day under SESSION_LOG_DIR. Lines are
+  `[dt_ms, name, args, kwargs]` where `dt_ms` is the delta to the previous
+  line; each time the writer (re)opens a file it writes `["B", abs_ms]`;
+- on `activate` a `checkpoint` with the full state is logged too, so a
+  track's session can be replayed without anything that came before it;
+  `index.ndjson` maps submission ids to day files.
+
+Replay (`load_track_session`) re-applies the same reducers as the live
+engine to a fresh state: `TrackSession.frames(speed)` re-renders judging at
+any speed, `series` holds array-backed per-rater slider series and
+`stats()` computes things like time-to-decision, without touching the DB.
+"""
+
+import json
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .extensions import DB_PATH, socketio
+from .live_state import COMMANDS, initial_state, live_state, thaw
+
+SESSION_LOG_ENABLED = os.getenv("SESSION_LOG_ENABLED", "1") == "1"
+SESSION_LOG_DIR = os.getenv(
+    "SESSION_LOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "sessions"),
+)
+SESSION_LOG_BUFFER = int(os.getenv("SESSION_LOG_BUFFER", "20000"))
+SESSION_LOG_FLUSH_SEC = float(os.getenv("SESSION_LOG_FLUSH_SEC", "1"))
+
+INDEX_FILE = "index.ndjson"
+# Commands that end the session of the active track.
+_SESSION_END = ("activate", "reset")
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class SessionLog:
+    def __init__(self, directory: str = SESSION_LOG_DIR, capacity: int = SESSION_LOG_BUFFER):
+        self.directory = directory
+        self._ring: deque = deque(maxlen=max(1, int(capacity)))
+        self._lock = threading.Lock()
+        # file, _file_day and _last_ts belong to whoever holds this (writer task or a request's flush())
+        self._io_lock = threading.Lock()
+        self._writer_started = False
+        self._file = None
+        self._file_day = None
+        self._last_ts = 0
+        self._stats = {"recorded": 0, "written": 0, "overflow": 0}
+
+    # -----------------
+    # Live path
+    # -----------------
+
+    def record(self, name: str, *args, **kwargs) -> None:
+        """Append an event to the ring buffer. O(1), never blocks on I/O."""
+        with self._lock:
+            if len(self._ring) == self._ring.maxlen:
+                self._stats["overflow"] += 1
+            self._ring.append((_now_ms(), name, args, kwargs))
+            self._stats["recorded"] += 1
+            start = not self._writer_started
+            self._writer_started = True
+        if start:
+            socketio.start_background_task(self._writer)
+
+    def on_command(self, version, name, args, kwargs, state) -> None:
+        """live_state listener: log every applied command."""
+        self.record(name, *args, **kwargs)
+        if name == "activate":
+            self.record("checkpoint", thaw(state))
+
+    # -----------------
+    # Background writer
+    # -----------------
+
+    def _writer(self) -> None:
+        while True:
+            socketio.sleep(SESSION_LOG_FLUSH_SEC)
+            try:
+                self.flush()
+            except Exception as e:
+                print("Warning: session log flush failed:", e)
+
+    def _open_for(self, ts_ms: int):
+        day = datetime.utcfromtimestamp(ts_ms / 1000.0).strftime("%Y-%m-%d")
+        if day != self._file_day:
+            if self._file is not None:
+                self._file.close()
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(os.path.join(self.directory, f"{day}.ndjson"), "a", encoding="utf-8")
+            self._file_day = day
+            self._file.write(json.dumps(["B", ts_ms]) + "\n")
+            self._last_ts = ts_ms
+        return self._file
+
+    def flush(self) -> None:
+        # Drain and write under one lock: two flushes must not interleave lines
+        # or compute deltas from each other's _last_ts.
+        with self._io_lock:
+            with self._lock:
+                events = list(self._ring)
+                self._ring.clear()
+            if not events:
+                return
+            index_lines = []
+            for ts_ms, name, args, kwargs in events:
+                f = self._open_for(ts_ms)
+                f.write(json.dumps(
+                    [ts_ms - self._last_ts, name, list(args), kwargs],
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                    default=thaw,
+                ) + "\n")
+                self._last_ts = ts_ms
+                if name == "activate" and args:
+                    index_lines.append(json.dumps([args[0], f"{self._file_day}.ndjson", ts_ms]))
+            self._file.flush()
+            if index_lines:
+                with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as idx:
+                    idx.write("\n".join(index_lines) + "\n")
+        with self._lock:
+            self._stats["written"] += len(events)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["buffered"] = len(self._ring)
+        out["capacity"] = self._ring.maxlen
+        out["directory"] = self.directory
+        return out
+
+    # -----------------
+    # Reading
+    # -----------------
+
+    def iter_events(self, filename: str) -> Iterator[Tuple[int, str, list, dict]]:
+        """Decode one day file into (abs_ts_ms, name, args, kwargs)."""
+        ts = 0
+        with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except Exception:
+                    continue
+                if row[0] == "B":
+                    ts = int(row[1])
+                    continue
+                ts += int(row[0])
+                yield ts, row[1], row[2], row[3]
+
+    def find_session_files(self, submission_id: int) -> List[Tuple[str, int]]:
+        out = []
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        sid, filename, ts_ms = json.loads(line)
+                    except Exception:
+                        continue
+                    if int(sid) == int(submission_id):
+                        out.append((filename, int(ts_ms)))
+        except FileNotFoundError:
+            pass
+        return out
+
+    def load_track_session(self, submission_id: int) -> Optional["TrackSession"]:
+        """Events of the latest session of `submission_id` (activation → next activation/reset)."""
+        found = self.find_session_files(submission_id)
+        if not found:
+            return None
+        filename, started_ms = found[-1]
+        events = []
+        day_files = sorted(fn for fn in os.listdir(self.directory) if fn.endswith(".ndjson") and fn != INDEX_FILE)
+        for fn in day_files[day_files.index(filename):] if filename in day_files else []:
+            for ev in self.iter_events(fn):
+                if ev[0] < started_ms:
+                    continue
+                if events and ev[1] in _SESSION_END:
+                    return TrackSession(int(submission_id), events)
+                events.append(ev)
+        return TrackSession(int(submission_id), events) if events else None
+
+
+class TrackSession:
+    """Replay of one track's judging, rebuilt from logged commands."""
+
+    def __init__(self, submission_id: int, events: List[Tuple[int, str, list, dict]]):
+        self.submission_id = submission_id
+        self.events = events
+        self.started_ms = events[0][0]
+        self.track_name = ""
+        self.evaluated_ms: Optional[int] = None
+        # rater_id -> {"name": str, "criteria": {criterion_key: (array t_ms, array values)}}
+        self.series: Dict[str, Dict[str, Any]] = {}
+        self.playback: List[Tuple[int, str]] = []
+        self.final_state = self._build()
+
+    def _build(self) -> Dict[str, Any]:
+        state = initial_state()
+        for ts, name, args, kwargs in self.events:
+            offset = ts - self.started_ms
+            if name == "checkpoint":
+                state = args[0]
+                for rid, r in state["raters"].items():
+                    self._rater(rid, r["name"])
+                    for ck, val in r["scores"].items():
+                        self._point(rid, ck, offset, val)
+                continue
+            if name == "evaluate":
+                self.evaluated_ms = self.evaluated_ms or ts
+                continue
+            if name not in COMMANDS:
+                continue
+            try:
+                COMMANDS[name](state, *args, **kwargs)
+            except Exception:
+                continue
+            if name == "activate":
+                self.track_name = args[1] if len(args) > 1 else ""
+            elif name == "set_score":
+                rid, ck, val = args[0], args[1], args[2]
+                if rid in state["raters"]:
+                    self._rater(rid, state["raters"][rid]["name"])
+                    self._point(rid, ck, offset, val)
+            elif name == "join":
+                rid = state["members"].get(args[0], {}).get("rater_id")
+                if rid:
+                    self._rater(rid, state["raters"][rid]["name"])
+            elif name == "playback":
+                self.playback.append((offset, args[0]))
+        return state
+
+    def _rater(self, rid: str, name: str) -> None:
+        entry = self.series.setdefault(rid, {"name": name, "criteria": {}})
+        entry["name"] = name
+
+    def _point(self, rid: str, ck: str, offset: int, value) -> None:
+        t, v = self.series[rid]["criteria"].setdefault(ck, (array("q"), array("d")))
+        t.append(int(offset))
+        v.append(float(value))
+
+    def frames(self, speed: float = 1.0, sleep=time.sleep) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+        """Yield (offset_ms, event, state) in recorded rhythm, `speed` times faster."""
+        state = initial_state()
+        prev = self.started_ms
+        for ts, name, args, kwargs in self.events:
+            if speed and speed > 0:
+                delay = (ts - prev) / 1000.0 / speed
+                if delay > 0:
+                    sleep(delay)
+            prev = ts
+            if name == "checkpoint":
+                state = json.loads(json.dumps(args[0]))
+            elif name in COMMANDS:
+                try:
+                    COMMANDS[name](state, *args, **kwargs)
+                except Exception:
+                    continue
+            yield ts - self.started_ms, name, state
+
+    def stats(self) -> Dict[str, Any]:
+        raters = {}
+        for rid, entry in self.series.items():
+            moves = sum(max(0, len(t) - 1) for t, _v in entry["criteria"].values())
+            last_move = max((t[-1] for t, _v in entry["criteria"].values() if len(t)), default=None)
+            raters[rid] = {"name": entry["name"], "moves": moves, "last_move_ms": last_move}
+        first_play = next((off for off, action in self.playback if action == "play"), None)
+        return {
+            "submission_id": self.submission_id,
+            "track_name": self.track_name,
+            "started_at": datetime.utcfromtimestamp(self.started_ms / 1000.0).isoformat(),
+            "duration_ms": self.events[-1][0] - self.started_ms,
+            "time_to_decision_ms": (self.evaluated_ms - self.started_ms) if self.evaluated_ms else None,
+            "first_play_ms": first_play,
+            "playback_commands": len(self.playback),
+            "raters": raters,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stats": self.stats(),
+            "series": {
+                rid: {
+                    "name": entry["name"],
+                    "criteria": {ck: {"t": t.tolist(), "v": v.tolist()} for ck, (t, v) in entry["criteria"].items()},
+                }
+                for rid, entry in self.series.items()
+            },
+            "final_scores": {rid: r["scores"] for rid, r in self.final_state["raters"].items()},
+        }
+
+
+session_log = SessionLog() if SESSION_LOG_ENABLED else None
+if session_log is not None:
+    live_state.add_listener(session_log.on_command)
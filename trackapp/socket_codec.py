@@ -0,0 +1,163 @@
+"""Opt-in MessagePack wire format for Socket.IO (per client).
+
+python-socketio only supports one serializer per server, but we still have
+JSON clients (OBS widget, tabs opened before a deploy). So the server runs
+in "hybrid" mode when `SOCKETIO_MSGPACK=1`:
+
+- a client opts in by connecting with `?bin=1` and the msgpack parser
+  (`socket.io-msgpack-parser` on the JS side);
+- incoming binary frames are decoded as msgpack, text frames as JSON;
+- outgoing broadcasts are encoded at most once per format and each recipient
+  gets the encoding it asked for.
+
+WebSocket per-message compression (permessage-deflate) is negotiated by the
+websocket layer itself when the browser offers it (simple-websocket in
+threading mode, eventlet >= 0.26 under gunicorn -k eventlet). For the
+long-polling fallback engineio compresses HTTP responses above
+`SOCKETIO_COMPRESSION_THRESHOLD` bytes.
+
+`msgpack` is an optional dependency: without it the server stays JSON-only.
+"""
+
+import os
+from urllib.parse import parse_qs
+
+from engineio import packet as eio_packet
+from socketio import Manager, packet
+
+SOCKETIO_MSGPACK = os.getenv("SOCKETIO_MSGPACK", "0") == "1"
+SOCKETIO_COMPRESSION_THRESHOLD = int(os.getenv("SOCKETIO_COMPRESSION_THRESHOLD", "1024"))
+
+# Query parameter a client uses to request msgpack frames.
+BINARY_QUERY_PARAM = "bin"
+_ENVIRON_FLAG = "trackrater.msgpack"
+
+try:
+    import msgpack
+except Exception:  # pragma: no cover - optional dependency
+    msgpack = None
+
+
+class HybridPacket(packet.Packet):
+    """JSON Socket.IO packet that can also be read from / written as msgpack."""
+
+    def decode(self, encoded_packet):
+        if isinstance(encoded_packet, (bytes, bytearray)) and msgpack is not None:
+            decoded = msgpack.loads(encoded_packet)
+            self.packet_type = decoded["type"]
+            self.data = decoded.get("data")
+            self.id = decoded.get("id")
+            self.namespace = decoded["nsp"]
+            return 0
+        return super().decode(encoded_packet)
+
+    def encode_msgpack(self) -> bytes:
+        return msgpack.dumps(self._to_dict())
+
+
+def client_wants_msgpack(server, eio_sid) -> bool:
+    """Whether the Engine.IO connection asked for msgpack (`?bin=1`).
+
+    The answer is cached in the connection's WSGI environ, which python-socketio
+    drops on disconnect, so there is nothing to clean up.
+    """
+    if not msgpack_enabled():
+        return False
+    environ = server.environ.get(eio_sid)
+    if environ is None:
+        return False
+    flag = environ.get(_ENVIRON_FLAG)
+    if flag is None:
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        flag = (query.get(BINARY_QUERY_PARAM) or [""])[0] == "1"
+        environ[_ENVIRON_FLAG] = flag
+    return flag
+
+
+class HybridManager(Manager):
+    """Client manager that encodes each broadcast once per wire format.
+
+    Without SOCKETIO_MSGPACK every client is JSON and this behaves like the
+    stock manager. Subclasses can hook per-recipient delivery via `_deliver`.
+    """
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback:
+            # Ack ids are per recipient anyway; the server-level hook picks the format.
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, to=to, **kwargs)
+        room = to or room
+        if namespace not in self.rooms:
+            return
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+
+        pkt = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data)
+        encoded = {}  # is_binary -> [engineio packets]
+        for sid, eio_sid in self.get_participants(namespace, room):
+            if sid in skip_sid:
+                continue
+            binary = client_wants_msgpack(self.server, eio_sid)
+            eio_pkts = encoded.get(binary)
+            if eio_pkts is None:
+                eio_pkts = encoded[binary] = _encode_for(pkt, binary)
+            self._deliver(eio_sid, event, eio_pkts)
+
+    def _deliver(self, eio_sid, event, eio_pkts) -> None:
+        for p in eio_pkts:
+            self.server._send_eio_packet(eio_sid, p)
+
+
+def _encode_for(pkt, binary: bool):
+    if binary:
+        return [eio_packet.Packet(eio_packet.MESSAGE, pkt.encode_msgpack())]
+    encoded = pkt.encode()
+    if not isinstance(encoded, list):
+        encoded = [encoded]
+    return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+
+
+def socketio_server_options() -> dict:
+    """Extra SocketIO() kwargs for the configured wire format.
+
+    The client manager is chosen by the caller (see trackapp.admission).
+    """
+    opts = {
+        "http_compression": True,
+        "compression_threshold": SOCKETIO_COMPRESSION_THRESHOLD,
+    }
+    if not SOCKETIO_MSGPACK:
+        return opts
+    if msgpack is None:
+        print("SOCKETIO_MSGPACK=1 but msgpack is not installed; staying on JSON")
+        return opts
+    opts["serializer"] = HybridPacket
+    return opts
+
+
+def install_server_hooks(server) -> None:
+    """Route per-client packets (connect ack, acks, disconnect) through the right encoder."""
+    if not (SOCKETIO_MSGPACK and msgpack is not None):
+        return
+    if getattr(server, "_trackrater_hybrid", False):
+        return
+    json_send_packet = server._send_packet
+
+    def _send_packet(eio_sid, pkt):
+        if client_wants_msgpack(server, eio_sid) and hasattr(pkt, "encode_msgpack"):
+            server.eio.send(eio_sid, pkt.encode_msgpack())
+        else:
+            json_send_packet(eio_sid, pkt)
+
+    server._send_packet = _send_packet
+    server._trackrater_hybrid = True
+
+
+def msgpack_enabled() -> bool:
+    return bool(SOCKETIO_MSGPACK and msgpack is not None)
@@ -12,39 +12,71 @@ import uuid
 
 # Explicitly import underscore-prefixed helpers used in this module.
 from .core import (
+    _active_track_payload,
     _broadcast_playback_state,
-    _broadcast_queue_state,
-    _compute_playback_position_ms,
     _get_track_url,
     _get_playback_snapshot,
+    _get_queue_snapshot,
     _now_ms,
     _require_admin,
     _require_panel_access,
-    _serialize_queue_state,
+    _schedule_queue_broadcast,
     _serialize_state,
 )
+from .admission import PRIVILEGED_ROLES, admission
+from .dispatcher import dispatcher
+from .evaluation import claim_key, evaluation_key, finalize_evaluation, peek_key, release_key
+from .fragment_cache import TAG_AWARDS, TAG_LEADERBOARD, invalidate_fragments
+from .live_state import live_state
+from .page_cache import invalidate_track_page
+from .qr_cache import QR_SMALL_SIZE, pregenerate as qr_pregenerate
+from .presence import RATER_EXCLUDE_IDLE, presence, push_presence_changes
+from .session_log import session_log
 from .state import _submission_display_name
+from .topics import (
+    drop_sid,
+    emit_to_topics,
+    parse_topics,
+    subscribe as subscribe_topics,
+    topic_room,
+    track_topic,
+    unsubscribe as unsubscribe_topics,
+)
 from .twitch_notify import notify_twitch_bot_track_changed
 
 
 # --- Rating session presence ("join rating") ---
 # We deliberately keep slots visible "as if online" until explicit leave/kick.
 # Reconnect just updates the socket sid.
-active_raters = {}  # user_id -> {"rater_id": str, "sid": str, "username": str}
+# Members live in `live_state` (members: str(user_id) -> {"rater_id", "sid", "username"}).
 
 
 def _current_user_and_id():
     u = get_current_user()
     if not u:
         return None, None
-    return u, getattr(u, "id", u.username)
+    return u, str(getattr(u, "id", u.username))
+
+
+def _member_info(uid):
+    if uid is None:
+        return None
+    return live_state.snapshot()["members"].get(uid)
 
 
 def _is_joined_rater() -> bool:
     u, uid = _current_user_and_id()
     if not u or uid is None:
         return False
-    return uid in active_raters
+    return _member_info(uid) is not None
+
+
+def _remove_file_quietly(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
 
 
 def _broadcast_raters_presence():
@@ -56,8 +88,9 @@ def _broadcast_raters_presence():
                     "user_id": str(uid),
                     "username": info.get("username") or "",
                     "rater_id": info.get("rater_id"),
+                    "idle": bool(info.get("idle")),
                 }
-                for uid, info in active_raters.items()
+                for uid, info in live_state.snapshot()["members"].items()
             ]
         }
         socketio.emit("raters_presence_updated", payload, room="panel")
@@ -67,18 +100,26 @@ def _broadcast_raters_presence():
 
 @socketio.on("connect")
 def handle_connect():
-    # Everyone is a public viewer by default.
+    # Admission control first, before any DB work: after a restart every tab
+    # reconnects at once. Judges/admins (by session role) always get in.
+    admitted, retry_after_ms = admission.try_admit(privileged=session.get("role") in PRIVILEGED_ROLES)
+    if not admitted:
+        from flask_socketio import ConnectionRefusedError
+
+        raise ConnectionRefusedError("busy", {"retry_after_ms": retry_after_ms})
+
+    # Viewers no longer join a catch-all room: pages subscribe to the topics they
+    # actually render (see `subscribe` below), so idle tabs cost zero fan-out.
     try:
         from flask_socketio import join_room
 
-        join_room("public")
         # If this user previously joined rating, restore membership.
         u, uid = _current_user_and_id()
-        if uid is not None and uid in active_raters:
-            active_raters[uid]["sid"] = request.sid
+        info = live_state.execute("touch_member", uid, request.sid) if _member_info(uid) else None
+        if info:
+            presence.track(request.sid, uid)
             join_room("raters")
             # Restore client-side flag so local playback can be blocked outside the panel.
-            info = active_raters.get(uid) or {}
             emit(
                 "rating_joined",
                 {
@@ -91,6 +132,49 @@ def handle_connect():
         pass
 
 
+@socketio.on("disconnect")
+def handle_disconnect(*_args):
+    try:
+        drop_sid(request.sid)
+        presence.disconnected(request.sid)
+    except Exception:
+        pass
+
+
+@socketio.on("heartbeat")
+def handle_heartbeat(*_args):
+    """Presence ping from joined raters. O(1): no DB, no lock held across calls."""
+    uid = presence.beat(request.sid)
+    if uid is None:
+        return
+    info = _member_info(uid)
+    if info and info.get("idle") and info.get("sid") == request.sid:
+        rid = live_state.execute("set_idle", uid, False)
+        if rid:
+            push_presence_changes([{"user_id": uid, "rater_id": rid, "idle": False}])
+
+
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    """Subscribe the socket to topics: queue, live_track, evaluation_result, playback, track:<id>."""
+    from flask_socketio import join_room
+
+    topics = parse_topics(data)
+    for t in subscribe_topics(request.sid, topics):
+        join_room(topic_room(t))
+    emit("subscribed", {"topics": topics})
+
+
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    from flask_socketio import leave_room
+
+    topics = parse_topics(data)
+    for t in unsubscribe_topics(request.sid, topics):
+        leave_room(topic_room(t))
+    emit("unsubscribed", {"topics": topics})
+
+
 @socketio.on("enter_panel")
 def handle_enter_panel():
     if not _require_panel_access():
@@ -100,12 +184,12 @@ def handle_enter_panel():
     join_room("panel")
     # Send a full snapshot needed for the panel UI.
     emit("initial_state", _serialize_state())
-    emit("queue_state", _serialize_queue_state(limit=100))
+    emit("queue_state", _get_queue_snapshot())
     emit("playback_state", _get_playback_snapshot())
     # If this user already joined the rating earlier, restore UI state after refresh.
     u, uid = _current_user_and_id()
-    if uid is not None and uid in active_raters:
-        info = active_raters.get(uid) or {}
+    info = _member_info(uid)
+    if info:
         emit(
             "rating_joined",
             {
@@ -140,45 +224,15 @@ def handle_join_rating():
     if not u or uid is None:
         return
 
-    # If user already joined earlier, just refresh sid/room and restore client state.
-    if uid in active_raters:
-        try:
-            active_raters[uid]["sid"] = request.sid
-        except Exception:
-            pass
-        try:
-            join_room("raters")
-        except Exception:
-            pass
-        info = active_raters.get(uid) or {}
-        rid = info.get("rater_id")
-        emit(
-            "rating_joined",
-            {"rater_id": rid, "user_id": str(uid), "username": info.get("username") or u.username},
-        )
-        emit("playback_state", _get_playback_snapshot())
-        socketio.emit("initial_state", _serialize_state(), room="panel")
-        _broadcast_raters_presence()
-        return
-    with state_lock:
-        shared_state.setdefault("raters", {})
-        # Generate a unique rater id; avoids global counters and survives concurrent joins.
-        rid = uuid.uuid4().hex[:8]
-        while rid in shared_state["raters"]:
-            rid = uuid.uuid4().hex[:8]
-        order = len(shared_state["raters"])
-        display_name = (u.display_name or "").strip() or u.username
-        shared_state["raters"][rid] = {
-            "id": rid,
-            "name": display_name,
-            "order": order,
-            "scores": {key: 0 for key, _label in CRITERIA},
-            "user_id": str(uid),
-        }
-    active_raters[uid] = {"rater_id": rid, "sid": request.sid, "username": display_name}
+    # If user already joined earlier this just refreshes the sid and restores client state.
+    display_name = (u.display_name or "").strip() or u.username
+    joined = live_state.execute("join", uid, request.sid, display_name, uuid.uuid4().hex[:8])
+    if not joined:
+        return
+    presence.track(request.sid, uid)
     join_room("raters")
 
-    emit("rating_joined", {"rater_id": rid, "user_id": str(uid), "username": display_name})
+    emit("rating_joined", {"rater_id": joined["rater_id"], "user_id": uid, "username": joined["username"]})
     emit("playback_state", _get_playback_snapshot())
     socketio.emit("initial_state", _serialize_state(), room="panel")
     _broadcast_raters_presence()
@@ -194,18 +248,8 @@ def handle_leave_rating():
     if uid is None:
         return
 
-    info = active_raters.pop(uid, None) or {}
-    rid = info.get("rater_id")
-    if rid:
-        with state_lock:
-            try:
-                raters = shared_state.get("raters") or {}
-                raters.pop(str(rid), None)
-                ordered = sorted(raters.values(), key=lambda r: r.get("order", 0))
-                for idx, r in enumerate(ordered):
-                    r["order"] = idx
-            except Exception:
-                pass
+    live_state.execute("remove_member", user_id=uid)
+    presence.disconnected(request.sid)
 
     try:
         leave_room("raters")
@@ -235,39 +279,26 @@ def handle_kick_rater(data):
             pass
         return
 
-    victim_uid = None
     # Prefer kicking by explicit user_id; fallback to rater_id
-    for uid, info in list(active_raters.items()):
-        if target_uid is not None and str(uid) == str(target_uid):
-            victim_uid = uid
-            break
-        if victim_uid is None and target_rid is not None and str(info.get("rater_id")) == str(target_rid):
-            victim_uid = uid
-            # don't break: user_id match should win if present
-
-    if victim_uid is None:
+    removed = live_state.execute(
+        "remove_member",
+        user_id=str(target_uid) if target_uid is not None else None,
+        rater_id=str(target_rid) if target_rid is not None else None,
+    )
+    if not removed:
         try:
             emit("kick_result", {"ok": False, "msg": "not_found"})
         except Exception:
             pass
         return
 
-    info = active_raters.pop(victim_uid, None) or {}
+    victim_uid, info = removed
     rid = info.get("rater_id")
-    if rid:
-        with state_lock:
-            try:
-                raters = shared_state.get("raters") or {}
-                raters.pop(str(rid), None)
-                ordered = sorted(raters.values(), key=lambda r: r.get("order", 0))
-                for idx, r in enumerate(ordered):
-                    r["order"] = idx
-            except Exception:
-                pass
 
     sid = info.get("sid")
     try:
         if sid:
+            presence.disconnected(sid)
             socketio.emit("kicked", {}, room=sid)
     except Exception:
         pass
@@ -297,7 +328,7 @@ def handle_request_queue_state():
     """Состояние очереди и плеера для панели."""
     if not _require_panel_access():
         return
-    emit("queue_state", _serialize_queue_state(limit=100))
+    emit("queue_state", _get_queue_snapshot())
     emit("playback_state", _get_playback_snapshot())
 
 
@@ -325,7 +356,7 @@ def handle_admin_set_submission_priority(data):
         sub.priority = pr
         sub.priority_set_at = datetime.utcnow()
     db.session.commit()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
 
 
 @socketio.on("admin_delete_submission")
@@ -344,20 +375,9 @@ def handle_admin_delete_submission(data):
         return
 
     # если удаляем активный трек — остановим плеер и очистим состояние
-    is_active_track = False
     try:
-        with state_lock:
-            if shared_state.get("active_submission_id") == sid:
-                is_active_track = True
-                shared_state["active_submission_id"] = None
-                shared_state["playback"] = {
-                    "is_playing": False,
-                    "position_ms": 0,
-                    "server_ts_ms": _now_ms(),
-                }
-                shared_state["track_name"] = ""
         # Only reset track name if we deleted the ACTIVE track
-        if is_active_track:
+        if live_state.execute("clear_active", sid, _now_ms(), clear_name=True):
             emit("track_name_changed", {"track_name": ""})
     except Exception:
         pass
@@ -365,17 +385,17 @@ def handle_admin_delete_submission(data):
     sub.status = "deleted"
     db.session.commit()
 
-    # удалить файл с диска (конвертацию отключили, поэтому удаляем только исходник)
-    try:
-        ext = (sub.original_ext or "").lower().lstrip(".")
-        raw_path = os.path.join(SUBMISSIONS_RAW_DIR, f"{sub.file_uuid}.{ext}")
-        if os.path.exists(raw_path):
-            os.remove(raw_path)
-    except Exception:
-        pass
+    # удалить файл с диска (конвертацию отключили, поэтому удаляем только исходник).
+    # Диск может быть медленным (сетевое хранилище) — удаляем в фоне.
+    ext = (sub.original_ext or "").lower().lstrip(".")
+    dispatcher.submit(
+        _remove_file_quietly,
+        os.path.join(SUBMISSIONS_RAW_DIR, f"{sub.file_uuid}.{ext}"),
+        name="remove_submission_file",
+    )
 
     _broadcast_playback_state()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
 
 
 @socketio.on("admin_activate_submission")
@@ -441,6 +461,8 @@ def handle_admin_activate_submission(data):
             if track.name != track_name:
                 track.name = track_name
                 db.session.commit()
+                invalidate_track_page(track.id)
+                invalidate_fragments(TAG_LEADERBOARD, TAG_AWARDS)
 
         # Broadcast live payload for public widgets (OBS).
         payload = {
@@ -448,36 +470,36 @@ def handle_admin_activate_submission(data):
             "track_name": track_name,
             "track_url": _get_track_url(track.id),
             "qr_url": url_for("qr_for_track", track_id=track.id, _external=True),
+            "qr_svg_url": url_for("qr_for_track_svg", track_id=track.id, size=QR_SMALL_SIZE, _external=True),
         }
-        socketio.emit("live_track_changed", payload, room="public")
+        # QR images are rendered off the request path so the first scans hit a warm cache.
+        dispatcher.submit(qr_pregenerate, int(track.id), payload["track_url"], name="qr_pregenerate")
+        emit_to_topics("live_track_changed", payload, ["live_track", track_topic(track.id)])
 
         # Notify Twitch chat bot (best-effort). Viewers will need to log in to submit
         # a review, but the track page itself is public.
-        try:
-            notify_twitch_bot_track_changed(
-                channel=None,
-                track_id=int(track.id),
-                track_name=str(track_name or ""),
-                track_url_external=str(payload.get("track_url") or ""),
-            )
-        except Exception:
-            pass
+        # The webhook is a blocking HTTP call, so it runs in the background dispatcher.
+        dispatcher.submit(
+            notify_twitch_bot_track_changed,
+            name="twitch_notify",
+            channel=None,
+            track_id=int(track.id),
+            track_name=str(track_name or ""),
+            track_url_external=str(payload.get("track_url") or ""),
+        )
     except Exception:
         # Don't crash activation if widget broadcast fails for some reason.
         pass
 
-    with state_lock:
-        shared_state["track_name"] = track_name
-        shared_state["active_submission_id"] = sub.id
-        shared_state["playback"] = {
-            "is_playing": bool(autoplay),
-            "position_ms": 0,
-            "server_ts_ms": _now_ms(),
-        }
+    # Active-track payload is built once here and reused by every playback broadcast.
+    live_state.execute(
+        "activate", sub.id, track_name, bool(autoplay), _now_ms(), _active_track_payload(sub),
+        round_id=uuid.uuid4().hex,
+    )
 
     emit("track_name_changed", {"track_name": track_name})
     _broadcast_playback_state()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
 
 @socketio.on("admin_playback_cmd")
 def handle_admin_playback_cmd(data):
@@ -486,56 +508,37 @@ def handle_admin_playback_cmd(data):
     if not _is_joined_rater():
         return
     action = (data or {}).get("action")
-    now = _now_ms()
-
-    with state_lock:
-        active_id = shared_state.get("active_submission_id")
-        pb = dict(shared_state.get("playback") or {})
-
-        if not active_id:
-            return
-
-        cur_pos = _compute_playback_position_ms(pb, now_ms=now)
-
-        if action == "play":
-            pb["is_playing"] = True
-            pb["server_ts_ms"] = now
-        elif action == "pause":
-            pb["is_playing"] = False
-            pb["position_ms"] = cur_pos
-            pb["server_ts_ms"] = now
-        elif action == "stop":
-            pb["is_playing"] = False
-            pb["position_ms"] = 0
-            pb["server_ts_ms"] = now
-        elif action == "restart":
-            pb["position_ms"] = 0
-            pb["server_ts_ms"] = now
-        elif action == "seek":
-            try:
-                target_ms = int((data or {}).get("position_ms") or 0)
-            except Exception:
-                target_ms = 0
-            target_ms = max(0, target_ms)
-
-            # если известна длительность — ограничим
-            try:
-                sub = db.session.get(TrackSubmission, int(active_id))
-                if sub and sub.duration_sec is not None:
-                    max_ms = int(sub.duration_sec) * 1000
-                    if max_ms > 0:
-                        target_ms = min(target_ms, max_ms)
-            except Exception:
-                pass
+    st = live_state.snapshot()
+    active_id = st["active_submission_id"]
+    if not active_id:
+        return
 
-            pb["position_ms"] = target_ms
-            pb["server_ts_ms"] = now
-        else:
-            return
+    position_ms = 0
+    max_ms = None
+    if action == "seek":
+        try:
+            position_ms = int((data or {}).get("position_ms") or 0)
+        except Exception:
+            position_ms = 0
 
-        shared_state["playback"] = pb
+        # если известна длительность — ограничим (из закэшированного активного трека)
+        try:
+            active = st["active_track"] or _get_playback_snapshot()["active"] or {}
+            duration_sec = active.get("duration_sec")
+            if duration_sec is not None:
+                max_ms = int(duration_sec) * 1000 or None
+        except Exception:
+            pass
 
-    _broadcast_playback_state()
+    if live_state.execute(
+        "playback",
+        action,
+        _now_ms(),
+        expected_active_id=active_id,
+        position_ms=position_ms,
+        max_ms=max_ms,
+    ):
+        _broadcast_playback_state()
 
 
 @socketio.on("change_track_name")
@@ -543,9 +546,8 @@ def handle_change_track_name(data):
     if not _require_admin():
         return
     track_name = (data or {}).get("track_name", "").strip()
-    with state_lock:
-        shared_state["track_name"] = track_name
-    emit("track_name_changed", {"track_name": track_name}, broadcast=True, include_self=True)
+    live_state.execute("set_track_name", track_name, round_id=uuid.uuid4().hex)
+    socketio.emit("track_name_changed", {"track_name": track_name}, room="panel")
 
 
 @socketio.on("change_rater_name")
@@ -558,14 +560,11 @@ def handle_change_rater_name(data):
     name = (data or {}).get("name", "").strip()
     if not rater_id:
         return
-    with state_lock:
-        rater = shared_state["raters"].get(rater_id)
-        if not rater:
-            return
-        if name:
-            rater["name"] = name
-        payload = {"rater_id": rater_id, "name": rater["name"]}
-    emit("rater_name_changed", payload, broadcast=True, include_self=True)
+    new_name = live_state.execute("rename_rater", rater_id, name)
+    if new_name is None:
+        return
+    payload = {"rater_id": rater_id, "name": new_name}
+    socketio.emit("rater_name_changed", payload, room="panel")
 
 
 @socketio.on("change_slider")
@@ -575,10 +574,11 @@ def handle_change_slider(data):
         return
     # But changing values is only allowed for joined raters, and only for their own slot.
     u, uid = _current_user_and_id()
-    if uid is None or uid not in active_raters:
+    info = _member_info(uid)
+    if not info:
         return
     rater_id = (data or {}).get("rater_id")
-    if str(rater_id) != str(active_raters[uid].get("rater_id")):
+    if str(rater_id) != str(info.get("rater_id")):
         return
     criterion_key = (data or {}).get("criterion_key")
     try:
@@ -587,18 +587,14 @@ def handle_change_slider(data):
         value = 0.0
     if not rater_id or not criterion_key:
         return
-    with state_lock:
-        rater = shared_state["raters"].get(rater_id)
-        if not rater:
-            return
-        if criterion_key not in rater["scores"]:
-            return
-        rater["scores"][criterion_key] = value
-    emit(
+    if not live_state.execute("set_score", rater_id, criterion_key, value):
+        return
+    # Drag-rate traffic: only open panels render sliders (other pages get them
+    # with `initial_state` on their next `enter_panel`).
+    socketio.emit(
         "slider_updated",
         {"rater_id": rater_id, "criterion_key": criterion_key, "value": value},
-        broadcast=True,
-        include_self=True,
+        room="panel",
     )
 
 
@@ -618,206 +614,80 @@ def handle_remove_rater(data):
     rater_id = (data or {}).get("rater_id")
     if not rater_id:
         return
-    with state_lock:
-        if rater_id not in shared_state["raters"]:
-            return
-        shared_state["raters"].pop(rater_id)
-        for idx, rid in enumerate(
-            sorted(shared_state["raters"].keys(), key=lambda x: int(x))
-        ):
-            shared_state["raters"][rid]["order"] = idx
+    if not live_state.execute("remove_rater", str(rater_id)):
+        return
     emit("rater_removed", {"rater_id": rater_id})
+    _broadcast_raters_presence()
 
 
 @socketio.on("evaluate")
 def handle_evaluate():
+    """Snapshot the judges' scores and finalize the evaluation in the background.
+
+    The heavy part (Track/Evaluation writes, rank query, result push) runs in
+    `evaluation.finalize_evaluation`; here we only acknowledge.
+    """
     if not _require_admin():
         return
 
-    rater_results = []
-
-    with state_lock:
-        track_name = shared_state["track_name"] or "Без названия"
-        active_submission_id = shared_state.get("active_submission_id")
-        raters_list = list(shared_state["raters"].values())
-        raters_list.sort(key=lambda r: r.get("order", 0))
+    st = live_state.snapshot()
+    raters_list = sorted(st["raters"].values(), key=lambda r: r.get("order", 0))
+    if RATER_EXCLUDE_IDLE:
+        # Slots of judges who went away (closed laptop) don't drag the average down.
+        raters_list = [r for r in raters_list if not r.get("idle")] or raters_list
+    snapshot = {
+        "track_name": st["track_name"] or "Без названия",
+        "active_submission_id": st["active_submission_id"],
+        "raters": [
+            {"id": r["id"], "name": r["name"], "scores": dict(r["scores"])}
+            for r in raters_list
+        ],
+    }
 
-    if not raters_list:
+    if not snapshot["raters"]:
         return
+    try:
+        snapshot["active_submission_id"] = int(snapshot["active_submission_id"]) if snapshot["active_submission_id"] else None
+    except Exception:
+        snapshot["active_submission_id"] = None
+
+    # The round (issued on activation / «Новый трек» / rename) is claimed in the
+    # single writer: a second click — even after clear_active below emptied
+    # the live state — finds it claimed and never writes the evaluation twice.
+    round_id = live_state.execute("claim_round", st.get("round_id"), uuid.uuid4().hex)
+    if not round_id:
+        key = evaluation_key(live_state.snapshot().get("round_id") or st.get("round_id"))
+        existing = peek_key(key)
+        if existing and existing["status"] == "done" and existing.get("payload"):
+            emit("evaluation_result", existing["payload"])
+        else:
+            emit("evaluation_accepted", {"key": key, "duplicate": True})
+        return
+    snapshot["round_id"] = round_id
+    key = evaluation_key(round_id)
+    claim_key(key)
 
-        # Reuse an existing Track linked to the active submission (created when it was activated),
-    # so the public /track/<id> page (and QR) stays stable during the live stream.
-    track = None
-    sub_for_track = None
-    if active_submission_id:
-        try:
-            sub_for_track = db.session.get(TrackSubmission, int(active_submission_id))
-        except Exception:
-            sub_for_track = None
-    
-    if sub_for_track and sub_for_track.linked_track_id:
-        track = db.session.get(Track, int(sub_for_track.linked_track_id))
-    
-    if not track:
-        track = Track(name=track_name)
-        if active_submission_id:
-            try:
-                track.submission_id = int(active_submission_id)
-            except Exception:
-                track.submission_id = None
-        db.session.add(track)
-        db.session.flush()
-    
-        # If this track came from the queue, link it back to the submission so the live widget can point to it.
-        if sub_for_track and not sub_for_track.linked_track_id:
-            sub_for_track.linked_track_id = track.id
-            db.session.commit()
-    else:
-        # Keep name in sync with the current live name.
-        if track.name != track_name:
-            track.name = track_name
-            db.session.commit()
-    
-        # Если трек пришёл из очереди — пометим submission как "done" и свяжем с Track.
-        if getattr(track, "submission_id", None):
-            try:
-                sub = db.session.get(TrackSubmission, int(track.submission_id))
-                if sub and sub.status not in ("deleted", "failed", "converting"):
-                    sub.linked_track_id = track.id
-                    # если уже играли, то по факту он теперь оценён
-                    if sub.status in ("queued", "playing"):
-                        sub.status = "done"
-            except Exception as e:
-                print("Warning: could not link submission to track:", e)
-    
-        rater_results = []
-        for r in raters_list:
-            scores = r["scores"]
-            vals = list(scores.values())
-            avg = sum(vals) / len(vals) if vals else 0.0
-            rater_results.append(
-                {
-                    "id": r["id"],
-                    "name": r["name"],
-                    "scores": scores,
-                    "average": round(avg, 2),
-                }
-            )
-            for ck, val in scores.items():
-                db.session.add(
-                    Evaluation(
-                        track_id=track.id,
-                        rater_name=r["name"],
-                        criterion_key=ck,
-                        score=float(val),
-                    )
-                )
-    
-    criterion_avgs = []
-    num_raters = len(raters_list)
-    for key, label in CRITERIA:
-        total = 0.0
-        for r in raters_list:
-            total += float(r["scores"].get(key, 0.0))
-        avg = total / num_raters if num_raters else 0.0
-        criterion_avgs.append(
-            {"key": key, "label": label, "average": round(avg, 2)}
-        )
-
-    overall = (
-        sum(c["average"] for c in criterion_avgs) / len(criterion_avgs)
-        if criterion_avgs
-        else 0.0
-    )
-
-    db.session.commit()
+    if not dispatcher.submit(finalize_evaluation, snapshot, key, request.url_root, name="evaluation"):
+        release_key(key)
+        live_state.execute("release_round", round_id)
+        emit("evaluation_failed", {"key": key})
+        return
+    emit("evaluation_accepted", {"key": key})
+    if session_log is not None:
+        session_log.record("evaluate", snapshot["active_submission_id"], key)
 
     # После оценки трека из очереди — убираем его из текущего воспроизведения,
-    # чтобы он исчезал из очереди (status=done) и не оставался "активным сейчас".
-    if active_submission_id:
-        try:
-            with state_lock:
-                # фиксируем остановку плеера для всех
-                shared_state["active_submission_id"] = None
-                shared_state["playback"] = {
-                    "is_playing": False,
-                    "position_ms": 0,
-                    "server_ts_ms": _now_ms(),
-                }
-        except Exception:
-            pass
-
-        # Сообщаем всем клиентам сразу: очередь обновилась и активного трека больше нет.
-        try:
+    # чтобы он не оставался "активным сейчас". Статус done выставит воркер.
+    if snapshot["active_submission_id"]:
+        if live_state.execute("clear_active", snapshot["active_submission_id"], _now_ms()):
             _broadcast_playback_state()
-            _broadcast_queue_state()
-        except Exception:
-            pass
-
-    # рассчитываем средний балл по треку так же, как для страницы топа
-    track_avg = (
-        db.session.query(func.avg(Evaluation.score))
-        .filter(Evaluation.track_id == track.id)
-        .scalar()
-        or 0.0
-    )
-
-    # подзапрос со средними оценками по трекам
-    # подзапрос со средними оценками по трекам
-    # УЧИТЫВАЕМ только треки, не удалённые из топа
-    avg_subq = (
-        db.session.query(
-            Evaluation.track_id.label("tid"),
-            func.avg(Evaluation.score).label("avg_score"),
-        )
-        .join(Track, Track.id == Evaluation.track_id)
-        .filter(Track.is_deleted.is_(False))
-        .group_by(Evaluation.track_id)
-        .subquery()
-    )
-
-    # сколько треков (НЕ удалённых) имеют средний балл строго выше текущего
-    better_count = (
-            db.session.query(func.count())
-            .filter(avg_subq.c.avg_score > track_avg)
-            .scalar()
-            or 0
-    )
-
-    top_position = int(better_count) + 1
-
-
-    qr_url = url_for("qr_for_track", track_id=track.id, _external=True)
-    track_url = _get_track_url(track.id)
-    payload = {
-        "track_id": track.id,
-        "track_name": track_name,
-        "track_url": track_url,
-        "qr_url": qr_url,
-        "raters": rater_results,
-        "criteria": criterion_avgs,
-        "overall": round(overall, 2),
-        "top_position": top_position,
-    }
-    emit("evaluation_result", payload, broadcast=True)
 
 
 @socketio.on("reset_state")
 def handle_reset_state():
     if not _require_admin():
         return
-    old_active_id = None
-    with state_lock:
-        shared_state["track_name"] = ""
-        old_active_id = shared_state.get("active_submission_id")
-        shared_state["active_submission_id"] = None
-        shared_state["playback"] = {
-            "is_playing": False,
-            "position_ms": 0,
-            "server_ts_ms": _now_ms(),
-        }
-        for r in shared_state["raters"].values():
-            r["scores"] = {key: 0 for key, _ in CRITERIA}
+    old_active_id = live_state.execute("reset", _now_ms(), round_id=uuid.uuid4().hex)
 
     # если сбросили состояние во время проигрывания — вернём трек обратно в очередь (если он не оценён)
     if old_active_id:
@@ -831,5 +701,5 @@ def handle_reset_state():
 
     emit("state_reset", _serialize_state())
     _broadcast_playback_state()
-    _broadcast_queue_state()
+    _schedule_queue_broadcast()
 
@@ -17,7 +17,6 @@ from sqlalchemy import func
 from .extensions import (
     app,
     db,
-    socketio,
     CRITERIA,
     DEFAULT_NUM_RATERS,
 )
@@ -28,37 +27,32 @@ from .models import (
     ViewerRating,
     TrackComment,
     StreamConfig,
-    User,
 )
+from .dispatcher import dispatcher
+from .live_journal import restore_live_state
+from .live_state import _compute_playback_position_ms, live_state, thaw
+from .presence import presence
+from .topics import emit_to_topics, has_subscribers, room_has_members
+from .user_cache import forget_current_user, resolve_user
 
-state_lock = threading.Lock(
-)
-_next_rater_id = 1
-shared_state = {
-    "track_name": "",
-    "raters": {},  # rater_id -> {id, name, order, scores{criterion_key: value}}
-    # Активный трек из очереди (track_submissions.id). None если трек задан вручную.
-    "active_submission_id": None,
-    # Состояние синхро-плеера.
-    "playback": {
-        "is_playing": False,
-        "position_ms": 0,
-        "server_ts_ms": 0,
-    },
-}
-
-
-def _restore_playing_tracks_on_startup():
+# Live panel state (track name, rater slots, active submission, player) is owned
+# by the single-writer engine in live_state.py; see `live_state.snapshot()`.
+
+
+def _restore_playing_tracks_on_startup(keep_submission_id: Optional[int] = None):
     """Restore tracks with status='playing' back to queue on server restart.
     
-    When server restarts, shared_state is empty but tracks may have status='playing'
+    When server restarts, the live state is empty but tracks may have status='playing'
     from previous session. These tracks are effectively "lost" - not in queue, 
     not in player. This function resets them back to 'queued' so they reappear.
+    `keep_submission_id` is the active track recovered from the live journal:
+    it is still in the player, so it stays 'playing'.
     """
     try:
         playing_tracks = (
             db.session.query(TrackSubmission)
             .filter(TrackSubmission.status == "playing")
+            .filter(TrackSubmission.id != (keep_submission_id or 0))
             .all()
         )
         for sub in playing_tracks:
@@ -71,13 +65,29 @@ def _restore_playing_tracks_on_startup():
         print(f"[Startup Recovery] Warning: could not restore playing tracks: {e}")
 
 
-# Run recovery on module import (server startup)
-try:
-    from .extensions import app
-    with app.app_context():
-        _restore_playing_tracks_on_startup()
-except Exception as e:
-    print(f"[Startup Recovery] Could not run on import: {e}")
+_startup_done = False
+
+
+def run_startup_recovery() -> None:
+    """Server startup (app.py): the live panel state from its journal (+ presence sweeper), then the queue.
+
+    Only the server process may do this: a CLI importing the package must not
+    replay/truncate the running server's journal or requeue its active track.
+    """
+    global _startup_done
+    if _startup_done:
+        return
+    _startup_done = True
+    try:
+        recovered = restore_live_state()
+        if (recovered or {}).get("members"):
+            # Restored members have no socket yet: idle them after the grace period
+            # even if nobody reconnects.
+            presence.start()
+        with app.app_context():
+            _restore_playing_tracks_on_startup((recovered or {}).get("active_submission_id"))
+    except Exception as e:
+        print(f"[Startup Recovery] Could not run: {e}")
 
 
 
@@ -113,7 +123,8 @@ def get_current_user():
     username = session.get("user")
     if not username:
         return None
-    return db.session.query(User).filter_by(username=username).first()
+    # Memoized per request on flask.g (+ short process LRU), see user_cache.py.
+    return resolve_user(username, session.get("session_version"))
 
 
 # Make `current_user` available in all templates.
@@ -142,7 +153,7 @@ def _enforce_session_version():
     if request.endpoint == "static":
         return
 
-    u = db.session.query(User).filter_by(username=username).first()
+    u = get_current_user()
     if not u:
         session.pop("user", None)
         session.pop("role", None)
@@ -155,6 +166,7 @@ def _enforce_session_version():
         session.pop("user", None)
         session.pop("role", None)
         session.pop("session_version", None)
+        forget_current_user()
         # Don't force redirect for API calls; for pages it'll naturally show login.
         return
 
@@ -191,14 +203,13 @@ def _init_default_raters():
 
 
 def _serialize_state():
-    with state_lock:
-        raters = list(shared_state["raters"].values())
-        raters.sort(key=lambda r: r.get("order", 0))
-        return {
-            "track_name": shared_state["track_name"],
-            "raters": raters,
-            "criteria": [{"key": k, "label": label} for k, label in CRITERIA],
-        }
+    st = live_state.snapshot()
+    raters = thaw(sorted(st["raters"].values(), key=lambda r: r.get("order", 0)))
+    return {
+        "track_name": st["track_name"],
+        "raters": raters,
+        "criteria": [{"key": k, "label": label} for k, label in CRITERIA],
+    }
 
 
 def _now_ms() -> int:
@@ -217,41 +228,51 @@ def _get_submission_audio_url(file_uuid: str, ext: str) -> str:
     return url_for("submission_audio", file_uuid=file_uuid, ext=ext, _external=False)
 
 
-def _compute_playback_position_ms(pb: Dict[str, Any], now_ms: Optional[int] = None) -> int:
-    """Текущая позиция плеера по состоянию сервера."""
-    if now_ms is None:
-        now_ms = _now_ms()
-    base = int(pb.get("position_ms") or 0)
-    if pb.get("is_playing"):
-        started_at = int(pb.get("server_ts_ms") or now_ms)
-        base += max(0, now_ms - started_at)
-    return max(0, base)
+def _active_track_payload(sub: TrackSubmission) -> Dict[str, Any]:
+    """Payload of the active submission for playback_state (built once per activation)."""
+    return {
+        "id": sub.id,
+        "artist": sub.artist,
+        "title": sub.title,
+        "display_name": _submission_display_name(sub),
+        "priority": int(sub.priority or 0),
+        "status": sub.status,
+        "duration_sec": int(sub.duration_sec) if sub.duration_sec is not None else None,
+        "file_uuid": sub.file_uuid,
+        "audio_url": _get_submission_audio_url(sub.file_uuid, sub.original_ext),
+    }
+
+
+def _invalidate_active_track(submission_id: Optional[int]) -> None:
+    """Drop the cached active-track payload (rename/delete); rebuilt on the next snapshot."""
+    if submission_id and live_state.snapshot()["active_submission_id"] == submission_id:
+        live_state.execute("set_active_track", submission_id, None)
 
 
 def _get_playback_snapshot() -> Dict[str, Any]:
-    """Снимок состояния синхро‑плеера + активный трек."""
-    with state_lock:
-        active_id = shared_state.get("active_submission_id")
-        pb = dict(shared_state.get("playback") or {})
+    """Снимок состояния синхро‑плеера + активный трек.
+
+    The active-track payload is cached in the live state at activation, so a
+    playback broadcast only does the position math.
+    """
+    st = live_state.snapshot()
+    active_id = st["active_submission_id"]
+    pb = st["playback"]
 
     now_ms = _now_ms()
     pos_ms = _compute_playback_position_ms(pb, now_ms=now_ms)
 
     active_payload = None
     if active_id:
-        sub = db.session.get(TrackSubmission, int(active_id))
-        if sub and sub.status not in ("deleted", "failed"):
-            active_payload = {
-                "id": sub.id,
-                "artist": sub.artist,
-                "title": sub.title,
-                "display_name": _submission_display_name(sub),
-                "priority": int(sub.priority or 0),
-                "status": sub.status,
-                "duration_sec": int(sub.duration_sec) if sub.duration_sec is not None else None,
-                "file_uuid": sub.file_uuid,
-                "audio_url": _get_submission_audio_url(sub.file_uuid, sub.original_ext),
-            }
+        cached = st["active_track"]
+        if cached is not None:
+            active_payload = thaw(cached)
+        else:
+            # Cache was invalidated (rename/delete): rebuild once.
+            sub = db.session.get(TrackSubmission, int(active_id))
+            if sub and sub.status not in ("deleted", "failed"):
+                active_payload = _active_track_payload(sub)
+                live_state.execute("set_active_track", int(active_id), active_payload)
 
     return {
         "active": active_payload,
@@ -306,22 +327,62 @@ def _serialize_queue_state(limit: int = 50) -> Dict[str, Any]:
     return {"items": out_items, "counts": counts}
 
 
+# Short-lived copy of the queue snapshot sent to panels. After a restart every
+# panel reconnects and asks for it at once; they share one serialization.
+QUEUE_SNAPSHOT_TTL_SEC = float(os.getenv("QUEUE_SNAPSHOT_TTL_SEC", "2"))
+_queue_snapshot_lock = threading.Lock()
+_queue_snapshot: Dict[str, Any] = {"payload": None, "at": 0.0}
+
+
+def _store_queue_snapshot(payload: Dict[str, Any]) -> None:
+    with _queue_snapshot_lock:
+        _queue_snapshot["payload"] = payload
+        _queue_snapshot["at"] = time.monotonic()
+
+
+def _invalidate_queue_snapshot() -> None:
+    with _queue_snapshot_lock:
+        _queue_snapshot["payload"] = None
+
+
+def _get_queue_snapshot() -> Dict[str, Any]:
+    """Queue snapshot (limit=100) for socket clients, served from cache when fresh."""
+    with _queue_snapshot_lock:
+        payload = _queue_snapshot["payload"]
+        if payload is not None and time.monotonic() - _queue_snapshot["at"] < QUEUE_SNAPSHOT_TTL_SEC:
+            return payload
+    payload = _serialize_queue_state(limit=100)
+    _store_queue_snapshot(payload)
+    return payload
+
+
 def _broadcast_queue_state() -> None:
     try:
+        # Queue is visible in the panel and to viewers subscribed to the "queue" topic.
+        # Skip the DB work entirely if nobody would receive it.
+        if not (has_subscribers("queue") or room_has_members("panel")):
+            _invalidate_queue_snapshot()
+            return
         payload = _serialize_queue_state(limit=100)
-        # Queue is visible both in the panel and to public viewers.
-        socketio.emit("queue_state", payload, room="panel")
-        socketio.emit("queue_state", payload, room="public")
+        _store_queue_snapshot(payload)
+        emit_to_topics("queue_state", payload, ["queue"], rooms=["panel"])
     except Exception as e:
         print("Warning: failed to broadcast queue_state:", e)
 
 
+def _schedule_queue_broadcast() -> None:
+    """Queue broadcast off the caller's path; bursts collapse into one job."""
+    _invalidate_queue_snapshot()
+    if not dispatcher.submit(_broadcast_queue_state, name="queue_state", key="queue_state"):
+        _broadcast_queue_state()
+
+
 def _broadcast_playback_state() -> None:
     try:
         payload = _get_playback_snapshot()
-        # Playback sync is for joined raters everywhere + observers currently in panel.
-        socketio.emit("playback_state", payload, room="raters")
-        socketio.emit("playback_state", payload, room="panel")
+        # Playback sync is for joined raters everywhere + observers currently in panel
+        # (+ optional "playback" topic subscribers).
+        emit_to_topics("playback_state", payload, ["playback"], rooms=["raters", "panel"])
     except Exception as e:
         print("Warning: failed to broadcast playback_state:", e)
 
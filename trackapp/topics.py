@@ -0,0 +1,168 @@
+"""Explicit Socket.IO topic subscriptions.
+
+Historically every socket was joined to the `public` room on connect, so queue
+and live-track broadcasts fanned out to every open tab (settings, awards, ...)
+even if the page never rendered them. Clients now subscribe explicitly:
+
+    socket.emit("subscribe", {"topics": ["queue", "track:42"]})
+    socket.emit("unsubscribe", {"topics": ["queue"]})
+
+Each topic maps to its own room. We keep per-topic subscriber counts so that
+broadcast helpers can skip serialization/fan-out completely when nobody listens.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from .extensions import socketio
+
+# Static topics. Per-track topics are "track:<id>".
+TOPICS = ("queue", "live_track", "evaluation_result", "playback")
+TRACK_TOPIC_PREFIX = "track:"
+
+# Safety limit: a single page never needs more than a handful of topics.
+MAX_TOPICS_PER_SID = 16
+
+_topics_lock = threading.Lock()
+_sid_topics: Dict[str, Set[str]] = {}  # sid -> {topic}
+_topic_counts: Dict[str, int] = {}  # topic -> number of subscribed sids
+
+
+def normalize_topic(value) -> Optional[str]:
+    """Return a canonical topic name or None if the topic is unknown."""
+    topic = str(value or "").strip().lower()
+    if topic in TOPICS:
+        return topic
+    if topic.startswith(TRACK_TOPIC_PREFIX):
+        raw_id = topic[len(TRACK_TOPIC_PREFIX):]
+        if raw_id.isdigit() and int(raw_id) > 0:
+            return f"{TRACK_TOPIC_PREFIX}{int(raw_id)}"
+    return None
+
+
+def track_topic(track_id: int) -> str:
+    return f"{TRACK_TOPIC_PREFIX}{int(track_id)}"
+
+
+def topic_room(topic: str) -> str:
+    """Room name used for a topic (prefixed to avoid clashes with sid/panel rooms)."""
+    return f"topic:{topic}"
+
+
+def parse_topics(data) -> List[str]:
+    """Accept {"topics": [...]}, {"topic": "..."}, a list or a single string."""
+    if isinstance(data, dict):
+        raw = data.get("topics")
+        if raw is None:
+            raw = data.get("topic")
+    else:
+        raw = data
+    if raw is None:
+        return []
+    if isinstance(raw, (str, int)):
+        raw = [raw]
+    out: List[str] = []
+    try:
+        for item in raw:
+            t = normalize_topic(item)
+            if t and t not in out:
+                out.append(t)
+    except TypeError:
+        return []
+    return out
+
+
+def subscribe(sid: str, topics: Iterable[str]) -> List[str]:
+    """Register `sid` for topics. Returns topics that were newly added."""
+    added: List[str] = []
+    with _topics_lock:
+        current = _sid_topics.setdefault(sid, set())
+        for t in topics:
+            if t in current:
+                continue
+            if len(current) >= MAX_TOPICS_PER_SID:
+                break
+            current.add(t)
+            _topic_counts[t] = _topic_counts.get(t, 0) + 1
+            added.append(t)
+    return added
+
+
+def unsubscribe(sid: str, topics: Iterable[str]) -> List[str]:
+    """Remove `sid` from topics. Returns topics that were actually removed."""
+    removed: List[str] = []
+    with _topics_lock:
+        current = _sid_topics.get(sid)
+        if not current:
+            return removed
+        for t in topics:
+            if t not in current:
+                continue
+            current.discard(t)
+            _dec_count(t)
+            removed.append(t)
+        if not current:
+            _sid_topics.pop(sid, None)
+    return removed
+
+
+def drop_sid(sid: str) -> List[str]:
+    """Forget all subscriptions of a disconnected socket."""
+    with _topics_lock:
+        current = _sid_topics.pop(sid, None) or set()
+        for t in current:
+            _dec_count(t)
+    return sorted(current)
+
+
+def _dec_count(topic: str) -> None:
+    n = _topic_counts.get(topic, 0) - 1
+    if n > 0:
+        _topic_counts[topic] = n
+    else:
+        _topic_counts.pop(topic, None)
+
+
+def subscriber_count(topic: str) -> int:
+    with _topics_lock:
+        return _topic_counts.get(topic, 0)
+
+
+def has_subscribers(topic: str) -> bool:
+    return subscriber_count(topic) > 0
+
+
+def topic_subscriber_counts() -> Dict[str, int]:
+    """Snapshot of subscriber counts (static topics are always present)."""
+    with _topics_lock:
+        out = {t: 0 for t in TOPICS}
+        out.update(_topic_counts)
+        return out
+
+
+def room_has_members(room: str, namespace: str = "/") -> bool:
+    """True if at least one socket of this process is in `room`."""
+    try:
+        for _ in socketio.server.manager.get_participants(namespace, room):
+            return True
+    except Exception:
+        return False
+    return False
+
+
+def emit_to_topics(event: str, payload, topics: Iterable[str], rooms: Iterable[str] = ()) -> bool:
+    """Emit once to all subscribed topic rooms plus explicit `rooms`.
+
+    Topics without subscribers are skipped. A single emit with a list of rooms
+    lets python-socketio de-duplicate sockets that are in several rooms at once
+    (e.g. a judge in `panel` who is also subscribed to `queue`).
+    Returns False (and does nothing) if there is nobody to send to.
+    """
+    targets = [r for r in rooms if r]
+    for t in topics:
+        if has_subscribers(t):
+            targets.append(topic_room(t))
+    if not targets:
+        return False
+    socketio.emit(event, payload, room=targets)
+    return True
@@ -0,0 +1,232 @@
+"""Single loader for everything a track view shows.
+
+`track_page`, `track_summary`, the awards panel and embedded players used to
+assemble the same data separately (two `db.session.get(TrackSubmission)` per
+track, four aggregate queries, two badge joins, and all of it again per
+nominee in the awards panel). `load_track_details_batch(ids)` does it in
+two queries no matter how many tracks are asked for:
+
+1. tracks + their submission + review aggregates (outer joins);
+2. evaluation sums/counts grouped by (track, criterion, rater) — overall,
+   per-criterion and per-rater averages are derived from it in Python;
+3. nominee and winner badges come from the in-memory `badge_index`
+   (award_badges.py), no query.
+
+The result is an immutable `TrackDetails` (frozen dataclass of tuples and
+namedtuples), so it can be shared between requests or put in a cache as is.
+Review lists and the visitor's own review are not part of it: they depend on
+the page/visitor. `load_reviews_page(track_id, cursor)` pages through the
+reviews with a keyset cursor (newest first), scores batch-loaded.
+"""
+
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from flask import url_for
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import selectinload
+
+from .award_badges import Badge, badge_index
+from .extensions import ALLOWED_SUBMISSION_EXTS, CRITERIA, db
+from .models import Evaluation, Track, TrackReview, TrackSubmission
+
+REVIEWS_PAGE_SIZE = 20
+
+CriterionStat = namedtuple("CriterionStat", "key label avg")
+ReviewsPage = namedtuple("ReviewsPage", "reviews next_cursor")
+RaterStat = namedtuple("RaterStat", "name avg")
+
+_CRITERIA_LABELS = dict(CRITERIA)
+
+
+@dataclass(frozen=True)
+class TrackDetails:
+    id: int
+    name: str
+    created_at: Optional[datetime]
+    is_deleted: bool
+    submission_id: Optional[int]
+    audio_url: Optional[str]
+    player_title: str
+    player_subtitle: Optional[str]
+    overall_avg: Optional[float]
+    # All CRITERIA in their configured order, avg=None where nobody scored yet.
+    criteria: Tuple[CriterionStat, ...] = ()
+    raters: Tuple[RaterStat, ...] = ()
+    review_overall: Optional[float] = None
+    review_count: int = 0
+    award_noms: Tuple[Badge, ...] = ()
+    award_wins: Tuple[Badge, ...] = ()
+    loaded_at: datetime = field(default_factory=datetime.utcnow, compare=False)
+
+    @property
+    def criteria_stats(self) -> Tuple[CriterionStat, ...]:
+        """Only criteria that have scores, ordered by key (track page table)."""
+        return tuple(sorted((c for c in self.criteria if c.avg is not None), key=lambda c: c.key))
+
+    def to_summary(self) -> Dict[str, Any]:
+        """Payload of /api/track/<id>/summary."""
+        return {
+            "track": {
+                "id": self.id,
+                "name": self.name,
+                "created_at": self.created_at.isoformat() if self.created_at else None,
+            },
+            "overall_avg": self.overall_avg,
+            "criteria": [c._asdict() for c in self.criteria],
+            "raters": [r._asdict() for r in self.raters],
+            "viewer_overall_avg": self.review_overall,
+            "viewer_criteria": [],
+            "review_count": self.review_count,
+        }
+
+
+def _audio_url(sub: Optional[TrackSubmission]) -> Optional[str]:
+    """Best-effort audio URL for embedded players."""
+    try:
+        if sub and sub.status not in ("deleted", "failed"):
+            ext = (sub.original_ext or "").lower().lstrip(".")
+            if ext in ALLOWED_SUBMISSION_EXTS:
+                return url_for("submission_audio", file_uuid=sub.file_uuid, ext=ext)
+    except Exception:
+        return None
+    return None
+
+
+def load_track_details_batch(track_ids: Iterable[int], include_deleted: bool = False) -> Dict[int, TrackDetails]:
+    """Load details for many tracks in two queries. Missing ids are absent from the result."""
+    ids = sorted({int(t) for t in track_ids if t is not None})
+    if not ids:
+        return {}
+
+    # 1) track + submission + review aggregates
+    review_agg = (
+        db.session.query(
+            TrackReview.track_id.label("track_id"),
+            func.avg(TrackReview.overall).label("avg_overall"),
+            func.count(TrackReview.id).label("cnt"),
+        )
+        .filter(TrackReview.track_id.in_(ids))
+        .group_by(TrackReview.track_id)
+        .subquery()
+    )
+    q = (
+        db.session.query(Track, TrackSubmission, review_agg.c.avg_overall, review_agg.c.cnt)
+        .outerjoin(TrackSubmission, TrackSubmission.id == Track.submission_id)
+        .outerjoin(review_agg, review_agg.c.track_id == Track.id)
+        .filter(Track.id.in_(ids))
+    )
+    if not include_deleted:
+        q = q.filter(Track.is_deleted.is_(False))
+    base_rows = q.all()
+    if not base_rows:
+        return {}
+    found = [row[0].id for row in base_rows]
+
+    # 2) evaluation aggregates: one row per (track, criterion, rater)
+    eval_rows = (
+        db.session.query(
+            Evaluation.track_id,
+            Evaluation.criterion_key,
+            Evaluation.rater_name,
+            func.sum(Evaluation.score),
+            func.count(Evaluation.id),
+        )
+        .filter(Evaluation.track_id.in_(found))
+        .group_by(Evaluation.track_id, Evaluation.criterion_key, Evaluation.rater_name)
+        .all()
+    )
+    # track_id -> {"total": [sum, n], "crit": {key: [sum, n]}, "rater": {name: [sum, n]}}
+    agg: Dict[int, Dict[str, Any]] = {}
+    for track_id, ck, rater_name, total, cnt in eval_rows:
+        if not cnt:
+            continue
+        a = agg.setdefault(track_id, {"total": [0.0, 0], "crit": {}, "rater": {}})
+        for bucket in (a["total"], a["crit"].setdefault(ck, [0.0, 0]), a["rater"].setdefault(rater_name, [0.0, 0])):
+            bucket[0] += float(total or 0)
+            bucket[1] += int(cnt)
+
+    # 3) badges: in-memory index, no query
+    badges = badge_index.for_tracks(found)
+
+    out: Dict[int, TrackDetails] = {}
+    for track, sub, review_avg, review_cnt in base_rows:
+        a = agg.get(track.id)
+        avg = lambda b: (b[0] / b[1]) if b and b[1] else None  # noqa: E731
+        criteria = tuple(
+            CriterionStat(key, label, avg(a["crit"].get(key)) if a else None)
+            for key, label in CRITERIA
+        )
+        raters = tuple(
+            RaterStat(name, avg(b)) for name, b in sorted(a["rater"].items())
+        ) if a else ()
+        out[track.id] = TrackDetails(
+            id=track.id,
+            name=track.name,
+            created_at=track.created_at,
+            is_deleted=bool(track.is_deleted),
+            submission_id=track.submission_id,
+            audio_url=_audio_url(sub),
+            player_title=(sub.title if sub and sub.title else None) or track.name,
+            player_subtitle=sub.artist if sub else None,
+            overall_avg=avg(a["total"]) if a else None,
+            criteria=criteria,
+            raters=raters,
+            review_overall=float(review_avg) if review_avg is not None else None,
+            review_count=int(review_cnt or 0),
+            award_noms=badges[track.id][0],
+            award_wins=badges[track.id][1],
+        )
+    return out
+
+
+def load_track_details(track_id: int, include_deleted: bool = False) -> Optional[TrackDetails]:
+    """Details of one track (or None if it does not exist / is deleted)."""
+    try:
+        track_id = int(track_id)
+    except (TypeError, ValueError):
+        return None
+    return load_track_details_batch([track_id], include_deleted=include_deleted).get(track_id)
+
+
+# -----------------
+# Reviews (keyset pagination)
+# -----------------
+
+def encode_review_cursor(review: TrackReview) -> str:
+    return f"{review.created_at.isoformat()}~{review.id}"
+
+
+def decode_review_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """`"<created_at iso>~<id>"` -> (created_at, id); ValueError if malformed."""
+    if not cursor:
+        return None
+    ts, _sep, rid = cursor.rpartition("~")
+    return datetime.fromisoformat(ts), int(rid)
+
+
+def load_reviews_page(track_id: int, cursor: Optional[str] = None, limit: int = REVIEWS_PAGE_SIZE) -> ReviewsPage:
+    """One page of a track's reviews, newest first, starting after `cursor`.
+
+    Two queries whatever the page size: reviews (+ users, joined) and their
+    criterion scores (selectinload). Raises ValueError on a bad cursor.
+    """
+    after = decode_review_cursor(cursor)
+    query = (
+        db.session.query(TrackReview)
+        .options(selectinload(TrackReview.scores))
+        .filter(TrackReview.track_id == int(track_id))
+    )
+    if after is not None:
+        created_at, review_id = after
+        query = query.filter(
+            or_(
+                TrackReview.created_at < created_at,
+                and_(TrackReview.created_at == created_at, TrackReview.id < review_id),
+            )
+        )
+    rows = query.order_by(TrackReview.created_at.desc(), TrackReview.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_review_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return ReviewsPage(reviews=rows[:limit], next_cursor=next_cursor)
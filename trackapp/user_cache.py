@@ -0,0 +1,154 @@
+"""Resolve the logged-in user once per request (and briefly across requests).
+
+`get_current_user()` is called by the session-version check (before_request),
+the template context processor, the handler itself and helpers like
+`_require_admin`; every call used to be its own `User` query, and Socket.IO
+events paid one per event. Now:
+
+- the resolved user is memoized on `flask.g` for the rest of the request
+  (keyed by the session username, so login/logout within a request is seen);
+- a small process-level LRU maps (username, session_version) to the user's
+  column values for USER_CACHE_TTL_SEC (0 = off). A hit re-attaches the user
+  to the current DB session without a query.
+
+Any flush that updates or deletes a `User` in this process drops its cache
+entries (role change, password change, logout-everywhere), so the TTL only
+bounds staleness for changes made by other processes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from flask import g, has_app_context
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from .extensions import db
+from .models import User
+
+USER_CACHE_TTL_SEC = max(0.0, float(os.getenv("USER_CACHE_TTL_SEC", "5")))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "512"))
+
+_G_KEY = "_current_user_entry"
+_COLUMNS = [attr.key for attr in sa_inspect(User).column_attrs]
+
+
+class UserCache:
+    def __init__(self, ttl_sec: float = USER_CACHE_TTL_SEC, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        # (username, session_version) -> (expires_at, {column: value})
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, username: str, session_version: int) -> Optional[Dict[str, Any]]:
+        if self.ttl_sec <= 0:
+            return None
+        key = (username, session_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, user: User) -> None:
+        if self.ttl_sec <= 0 or user is None:
+            return
+        try:
+            cols = {k: getattr(user, k) for k in _COLUMNS}
+        except Exception:
+            return
+        key = (cols["username"], int(cols.get("session_version") or 1))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, cols)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None) -> None:
+        """Drop entries of `username` (all entries when None)."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == username]:
+                    self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+        out["ttl_sec"] = self.ttl_sec
+        return out
+
+
+user_cache = UserCache()
+
+
+def _attach(cols: Dict[str, Any]) -> User:
+    """Turn cached column values into a persistent User of the current session (no query)."""
+    existing = db.session.identity_map.get(identity_key(User, cols["id"]))
+    if existing is not None:
+        return existing
+    user = User()
+    for k, v in cols.items():
+        setattr(user, k, v)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+def _load_user(username: str, session_version: Optional[int]) -> Optional[User]:
+    if session_version is not None:
+        cols = user_cache.get(username, int(session_version))
+        if cols is not None:
+            try:
+                return _attach(cols)
+            except Exception:
+                pass
+    user = db.session.query(User).filter_by(username=username).first()
+    if user is not None:
+        user_cache.put(user)
+    return user
+
+
+def resolve_user(username: Optional[str], session_version: Optional[int] = None) -> Optional[User]:
+    """User for `username`, memoized on flask.g for the current request."""
+    if not username:
+        return None
+    if not has_app_context():
+        return _load_user(username, session_version)
+    entry = g.get(_G_KEY)
+    if entry is not None and entry[0] == username:
+        return entry[1]
+    user = _load_user(username, session_version)
+    setattr(g, _G_KEY, (username, user))
+    return user
+
+
+def forget_current_user() -> None:
+    """Drop the per-request memo (e.g. right after login/logout)."""
+    if has_app_context():
+        g.pop(_G_KEY, None)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_write(_mapper, _connection, target):
+    try:
+        hist = sa_inspect(target).attrs.username.history
+        for name in set(list(hist.deleted or ()) + list(hist.unchanged or ()) + list(hist.added or ())):
+            user_cache.invalidate(name)
+    except Exception:
+        user_cache.invalidate()
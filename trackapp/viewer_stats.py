@@ -0,0 +1,208 @@
+"""Viewer rating summaries for the /viewers modal, batched and cached.
+
+`/api/viewers/track/<id>` used to run three queries per modal (the viewer's
+own rows, a per-criterion GROUP BY and the overall average), and people open
+track after track. Now:
+
+- `load_viewer_summaries(ids, viewer_id)` answers for up to
+  VIEWER_BATCH_MAX_IDS tracks in at most three queries (tracks, aggregates
+  of the tracks not in the cache, the viewer's own scores), whatever the
+  number of ids;
+- per-track aggregates (criterion sums/counts) are kept for
+  VIEWER_STATS_TTL_SEC (0 = off) and dropped by `viewers_rate` right after
+  its commit. The TTL only bounds staleness for other workers;
+- the viewer's own scores are never cached (they are per cookie).
+
+`/api/viewers/tracks?ids=1,2,3` returns the summaries of a whole page;
+viewers.js prefetches the visible rows so that opening a modal needs no
+request at all.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from .extensions import CRITERIA, db
+from .models import Track, ViewerRating
+
+VIEWER_STATS_TTL_SEC = max(0.0, float(os.getenv("VIEWER_STATS_TTL_SEC", "60")))
+VIEWER_STATS_MAX_ENTRIES = int(os.getenv("VIEWER_STATS_MAX_ENTRIES", "2000"))
+VIEWER_BATCH_MAX_IDS = 50
+
+# criterion_key -> (sum, count)
+Aggregates = Dict[str, Tuple[float, int]]
+
+
+class ViewerStatsCache:
+    def __init__(self, ttl_sec: float = VIEWER_STATS_TTL_SEC, max_entries: int = VIEWER_STATS_MAX_ENTRIES):
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        # track_id -> (expires_at, aggregates)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # bumped by invalidate(): aggregates computed before it are not stored
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get_many(self, track_ids: Iterable[int]) -> Dict[int, Aggregates]:
+        out: Dict[int, Aggregates] = {}
+        if self.ttl_sec <= 0:
+            return out
+        now = time.monotonic()
+        with self._lock:
+            for tid in track_ids:
+                entry = self._entries.get(tid)
+                if entry is None or entry[0] <= now:
+                    self._stats["misses"] += 1
+                    continue
+                self._entries.move_to_end(tid)
+                self._stats["hits"] += 1
+                out[tid] = entry[1]
+        return out
+
+    def put_many(self, aggregates: Dict[int, Aggregates], generation: int) -> None:
+        if self.ttl_sec <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_sec
+        with self._lock:
+            if generation != self._generation:
+                return
+            for tid, agg in aggregates.items():
+                self._entries[tid] = (expires_at, agg)
+                self._entries.move_to_end(tid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, track_id: Optional[int] = None) -> None:
+        """Drop one track's aggregates (all when None)."""
+        with self._lock:
+            self._generation += 1
+            if track_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(track_id), None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+        out["ttl_sec"] = self.ttl_sec
+        return out
+
+
+viewer_stats_cache = ViewerStatsCache()
+
+
+def parse_track_ids(raw: Optional[str]) -> List[int]:
+    """`"3,1,3,x"` -> [3, 1] (order kept, duplicates and junk dropped)."""
+    out: List[int] = []
+    seen = set()
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part.isdigit():
+            continue
+        tid = int(part)
+        if tid not in seen:
+            seen.add(tid)
+            out.append(tid)
+    return out
+
+
+def _load_aggregates(track_ids: List[int]) -> Dict[int, Aggregates]:
+    out: Dict[int, Aggregates] = {tid: {} for tid in track_ids}
+    if not track_ids:
+        return out
+    rows = (
+        db.session.query(
+            ViewerRating.track_id,
+            ViewerRating.criterion_key,
+            func.sum(ViewerRating.score),
+            func.count(ViewerRating.id),
+        )
+        .filter(ViewerRating.track_id.in_(track_ids))
+        .group_by(ViewerRating.track_id, ViewerRating.criterion_key)
+        .all()
+    )
+    for tid, key, total, count in rows:
+        out[tid][key] = (float(total or 0), int(count or 0))
+    return out
+
+
+def _summary(track, aggregates: Aggregates, viewer_scores: Dict[str, int]) -> Dict[str, Any]:
+    criteria_stats = []
+    for key, label in CRITERIA:
+        total, count = aggregates.get(key, (0.0, 0))
+        criteria_stats.append({"key": key, "label": label, "avg_score": (total / count) if count else 0.0})
+    total_sum = sum(t for t, _ in aggregates.values())
+    total_count = sum(c for _, c in aggregates.values())
+    return {
+        "track": {
+            "id": track.id,
+            "name": track.name,
+            "created_at": track.created_at.isoformat() if track.created_at else None,
+        },
+        "viewer": {
+            "has_voted": bool(viewer_scores),
+            "scores": viewer_scores,
+        },
+        "criteria": criteria_stats,
+        "overall_avg": (total_sum / total_count) if total_count else 0.0,
+    }
+
+
+def load_viewer_summaries(track_ids: Iterable[int], viewer_id: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+    """Modal payloads keyed by track id; deleted/unknown tracks are left out."""
+    ids = list(dict.fromkeys(int(t) for t in track_ids))
+    if not ids:
+        return {}
+
+    tracks = (
+        db.session.query(Track.id, Track.name, Track.created_at)
+        .filter(Track.id.in_(ids), Track.is_deleted.is_(False))
+        .all()
+    )
+    found = [t.id for t in tracks]
+    if not found:
+        return {}
+
+    aggregates = viewer_stats_cache.get_many(found)
+    missing = [tid for tid in found if tid not in aggregates]
+    if missing:
+        generation = viewer_stats_cache.generation()
+        loaded = _load_aggregates(missing)
+        viewer_stats_cache.put_many(loaded, generation)
+        aggregates.update(loaded)
+
+    own: Dict[int, Dict[str, int]] = {}
+    if viewer_id:
+        rows = (
+            db.session.query(ViewerRating.track_id, ViewerRating.criterion_key, ViewerRating.score)
+            .filter(ViewerRating.viewer_id == viewer_id, ViewerRating.track_id.in_(found))
+            .all()
+        )
+        for tid, key, score in rows:
+            own.setdefault(tid, {})[key] = score
+
+    return {t.id: _summary(t, aggregates.get(t.id, {}), own.get(t.id, {})) for t in tracks}
+
+
+def overall_avg(track_id: int) -> float:
+    """Overall viewer average of one track (through the aggregate cache)."""
+    track_id = int(track_id)
+    aggregates = viewer_stats_cache.get_many([track_id]).get(track_id)
+    if aggregates is None:
+        generation = viewer_stats_cache.generation()
+        loaded = _load_aggregates([track_id])
+        viewer_stats_cache.put_many(loaded, generation)
+        aggregates = loaded[track_id]
+    total_count = sum(c for _, c in aggregates.values())
+    return (sum(t for t, _ in aggregates.values()) / total_count) if total_count else 0.0